@@ -6,36 +6,365 @@ Purpose: Demonstrate encrypted storage and retrieval of employee data.
 """
 from __future__ import annotations
 
-import socket
+import io
+import math
 import sqlite3
+import threading
+import time
 from functools import wraps
 from pathlib import Path
-from typing import Any, Callable, Dict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from flask import (
     Flask,
+    Response,
+    abort,
+    before_render_template,
+    g,
     redirect,
     render_template,
     request,
     session,
+    stream_template,
+    stream_with_context,
     url_for,
     flash,
+    jsonify,
+    template_rendered,
 )
-
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+
+import bulk_io
+import credentials
+import metrics
+import migrations
+import name_directory
+import page_cache
+import rate_limit
+import records
+import reporting
+import search_index
 import security_utils
+import session_store
+from db_pool import DEFAULT_POOL_SIZE, ConnectionPool
+from deletion_outbox import DeletionOutbox, MemoryOutboxStore, SqliteOutboxStore
+from deletion_protocol import DeletionClient
 
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "company.db"
 
 app = Flask(__name__)
+_extensions_lock = threading.Lock()
 app.config["SECRET_KEY"] = "change-this-secret-key"
 app.config["DATABASE"] = str(DB_PATH)
+app.config["DB_POOL_SIZE"] = DEFAULT_POOL_SIZE
+app.config["DELETION_SERVER"] = ("localhost", 9999)
+# Deletion requests are queued and sent in the background. Set DELETION_SPOOL
+# to a file path to keep the queue in SQLite across restarts.
+app.config["DELETION_SPOOL"] = None
+app.config["DELETION_BATCH_SIZE"] = 100
+# Listing pages use keyset pagination; ?stream=1 renders rows as they are decrypted.
+app.config["DEFAULT_PAGE_SIZE"] = 100
+app.config["MAX_PAGE_SIZE"] = 1000
+app.config["MAX_STREAM_PAGE_SIZE"] = 100_000
+app.config["STREAM_CHUNK_SIZE"] = 200
+# Decrypted employee names are cached in memory; see security_utils.PlaintextCache.
+app.config["PLAINTEXT_CACHE_ENABLED"] = True
+app.config["PLAINTEXT_CACHE_MAX_ENTRIES"] = 10_000
+app.config["PLAINTEXT_CACHE_MAX_BYTES"] = 4 * 1024 * 1024
+app.config["PLAINTEXT_CACHE_TTL"] = 300
+# Listing pages send ETags from per-table change counters and cache their
+# rendered tables per table version; see page_cache.
+app.config["PAGE_CACHE_ENABLED"] = True
+app.config["FRAGMENT_CACHE_MAX_ENTRIES"] = page_cache.DEFAULT_MAX_ENTRIES
+app.config["FRAGMENT_CACHE_MAX_BYTES"] = page_cache.DEFAULT_MAX_BYTES
+# "sqlite" keeps sessions in company.db (shared across processes, dropped by
+# trigger when an employee's SecurityLevel changes); "memory" is per-process
+# and keeps the SecurityLevel a session started with until it expires.
+app.config["SESSION_BACKEND"] = "sqlite"
+app.config["SESSION_TTL"] = session_store.DEFAULT_SESSION_TTL
+app.config["SESSION_MAX_ENTRIES"] = session_store.DEFAULT_MAX_SESSIONS
+
+# scrypt verification threads, and how many logins may queue for them.
+app.config["LOGIN_HASH_WORKERS"] = credentials.DEFAULT_WORKERS
+app.config["LOGIN_MAX_PENDING"] = credentials.DEFAULT_MAX_PENDING
+# Token buckets: a burst of attempts, then a steady refill per minute
+# (the per-minute rates must be above zero).
+app.config["LOGIN_IP_BURST"] = 20
+app.config["LOGIN_IP_PER_MINUTE"] = 10
+app.config["LOGIN_USER_BURST"] = 5
+app.config["LOGIN_USER_PER_MINUTE"] = 2
+app.config["LOGIN_LIMITER_MAX_KEYS"] = rate_limit.DEFAULT_MAX_KEYS
+
+# The login page lists at most this many names; the rest are reachable
+# through /employees/names autocomplete.
+app.config["LOGIN_NAME_LIMIT"] = 50
+app.config["AUTOCOMPLETE_LIMIT"] = 10
+app.config["MAX_AUTOCOMPLETE_LIMIT"] = 25
+
+# Rows encrypted per executemany on import, and decrypted per chunk on export.
+app.config["IMPORT_CHUNK_SIZE"] = bulk_io.DEFAULT_CHUNK_SIZE
+app.config["EXPORT_CHUNK_SIZE"] = bulk_io.DEFAULT_CHUNK_SIZE
+# Each imported employee costs a full scrypt hash (tens of milliseconds),
+# so web uploads are capped; larger files go through `python bulk_io.py`.
+app.config["IMPORT_MAX_EMPLOYEES"] = 200
+
+
+def get_db_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool for app.config["DATABASE"].
+    """
+    with _extensions_lock:
+        pool = app.extensions.get("db_pool")
+        if pool is None or pool.database != app.config["DATABASE"]:
+            pool = ConnectionPool(
+                app.config["DATABASE"],
+                size=app.config["DB_POOL_SIZE"],
+                row_factory=sqlite3.Row,
+                factory=metrics.TimedConnection,
+            )
+            app.extensions["db_pool"] = pool
+    return pool
 
 
 def get_db_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(app.config["DATABASE"])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    Return the pooled connection bound to the current app context.
+
+    The first call in a request checks a connection out of the pool; later
+    calls reuse it, and release_db_connection hands it back on teardown.
+    """
+    if "db_conn" not in g:
+        g.db_conn = get_db_pool().acquire()
+    return g.db_conn
+
+
+@app.teardown_appcontext
+def release_db_connection(exception: BaseException | None) -> None:
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        get_db_pool().release(conn)
+
+
+REQUESTS = metrics.REGISTRY.counter(
+    "portal_requests_total", "Requests served, by route and status code.", ["route", "status"]
+)
+REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    "portal_request_seconds", "Wall time per request, including streamed bodies.", ["route"]
+)
+REQUEST_DB_SECONDS = metrics.REGISTRY.histogram(
+    "portal_request_db_seconds", "SQLite execute/fetch time per request.", ["route"]
+)
+REQUEST_DECRYPTS = metrics.REGISTRY.histogram(
+    "portal_request_decrypts", "Fernet decrypts per request.", ["route"], buckets=metrics.COUNT_BUCKETS
+)
+REQUEST_DECRYPT_SECONDS = metrics.REGISTRY.histogram(
+    "portal_request_decrypt_seconds", "Fernet decrypt time per request.", ["route"]
+)
+REQUEST_RENDER_SECONDS = metrics.REGISTRY.histogram(
+    "portal_request_render_seconds", "Jinja render time per request, excluding DB and decrypt time.", ["route"]
+)
+PLAINTEXT_CACHE = metrics.REGISTRY.gauge(
+    "portal_plaintext_cache", "Plaintext cache counters and size.", ["stat"]
+)
+FRAGMENT_CACHE = metrics.REGISTRY.gauge(
+    "portal_fragment_cache", "Rendered fragment cache counters and size.", ["stat"]
+)
+
+
+@app.before_request
+def start_request_timing() -> None:
+    metrics.start_request()
+
+
+@app.after_request
+def record_request_timing(response: Response) -> Response:
+    timings = metrics.current_timings()
+    if timings is None:
+        return response
+    route = request.endpoint or "unmatched"
+    status = response.status_code
+
+    # Streamed bodies are still being generated here, so record on close.
+    def record() -> None:
+        metrics.end_request()
+        REQUESTS.inc(route=route, status=status)
+        REQUEST_SECONDS.observe(time.perf_counter() - timings.started, route=route)
+        REQUEST_DB_SECONDS.observe(timings.db_seconds, route=route)
+        REQUEST_DECRYPTS.observe(timings.decrypt_count, route=route)
+        REQUEST_DECRYPT_SECONDS.observe(timings.decrypt_seconds, route=route)
+        REQUEST_RENDER_SECONDS.observe(timings.render_seconds, route=route)
+
+    response.call_on_close(record)
+    return response
+
+
+def _template_started(sender: Flask, **extra: Any) -> None:
+    timings = metrics.current_timings()
+    if timings is not None:
+        timings.begin_render()
+
+
+def _template_finished(sender: Flask, **extra: Any) -> None:
+    timings = metrics.current_timings()
+    if timings is not None:
+        timings.end_render()
+
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
+security_utils.set_observer(metrics.observe_crypto)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    stats = security_utils.plaintext_cache_stats()
+    if stats is not None:
+        for stat, value in stats.items():
+            PLAINTEXT_CACHE.set(value, stat=stat)
+    for stat, value in get_fragment_cache().stats().items():
+        FRAGMENT_CACHE.set(value, stat=stat)
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def get_deletion_client() -> DeletionClient:
+    """
+    Return the process-wide client that keeps a persistent connection to the deletion server.
+    """
+    with _extensions_lock:
+        client = app.extensions.get("deletion_client")
+        if client is None:
+            host, port = app.config["DELETION_SERVER"]
+            client = DeletionClient(host, port)
+            app.extensions["deletion_client"] = client
+    return client
+
+
+def get_outbox() -> DeletionOutbox:
+    """
+    Return the deletion outbox, starting its background sender on first use.
+    """
+    client = get_deletion_client()
+    with _extensions_lock:
+        outbox = app.extensions.get("deletion_outbox")
+        if outbox is None:
+            spool = app.config["DELETION_SPOOL"]
+            store = SqliteOutboxStore(spool) if spool else MemoryOutboxStore()
+            outbox = DeletionOutbox(client, store, batch_size=app.config["DELETION_BATCH_SIZE"])
+            outbox.start()
+            app.extensions["deletion_outbox"] = outbox
+    return outbox
+
+
+def get_credential_verifier() -> credentials.CredentialVerifier:
+    """
+    Return the shared password verification pool, sized from app.config.
+    """
+    with _extensions_lock:
+        verifier = app.extensions.get("credential_verifier")
+        if verifier is None:
+            verifier = credentials.configure_verifier(
+                workers=app.config["LOGIN_HASH_WORKERS"],
+                max_pending=app.config["LOGIN_MAX_PENDING"],
+            )
+            app.extensions["credential_verifier"] = verifier
+    return verifier
+
+
+def get_login_limiters() -> Tuple[rate_limit.TokenBucketLimiter, rate_limit.TokenBucketLimiter]:
+    """
+    Return the (per-IP, per-user) login attempt limiters.
+    """
+    with _extensions_lock:
+        limiters = app.extensions.get("login_limiters")
+        if limiters is None:
+            limiters = (
+                rate_limit.TokenBucketLimiter(
+                    app.config["LOGIN_IP_BURST"],
+                    app.config["LOGIN_IP_PER_MINUTE"] / 60.0,
+                    app.config["LOGIN_LIMITER_MAX_KEYS"],
+                ),
+                rate_limit.TokenBucketLimiter(
+                    app.config["LOGIN_USER_BURST"],
+                    app.config["LOGIN_USER_PER_MINUTE"] / 60.0,
+                    app.config["LOGIN_LIMITER_MAX_KEYS"],
+                ),
+            )
+            app.extensions["login_limiters"] = limiters
+    return limiters
+
+
+def get_name_directory() -> name_directory.NameDirectory:
+    """
+    Return the in-memory employee name directory, bringing it up to date if due.
+    """
+    with _extensions_lock:
+        directory = app.extensions.get("name_directory")
+        if directory is None:
+            directory = name_directory.NameDirectory()
+            app.extensions["name_directory"] = directory
+    directory.refresh(get_db_connection())
+    return directory
+
+
+def get_session_store() -> session_store.SessionStore:
+    """
+    Return the server-side session store selected by SESSION_BACKEND.
+    """
+    # Sessions are opened before before_request hooks run.
+    ensure_initialized()
+    with _extensions_lock:
+        store = app.extensions.get("session_store")
+        if store is None:
+            if app.config["SESSION_BACKEND"] == "memory":
+                store = session_store.MemorySessionStore(max_sessions=app.config["SESSION_MAX_ENTRIES"])
+            else:
+                store = session_store.SqliteSessionStore(get_db_connection, max_cached=app.config["SESSION_MAX_ENTRIES"])
+            app.extensions["session_store"] = store
+    return store
+
+
+app.session_interface = session_store.ServerSessionInterface(get_session_store)
+
+
+def get_fragment_cache() -> page_cache.FragmentCache:
+    """
+    Return the rendered-fragment cache sized from app.config.
+    """
+    with _extensions_lock:
+        cache = app.extensions.get("fragment_cache")
+        if cache is None:
+            cache = page_cache.FragmentCache(
+                max_entries=app.config["FRAGMENT_CACHE_MAX_ENTRIES"],
+                max_bytes=app.config["FRAGMENT_CACHE_MAX_BYTES"],
+            )
+            app.extensions["fragment_cache"] = cache
+    return cache
+
+
+def get_template_digest() -> str:
+    """
+    Return the digest of the templates directory, computed once per process.
+    """
+    with _extensions_lock:
+        digest = app.extensions.get("template_digest")
+        if digest is None:
+            digest = app.extensions["template_digest"] = page_cache.template_digest(BASE_DIR / "templates")
+    return digest
+
+
+def start_session(user_id: int, user_name: str, security_level: int) -> None:
+    """
+    Store the signed-in user's identity, including the decrypted display
+    name, once for the life of the session under a fresh session ID.
+    """
+    session.clear()
+    session.regenerate()
+    session["user_id"] = user_id
+    session["user_name"] = user_name
+    session["security_level"] = security_level
 
 
 def login_required(view: Callable) -> Callable:
@@ -49,49 +378,256 @@ def login_required(view: Callable) -> Callable:
     return wrapped_view
 
 
+class KeysetPage:
+    """
+    One page of a keyset-paginated listing.
+
+    Iterating fetches rows from the cursor in chunks, so a streamed template
+    can emit rows as they are read. Rows are usually lazy records, which
+    decrypt a column only when the template shows it; decode, if given,
+    post-processes each chunk, e.g. a projection's prefetch to decrypt the
+    chunk's columns in one batch per column.
+
+    The query must select page_size + 1 rows; once the page is exhausted
+    next_after holds the cursor for the following page, or None.
+    """
+
+    def __init__(
+        self,
+        cursor: sqlite3.Cursor,
+        page_size: int,
+        cursor_of: Callable[[Any], str],
+        stream: bool = False,
+        decode: Optional[Callable[[List[Any]], Iterable[Any]]] = None,
+    ) -> None:
+        self.cursor = cursor
+        self.page_size = page_size
+        self.cursor_of = cursor_of
+        self.stream = stream
+        self.decode = decode
+        self.next_after: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Any]:
+        remaining = self.page_size
+        last_row: Any = None
+        chunk_size = app.config["STREAM_CHUNK_SIZE"]
+        while remaining > 0:
+            chunk = self.cursor.fetchmany(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            last_row = chunk[-1]
+            yield from self.decode(chunk) if self.decode is not None else chunk
+        if last_row is not None and self.cursor.fetchone() is not None:
+            self.next_after = self.cursor_of(last_row)
+
+
+def page_args() -> Tuple[int, Optional[str], bool]:
+    """
+    Parse page_size, after and stream from the query string.
+    """
+    stream = request.args.get("stream") == "1"
+    limit = app.config["MAX_STREAM_PAGE_SIZE"] if stream else app.config["MAX_PAGE_SIZE"]
+    page_size = request.args.get("page_size", type=int) or app.config["DEFAULT_PAGE_SIZE"]
+    page_size = max(1, min(page_size, limit))
+    after = request.args.get("after") or None
+    return page_size, after, stream
+
+
+def cached_listing(template_name: str, *tables: str, per_user: bool = False) -> Callable:
+    """
+    Serve a listing page from the change counters of tables.
+
+    A request whose If-None-Match matches the page's ETag gets a 304 before
+    any row is read or decrypted. Otherwise a cached rendering of the
+    page's table for the same query string, table versions and security
+    level (and user, if per_user) is wrapped in template_name; on a miss
+    the view runs and render_table stores what it renders. Streamed pages
+    are validated but never cached. Apply below @login_required.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapped_view(*args: Any, **kwargs: Any) -> Any:
+            if not app.config["PAGE_CACHE_ENABLED"]:
+                return view(*args, **kwargs)
+            versions, updated_at = page_cache.table_versions(get_db_connection(), tables)
+            digest = get_template_digest()
+            # Flashed messages are part of the page and are consumed by rendering it.
+            validated = "_flashes" not in session
+            etag = page_cache.page_etag(
+                (
+                    request.full_path,
+                    versions,
+                    session.get("user_id"),
+                    session.get("user_name"),
+                    session.get("security_level"),
+                    digest,
+                )
+            )
+            # Validate on the ETag alone: Last-Modified has one-second
+            # resolution and does not change when a different user signs in.
+            if validated and not is_resource_modified(request.environ, etag=etag):
+                response = app.response_class(status=304)
+            else:
+                g.fragment_key = None
+                table = None
+                if request.args.get("stream") != "1":
+                    g.fragment_key = (
+                        request.endpoint,
+                        request.query_string,
+                        versions,
+                        session.get("user_id") if per_user else None,
+                        session.get("security_level"),
+                        digest,
+                    )
+                    table = get_fragment_cache().get(g.fragment_key)
+                if table is not None:
+                    response = app.make_response(render_template(template_name, table=table))
+                else:
+                    response = app.make_response(view(*args, **kwargs))
+            if validated and response.status_code in (200, 304):
+                response.set_etag(etag)
+                response.last_modified = datetime.fromtimestamp(updated_at, tz=timezone.utc)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+
+def render_table(table_template: str, **context: Any) -> Markup:
+    """
+    Render a listing's table partial, storing it for cached_listing.
+    """
+    table = Markup(render_template(table_template, **context))
+    key = g.get("fragment_key")
+    if key is not None:
+        get_fragment_cache().put(key, table, len(table))
+    return table
+
+
+def render_listing(template_name: str, table_template: str, page: KeysetPage, rows_name: str) -> Any:
+    """
+    Render a listing either fully buffered or streamed row by row.
+
+    stream_template wraps its generator in stream_with_context, so the
+    request-bound database connection stays open until the last row.
+    Buffered pages render table_template on its own, so cached_listing can
+    reuse it.
+    """
+    if page.stream:
+        return app.response_class(stream_template(template_name, page=page, **{rows_name: page}))
+    rows = list(page)
+    return render_template(template_name, table=render_table(table_template, page=page, **{rows_name: rows}))
+
+
 @app.route("/", methods=["GET", "POST"])
 def login():
     error: str | None = None
+    status = 200
     name_value = ""
     if request.method == "POST":
         name_value = request.form.get("name", "").strip()
         password = request.form.get("password", "")
 
-        try:
-            encrypted_name = security_utils.encrypt_text(name_value)
-            encrypted_password = security_utils.encrypt_text(password)
-        except ValueError:
+        if not name_value or not password:
             error = "Name and password are required."
         else:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    SELECT UserId, Name, SecurityLevel
-                    FROM Employee
-                    WHERE Name = ? AND LoginPassword = ?;
-                    """,
-                    (encrypted_name, encrypted_password),
-                )
-                user = cursor.fetchone()
-                if user:
-                    session["user_id"] = user["UserId"]
-                    session["user_name"] = security_utils.decrypt_text(user["Name"])
-                    session["security_level"] = user["SecurityLevel"]
+            name_index = security_utils.blind_index(name_value)
+            ip_limiter, user_limiter = get_login_limiters()
+            # Throttled per user by the name's blind index, so the limiter
+            # never holds plaintext names.
+            wait = ip_limiter.consume(request.remote_addr or "") or user_limiter.consume(name_index.hex())
+            if wait:
+                error = f"Too many login attempts. Try again in {math.ceil(wait)} seconds."
+                status = 429
+            else:
+                try:
+                    user = authenticate(name_index, password)
+                except credentials.VerifierBusy:
+                    user = None
+                    error = "The server is busy. Please try again shortly."
+                    status = 503
+                if user is not None:
+                    user_limiter.reset(name_index.hex())
+                    start_session(user["UserId"], name_value, user["SecurityLevel"])
                     flash(f"Welcome back, {session['user_name']}!", "success")
                     return redirect(url_for("home"))
-                error = "Invalid credentials. Please try again."
+                if error is None:
+                    error = "Invalid credentials. Please try again."
+
+    directory = get_name_directory()
+    response = app.make_response(
+        (
+            render_template(
+                "login.html",
+                error=error,
+                name=name_value,
+                known_names=directory.first(app.config["LOGIN_NAME_LIMIT"]),
+                total_names=len(directory),
+            ),
+            status,
+        )
+    )
+    if status == 429:
+        response.headers["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def authenticate(name_index: bytes, password: str) -> Optional[sqlite3.Row]:
+    """
+    Return the Employee row whose password matches, or None.
+
+    NameIdx is a deterministic HMAC of the name, so candidates come from a
+    single indexed lookup. Hashes are checked on the credential verifier
+    pool; an unknown name is checked against a dummy hash so it takes as
+    long as a wrong password. Legacy encrypted passwords and hashes weaker
+    than the current cost are re-hashed after a successful login.
+    """
+    conn = get_db_connection()
+    candidates = conn.execute(
+        """
+        SELECT UserId, SecurityLevel, LoginPassword
+        FROM Employee
+        WHERE NameIdx = ?;
+        """,
+        (name_index,),
+    ).fetchall()
+    verifier = get_credential_verifier()
+    if not candidates:
+        verifier.verify(None, password)
+        return None
+    for user in candidates:
+        stored = user["LoginPassword"]
+        if not verifier.verify(stored, password):
+            continue
+        if credentials.needs_rehash(stored):
+            try:
+                upgraded = verifier.hash(password)
+            except credentials.VerifierBusy:
+                return user
+            with conn:
+                conn.execute(
+                    "UPDATE Employee SET LoginPassword = ? WHERE UserId = ? AND LoginPassword = ?;",
+                    (upgraded, user["UserId"], stored),
+                )
+        return user
+    return None
 
-    with get_db_connection() as conn:
-        rows = conn.execute("SELECT Name FROM Employee ORDER BY UserId;").fetchall()
-    known_names = [security_utils.decrypt_text(row["Name"]) for row in rows]
 
-    return render_template(
-        "login.html",
-        error=error,
-        name=name_value,
-        known_names=known_names,
-    )
+@app.route("/employees/names")
+def employee_name_suggestions():
+    """
+    Prefix autocomplete for the login form, served from the name directory.
+    """
+    prefix = request.args.get("q", "").strip()
+    limit = request.args.get("limit", type=int) or app.config["AUTOCOMPLETE_LIMIT"]
+    limit = max(1, min(limit, app.config["MAX_AUTOCOMPLETE_LIMIT"]))
+    names = get_name_directory().search(prefix, limit) if prefix else []
+    return jsonify({"q": prefix, "names": names})
 
 
 @app.route("/home")
@@ -103,35 +639,62 @@ def home():
 @app.route("/logout")
 def logout():
     session.clear()
+    session.regenerate()
     flash("You have been logged out.", "info")
     return redirect(url_for("login"))
 
 
+# Listing projections: each SELECT names only the columns its template shows,
+# and encrypted ones are decrypted when the template reads them.
+EmployeeListing = records.projection(
+    "Employee", ("UserId", "Name", "Age", "PhNum", "SecurityLevel"), cached=("Name",)
+)
+PayRaiseListing = records.projection("EmpPayRaise", ("PayRaiseId", "EmpId", "PayRaiseDate", "RaiseAmt"))
+MyPayRaiseListing = records.projection("EmpPayRaise", ("PayRaiseId", "PayRaiseDate", "RaiseAmt"))
+
+
 @app.route("/employees")
 @login_required
+@cached_listing("employees.html", "Employee")
 def list_employees():
-    with get_db_connection() as conn:
-        rows = conn.execute(
-            """
-            SELECT UserId, Name, Age, PhNum, SecurityLevel, LoginPassword
-            FROM Employee
-            ORDER BY UserId;
-            """
-        ).fetchall()
+    page_size, after, stream = page_args()
+    try:
+        after_id = int(after) if after is not None else 0
+    except ValueError:
+        after_id = 0
+
+    cursor = records.select(
+        get_db_connection(),
+        EmployeeListing,
+        "WHERE UserId > ? ORDER BY UserId LIMIT ?",
+        (after_id, page_size + 1),
+    )
+    page = KeysetPage(cursor, page_size, lambda row: str(row.UserId), stream, EmployeeListing.prefetch)
+    return render_listing("employees.html", "_employees_table.html", page, "employees")
 
-    employees = [
-        {
-            "UserId": row["UserId"],
-            "Name": security_utils.decrypt_text(row["Name"]),
-            "Age": row["Age"],
-            "PhNum": security_utils.decrypt_text(row["PhNum"]),
-            "SecurityLevel": row["SecurityLevel"],
-            "LoginPassword": security_utils.decrypt_text(row["LoginPassword"]),
-        }
-        for row in rows
-    ]
 
-    return render_template("employees.html", employees=employees)
+@app.route("/employees/search")
+@login_required
+def search_employees():
+    query = request.args.get("q", "").strip()
+    field = request.args.get("field") if request.args.get("field") in search_index.FIELDS else None
+    limit = request.args.get("page_size", type=int) or app.config["DEFAULT_PAGE_SIZE"]
+    limit = max(1, min(limit, app.config["MAX_PAGE_SIZE"]))
+    after = request.args.get("after", type=int) or 0
+    found: List[records.Record] = []
+    next_after: Optional[int] = None
+    if query:
+        found, next_after = search_index.search(get_db_connection(), query, field, limit, after)
+    if request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json":
+        return jsonify({"q": query, "employees": [record.as_dict() for record in found], "next_after": next_after})
+    return render_template(
+        "employee_search.html",
+        query=query,
+        field=field,
+        employees=found,
+        next_after=next_after,
+        page_size=limit,
+    )
 
 
 @app.route("/employees/add", methods=["GET", "POST"])
@@ -157,23 +720,30 @@ def add_employee():
 
         encrypted_name = security_utils.encrypt_text(name)
         encrypted_phone = security_utils.encrypt_text(phnum)
-        encrypted_password = security_utils.encrypt_text(password)
+        try:
+            password_hash = get_credential_verifier().hash(password)
+        except credentials.VerifierBusy:
+            flash("The server is busy. Please try again shortly.", "danger")
+            return redirect(url_for("add_employee"))
 
         with get_db_connection() as conn:
-            conn.execute(
+            cursor = conn.execute(
                 """
-                INSERT INTO Employee (Name, Age, PhNum, SecurityLevel, LoginPassword)
-                VALUES (?, ?, ?, ?, ?);
+                INSERT INTO Employee (Name, NameIdx, Age, PhNum, SecurityLevel, LoginPassword)
+                VALUES (?, ?, ?, ?, ?, ?);
                 """,
                 (
                     encrypted_name,
+                    security_utils.blind_index(name),
                     age_value,
                     encrypted_phone,
                     security_value,
-                    encrypted_password,
+                    password_hash,
                 ),
             )
+            search_index.index_employees(conn, [(cursor.lastrowid, name, phnum)])
             conn.commit()
+        get_name_directory().add(cursor.lastrowid, name)
 
         flash(f"Employee {name} added successfully.", "success")
         return redirect(url_for("list_employees"))
@@ -183,54 +753,42 @@ def add_employee():
 
 @app.route("/payraises")
 @login_required
+@cached_listing("payraises.html", "EmpPayRaise")
 def list_pay_raises():
-    with get_db_connection() as conn:
-        rows = conn.execute(
-            """
-            SELECT PayRaiseId, EmpId, PayRaiseDate, RaiseAmt
-            FROM EmpPayRaise
-            ORDER BY PayRaiseDate DESC;
-            """
-        ).fetchall()
-
-    pay_raises = [
-        {
-            "PayRaiseId": row["PayRaiseId"],
-            "EmpId": row["EmpId"],
-            "PayRaiseDate": row["PayRaiseDate"],
-            "RaiseAmt": security_utils.decrypt_text(row["RaiseAmt"]),
-        }
-        for row in rows
-    ]
-
-    return render_template("payraises.html", pay_raises=pay_raises)
+    page_size, after, stream = page_args()
+    # The cursor is "<PayRaiseDate>,<PayRaiseId>" of the last row on the previous page.
+    after_date, _, after_id = (after or "").rpartition(",")
+    if after_date and after_id.isdigit():
+        where_clause = "WHERE (PayRaiseDate, PayRaiseId) < (?, ?)"
+        params: Tuple[Any, ...] = (after_date, int(after_id), page_size + 1)
+    else:
+        where_clause = ""
+        params = (page_size + 1,)
+
+    cursor = records.select(
+        get_db_connection(),
+        PayRaiseListing,
+        f"{where_clause} ORDER BY PayRaiseDate DESC, PayRaiseId DESC LIMIT ?",
+        params,
+    )
+    page = KeysetPage(
+        cursor, page_size, lambda row: f"{row.PayRaiseDate},{row.PayRaiseId}", stream, PayRaiseListing.prefetch
+    )
+    return render_listing("payraises.html", "_payraises_table.html", page, "pay_raises")
 
 
 @app.route("/payraises/me")
 @login_required
+@cached_listing("my_payraises.html", "EmpPayRaise", per_user=True)
 def my_pay_raises():
     user_id = session["user_id"]
-    with get_db_connection() as conn:
-        rows = conn.execute(
-            """
-            SELECT PayRaiseId, PayRaiseDate, RaiseAmt
-            FROM EmpPayRaise
-            WHERE EmpId = ?
-            ORDER BY PayRaiseDate DESC;
-            """,
-            (user_id,),
-        ).fetchall()
-
-    pay_raises = [
-        {
-            "PayRaiseId": row["PayRaiseId"],
-            "PayRaiseDate": row["PayRaiseDate"],
-            "RaiseAmt": security_utils.decrypt_text(row["RaiseAmt"]),
-        }
-        for row in rows
-    ]
-
-    return render_template("my_payraises.html", pay_raises=pay_raises)
+    pay_raises = records.fetch_all(
+        get_db_connection(),
+        MyPayRaiseListing,
+        "WHERE EmpId = ? ORDER BY PayRaiseDate DESC",
+        (user_id,),
+    )
+    return render_template("my_payraises.html", table=render_table("_my_payraises_table.html", pay_raises=pay_raises))
 
 
 @app.route("/payraises/add", methods=["GET", "POST"])
@@ -248,11 +806,14 @@ def add_pay_raise():
         try:
             emp_id_value = int(emp_id)
             amount_value = float(raise_amount)
+            if not math.isfinite(amount_value):
+                raise ValueError(raise_amount)
         except ValueError:
             flash("Employee ID must be an integer and raise amount must be numeric.", "danger")
             return redirect(url_for("add_pay_raise"))
 
-        encrypted_amount = security_utils.encrypt_text(f"{amount_value:.2f}")
+        amount_text = f"{amount_value:.2f}"
+        encrypted_amount = security_utils.encrypt_text(amount_text)
 
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -272,6 +833,7 @@ def add_pay_raise():
                     encrypted_amount,
                 ),
             )
+            reporting.record_raises(conn, [(emp_id_value, pay_raise_date, amount_text)])
             conn.commit()
 
         flash("Pay raise added successfully.", "success")
@@ -282,17 +844,102 @@ def add_pay_raise():
             "SELECT UserId, Name FROM Employee ORDER BY UserId;"
         ).fetchall()
 
+    names = security_utils.decrypt_many([row["Name"] for row in employees], cache=True)
     dropdown_employees = [
         {
             "UserId": row["UserId"],
-            "Name": security_utils.decrypt_text(row["Name"]),
+            "Name": name,
         }
-        for row in employees
+        for row, name in zip(employees, names)
     ]
 
     return render_template("add_payraise.html", employees=dropdown_employees)
 
 
+@app.route("/reports")
+@login_required
+def pay_raise_reports():
+    year = request.args.get("year", type=int)
+    page_size, after, _ = page_args()
+    conn = get_db_connection()
+    yearly = reporting.yearly_report(conn)
+    employees, next_after = reporting.employee_report(
+        conn,
+        year=year,
+        after=int(after) if after and after.isdigit() else None,
+        limit=page_size,
+    )
+
+    emp_ids = [entry["emp_id"] for entry in employees]
+    if emp_ids:
+        rows = conn.execute(
+            f"SELECT UserId, Name FROM Employee WHERE UserId IN ({', '.join('?' * len(emp_ids))});",
+            emp_ids,
+        ).fetchall()
+        names = security_utils.decrypt_many([row["Name"] for row in rows], cache=True)
+        names_by_id = {row["UserId"]: name for row, name in zip(rows, names)}
+        for entry in employees:
+            entry["name"] = names_by_id.get(entry["emp_id"], "")
+
+    return render_template(
+        "reports.html",
+        yearly=yearly,
+        employees=employees,
+        year=year,
+        page_size=page_size,
+        next_after=next_after,
+    )
+
+
+@app.route("/import/<kind>", methods=["GET", "POST"])
+@login_required
+def bulk_import(kind: str):
+    if kind not in bulk_io.KINDS:
+        abort(404)
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if upload is None or not upload.filename:
+            flash("Choose a CSV or JSONL file to upload.", "danger")
+            return redirect(url_for("bulk_import", kind=kind))
+        fmt = request.form.get("format") or bulk_io.format_for(upload.filename)
+        # Read the upload as text incrementally rather than all at once.
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        result = bulk_io.ImportResult()
+        error: Optional[str] = None
+        try:
+            bulk_io.import_stream(
+                get_db_connection(),
+                kind,
+                stream,
+                fmt,
+                chunk_size=app.config["IMPORT_CHUNK_SIZE"],
+                strict=request.form.get("strict") == "1",
+                result=result,
+                max_employees=app.config["IMPORT_MAX_EMPLOYEES"],
+            )
+        except ValueError as e:
+            error = str(e)
+        if kind == "employees" and result.inserted:
+            get_name_directory().mark_stale()
+        if request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json":
+            return jsonify(dict(result.as_dict(), error=error)), 400 if error else 200
+        return render_template("import_results.html", kind=kind, result=result, error=error)
+    return render_template("bulk_import.html", kind=kind)
+
+
+@app.route("/export/<kind>.<fmt>")
+@login_required
+def bulk_export(kind: str, fmt: str):
+    if kind not in bulk_io.KINDS or fmt not in bulk_io.FORMATS:
+        abort(404)
+    lines = bulk_io.export_lines(get_db_connection(), kind, fmt, app.config["EXPORT_CHUNK_SIZE"])
+    return app.response_class(
+        stream_with_context(lines),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'},
+    )
+
+
 @app.route("/payraises/submit-delete", methods=["GET", "POST"])
 @login_required
 def submit_delete_payraise():
@@ -342,43 +989,33 @@ def submit_delete_payraise():
                     message=f"No pay raise record found for Employee ID {emp_id_value} with date {pay_raise_date}.",
                 )
 
-        # If validation passes, try to connect to server
-        HOST = "localhost"
-        PORT = 9999
-
-        try:
-            # Create message with preset separator
-            message = f"{emp_id_value}^%${pay_raise_date}"
-            encrypted_message = security_utils.encrypt_text(message)
-
-            # Create socket and connect
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.connect((HOST, PORT))
-
-            # Send encrypted message
-            client_socket.sendall(encrypted_message)
-            client_socket.close()
+        # If validation passes, hand the request to the background outbox
+        request_id = get_outbox().submit(emp_id_value, pay_raise_date)
+        return render_template(
+            "results.html",
+            success=True,
+            message=f"Deletion request queued (request ID {request_id}).",
+            status_url=url_for("delete_payraise_status", request_id=request_id),
+        )
 
-            return render_template(
-                "results.html",
-                success=True,
-                message="Test result successfully sent",
-            )
+    return render_template("submit_delete_payraise.html")
 
-        except (ConnectionRefusedError, OSError, socket.error) as e:
-            return render_template(
-                "results.html",
-                success=False,
-                message="Error - Test result NOT sent",
-            )
-        except Exception as e:
-            return render_template(
-                "results.html",
-                success=False,
-                message=f"Error - Test result NOT sent: {str(e)}",
-            )
 
-    return render_template("submit_delete_payraise.html")
+@app.route("/payraises/submit-delete/status/<request_id>")
+@login_required
+def delete_payraise_status(request_id: str):
+    record = get_outbox().status(request_id)
+    if record is None:
+        return jsonify({"request_id": request_id, "status": "unknown"}), 404
+    return jsonify(
+        {
+            "request_id": record["request_id"],
+            "status": record["status"],
+            "server_status": record["server_status"],
+            "attempts": record["attempts"],
+            "message": record["message"],
+        }
+    )
 
 
 @app.route("/results")
@@ -400,6 +1037,48 @@ def inject_user() -> Dict[str, Any]:
     }
 
 
+def init_db() -> None:
+    """
+    Create the schema or upgrade an existing database to the latest version.
+    """
+    with app.app_context():
+        migrations.migrate(get_db_connection())
+
+
+def init_crypto() -> None:
+    """
+    Enable the plaintext cache according to app.config.
+    """
+    if app.config["PLAINTEXT_CACHE_ENABLED"]:
+        security_utils.enable_plaintext_cache(
+            max_entries=app.config["PLAINTEXT_CACHE_MAX_ENTRIES"],
+            max_bytes=app.config["PLAINTEXT_CACHE_MAX_BYTES"],
+            ttl=app.config["PLAINTEXT_CACHE_TTL"],
+        )
+    else:
+        security_utils.disable_plaintext_cache()
+
+
+_init_lock = threading.Lock()
+
+
+@app.before_request
+def ensure_initialized() -> None:
+    """
+    Run init_db and init_crypto once per configured DATABASE, before the
+    first request, however the app is served (flask run, a WSGI server or
+    python app.py).
+    """
+    database = app.config["DATABASE"]
+    if app.extensions.get("initialized_database") == database:
+        return
+    with _init_lock:
+        if app.extensions.get("initialized_database") != database:
+            init_db()
+            init_crypto()
+            app.extensions["initialized_database"] = database
+
+
 if __name__ == "__main__":
     app.run(debug=True)
 
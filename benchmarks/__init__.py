@@ -0,0 +1,3 @@
+"""
+Benchmarks for the crypto, database and HTTP hot paths. See benchmarks/run.py.
+"""
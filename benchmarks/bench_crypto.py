@@ -0,0 +1,64 @@
+"""
+Throughput of security_utils encryption helpers at several payload sizes.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict, Sequence
+
+import security_utils
+
+PAYLOAD_SIZES = (16, 256, 4096)
+
+
+def _ops_per_second(func, count: int) -> float:
+    started = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - started)
+
+
+def run(iterations: int = 5000, payload_sizes: Sequence[int] = PAYLOAD_SIZES) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for size in payload_sizes:
+        value = "x" * size
+        tokens = [security_utils.encrypt_text(value) for _ in range(iterations)]
+
+        results[f"crypto.encrypt_text.{size}B.ops_per_s"] = _ops_per_second(
+            lambda: [security_utils.encrypt_text(value) for _ in range(iterations)], iterations
+        )
+        results[f"crypto.decrypt_text.{size}B.ops_per_s"] = _ops_per_second(
+            lambda: [security_utils.decrypt_text(token) for token in tokens], iterations
+        )
+        results[f"crypto.encrypt_many.{size}B.ops_per_s"] = _ops_per_second(
+            lambda: security_utils.encrypt_many([value] * iterations), iterations
+        )
+        results[f"crypto.decrypt_many.{size}B.ops_per_s"] = _ops_per_second(
+            lambda: security_utils.decrypt_many(tokens), iterations
+        )
+    results.update(run_backends(iterations, payload_sizes))
+    return results
+
+
+def run_backends(iterations: int, payload_sizes: Sequence[int]) -> Dict[str, float]:
+    """
+    encrypt_text/decrypt_text throughput for the non-default cipher backends.
+    """
+    results: Dict[str, float] = {}
+    default = security_utils.CIPHER
+    try:
+        for backend in sorted(security_utils.CIPHER_BACKENDS):
+            if backend == default:
+                continue
+            security_utils.configure_cipher(backend)
+            for size in payload_sizes:
+                value = "x" * size
+                tokens = [security_utils.encrypt_text(value) for _ in range(iterations)]
+                results[f"crypto.{backend}.encrypt_text.{size}B.ops_per_s"] = _ops_per_second(
+                    lambda: [security_utils.encrypt_text(value) for _ in range(iterations)], iterations
+                )
+                results[f"crypto.{backend}.decrypt_text.{size}B.ops_per_s"] = _ops_per_second(
+                    lambda: [security_utils.decrypt_text(token) for token in tokens], iterations
+                )
+    finally:
+        security_utils.configure_cipher(default)
+    return results
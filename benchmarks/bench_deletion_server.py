@@ -0,0 +1,68 @@
+"""
+Throughput of the TCP deletion server under concurrent local clients.
+"""
+from __future__ import annotations
+
+import contextlib
+import io
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Sequence
+
+import process_payraise_deletion_server as server_module
+import security_utils
+from benchmarks.common import build_database
+from db_pool import ConnectionPool
+from deletion_protocol import DeletionClient, format_deletion_message
+
+CLIENT_COUNTS = (1, 4, 16)
+
+
+def run(requests_per_client: int = 200, client_counts: Sequence[int] = CLIENT_COUNTS) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for clients in client_counts:
+        with tempfile.TemporaryDirectory() as scratch:
+            db_path = Path(scratch) / "bench.db"
+            build_database(db_path, employees=clients * requests_per_client, raises_per_employee=1)
+
+            # Point the server module at the scratch database.
+            server_module._POOL = ConnectionPool(db_path, size=server_module.DB_POOL_SIZE)
+            server_module._COMMITTER = server_module.GroupCommitter(server_module._POOL)
+            server = server_module.ThreadedDeletionServer(
+                ("localhost", 0), server_module.PayRaiseDeletionHandler, max_workers=max(clients, 1)
+            )
+            port = server.server_address[1]
+            serve_thread = threading.Thread(target=server.serve_forever, daemon=True)
+            serve_thread.start()
+
+            # Pre-encrypt so the measurement covers the server, not the clients.
+            with server_module._POOL.connection() as connection:
+                targets = connection.execute("SELECT EmpId, PayRaiseDate FROM EmpPayRaise ORDER BY PayRaiseId;").fetchall()
+            tokens = [security_utils.encrypt_text(format_deletion_message(emp_id, date)) for emp_id, date in targets]
+            per_client = [tokens[index::clients] for index in range(clients)]
+
+            def worker(batch) -> None:
+                client = DeletionClient("localhost", port)
+                for token in batch:
+                    client.send(token)
+                client.close()
+
+            threads = [threading.Thread(target=worker, args=(batch,)) for batch in per_client]
+            # The server logs every message; keep that out of the benchmark output.
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+
+            server.shutdown()
+            server.server_close()
+            server_module._COMMITTER.stop()
+            server_module._POOL.close_all()
+
+            results[f"deletion_server.{clients}clients.requests_per_s"] = len(tokens) / elapsed
+    return results
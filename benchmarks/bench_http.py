@@ -0,0 +1,38 @@
+"""
+Flask test-client latency for the login and listing pages at several table sizes.
+"""
+from __future__ import annotations
+
+import tempfile
+from pathlib import Path
+from typing import Dict, Sequence
+
+from benchmarks.common import build_database, percentiles, time_calls
+
+ROW_COUNTS = (1_000, 10_000, 100_000)
+ROUTES = ("/", "/employees", "/payraises", "/payraises/me")
+
+
+def run(requests_per_route: int = 50, row_counts: Sequence[int] = ROW_COUNTS) -> Dict[str, float]:
+    import app as webapp
+
+    results: Dict[str, float] = {}
+    for rows in row_counts:
+        with tempfile.TemporaryDirectory() as scratch:
+            db_path = Path(scratch) / "bench.db"
+            name, password = build_database(db_path, employees=rows, raises_per_employee=1)
+            webapp.app.config["DATABASE"] = str(db_path)
+            webapp.init_crypto()
+
+            client = webapp.app.test_client()
+            response = client.post("/", data={"name": name, "password": password})
+            if response.status_code != 302:
+                raise RuntimeError(f"benchmark login failed with status {response.status_code}")
+
+            for route in ROUTES:
+                samples = time_calls(lambda: client.get(route).get_data(), requests_per_route)
+                for stat, value in percentiles(samples).items():
+                    results[f"http.{route}.{rows}rows.{stat}"] = value
+
+            webapp.get_db_pool().close_all()
+    return results
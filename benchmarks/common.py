@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark suites.
+"""
+from __future__ import annotations
+
+import contextlib
+import io
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import employee_create_db
+import payraise_create_db
+
+SEED = 1234
+
+
+def build_database(path: Path, employees: int, raises_per_employee: int) -> Tuple[str, str]:
+    """
+    Populate a scratch database with synthetic rows using the create-db generators.
+
+    Returns the (name, password) of the first generated employee for logging in.
+    """
+    employee_create_db.DB_PATH = path
+    payraise_create_db.DB_PATH = path
+    with contextlib.redirect_stdout(io.StringIO()):
+        employee_create_db.generate(employees, SEED, append=False, chunk_size=10_000)
+        payraise_create_db.generate(raises_per_employee, SEED, append=False, chunk_size=10_000)
+    _, name, _, _, _, password = next(employee_create_db.generate_employee_rows(1, 1, SEED))
+    return name, password
+
+
+def time_calls(func: Callable[[], object], repeat: int) -> List[float]:
+    """
+    Call func repeat times and return each call's wall time in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
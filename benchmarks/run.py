@@ -0,0 +1,117 @@
+"""
+Program: Benchmark Runner
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Run the benchmark suites, emit JSON results, and flag regressions against a baseline.
+
+Usage (from the project root):
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --quick --baseline benchmarks/baseline.json --threshold 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks import bench_crypto, bench_deletion_server, bench_http
+
+SUITES = ("crypto", "http", "deletion")
+
+
+def run_suites(suites: List[str], quick: bool) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    if "crypto" in suites:
+        print("Running crypto benchmarks...")
+        results.update(bench_crypto.run(iterations=1000 if quick else 5000))
+    if "http" in suites:
+        print("Running HTTP benchmarks...")
+        results.update(
+            bench_http.run(
+                requests_per_route=10 if quick else 50,
+                row_counts=(1_000,) if quick else bench_http.ROW_COUNTS,
+            )
+        )
+    if "deletion" in suites:
+        print("Running deletion server benchmarks...")
+        results.update(
+            bench_deletion_server.run(
+                requests_per_client=50 if quick else 200,
+                client_counts=(1, 4) if quick else bench_deletion_server.CLIENT_COUNTS,
+            )
+        )
+    return results
+
+
+def find_regressions(current: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """
+    Compare metrics present in both runs.
+
+    Names ending in _ms are latencies (lower is better); names ending in
+    _per_s are throughputs (higher is better).
+    """
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        value = current.get(name)
+        if value is None or base <= 0:
+            continue
+        change = (value - base) / base
+        if name.endswith("_ms") and change > threshold:
+            regressions.append(f"{name}: {base:.3f} -> {value:.3f} ({change:+.1%})")
+        elif name.endswith("_per_s") and -change > threshold:
+            regressions.append(f"{name}: {base:.1f} -> {value:.1f} ({change:+.1%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the project benchmarks.")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}.")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer iterations for a fast check.")
+    parser.add_argument("--output", type=Path, help="Write results JSON to this path (default: stdout).")
+    parser.add_argument("--baseline", type=Path, help="Results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown before failing.")
+    parser.add_argument("--save-baseline", type=Path, help="Also write these results as the new baseline.")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": run_suites(suites, args.quick),
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+    if args.save_baseline:
+        args.save_baseline.write_text(text + "\n")
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = find_regressions(report["results"], baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,465 @@
+"""
+Program: Bulk Import and Export
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Stream CSV/JSONL employees and pay raises in and out of the encrypted tables.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import math
+import sqlite3
+import sys
+from collections import deque
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+import bulk_load
+import employee_create_db
+import migrations
+import payraise_create_db
+import reporting
+import search_index
+import security_utils
+from db_pool import configure_connection
+
+DB_PATH = Path(__file__).resolve().parent / "company.db"
+
+FORMATS = ("csv", "jsonl")
+KINDS = ("employees", "payraises")
+DEFAULT_CHUNK_SIZE = 5_000
+# Only the first MAX_REPORTED_ERRORS row errors are kept; the rest are counted.
+MAX_REPORTED_ERRORS = 1_000
+
+# Import columns. UserId and PayRaiseId are always assigned on insert.
+EMPLOYEE_IMPORT_FIELDS = ("name", "age", "phone", "security_level", "password")
+PAY_RAISE_IMPORT_FIELDS = ("emp_id", "pay_raise_date", "raise_amt")
+# Export columns. Passwords are never exported.
+EMPLOYEE_EXPORT_FIELDS = ("UserId", "Name", "Age", "PhNum", "SecurityLevel")
+PAY_RAISE_EXPORT_FIELDS = ("PayRaiseId", "EmpId", "PayRaiseDate", "RaiseAmt")
+
+
+class ImportResult:
+    """
+    Outcome of one import: rows inserted, rows rejected and the first errors.
+    """
+
+    def __init__(self) -> None:
+        self.inserted = 0
+        self.rejected = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "errors": [{"line": line, "message": message} for line, message in self.errors],
+        }
+
+
+def format_for(filename: str, default: str = "csv") -> str:
+    """
+    Guess the file format from its extension.
+    """
+    suffix = Path(filename).suffix.lower().lstrip(".")
+    if suffix in ("jsonl", "ndjson"):
+        return "jsonl"
+    if suffix == "csv":
+        return "csv"
+    return default
+
+
+def iter_records(stream: TextIO, fmt: str, result: ImportResult) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (line number, record) pairs from a CSV (with header) or JSONL stream.
+
+    Lines that cannot be parsed are reported on result and skipped.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                result.reject(line_number, f"Invalid JSON: {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                result.reject(line_number, "Expected a JSON object")
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {FORMATS}")
+
+
+def _text(record: Dict[str, Any], field: str) -> str:
+    value = record.get(field)
+    text = "" if value is None else str(value).strip()
+    if not text:
+        raise ValueError(f"{field} is required")
+    return text
+
+
+def _integer(record: Dict[str, Any], field: str) -> int:
+    text = _text(record, field)
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"{field} must be an integer, got {text!r}") from None
+
+
+def validate_employee(record: Dict[str, Any]) -> Tuple[str, int, str, int, str]:
+    """
+    Return (name, age, phone, security_level, password) or raise ValueError.
+    """
+    name = _text(record, "name")
+    age = _integer(record, "age")
+    phone = _text(record, "phone")
+    security_level = _integer(record, "security_level")
+    password = record.get("password")
+    if password is None or str(password) == "":
+        raise ValueError("password is required")
+    if not 0 < age < 150:
+        raise ValueError(f"age out of range: {age}")
+    return name, age, phone, security_level, str(password)
+
+
+def validate_pay_raise(record: Dict[str, Any]) -> Tuple[int, str, float]:
+    """
+    Return (emp_id, pay_raise_date, amount) or raise ValueError.
+    """
+    emp_id = _integer(record, "emp_id")
+    pay_raise_date = _text(record, "pay_raise_date")
+    try:
+        date.fromisoformat(pay_raise_date)
+    except ValueError:
+        raise ValueError(f"pay_raise_date must be YYYY-MM-DD, got {pay_raise_date!r}") from None
+    amount_text = _text(record, "raise_amt")
+    try:
+        amount = float(amount_text)
+    except ValueError:
+        raise ValueError(f"raise_amt must be numeric, got {amount_text!r}") from None
+    if not math.isfinite(amount):
+        raise ValueError(f"raise_amt must be a finite number, got {amount_text!r}")
+    return emp_id, pay_raise_date, amount
+
+
+def _strict_check(result: ImportResult, strict: bool) -> Callable[[sqlite3.Connection], None]:
+    # Runs just before the import commits; raising rolls everything back.
+    def check(connection: sqlite3.Connection) -> None:
+        if strict and result.rejected:
+            raise ValueError(f"{result.rejected} invalid rows; nothing was imported")
+
+    return check
+
+
+# Employees are validated, encrypted and hashed into this per-connection
+# TEMP table first. Writing it does not lock company.db, so the slow scrypt
+# work happens before the import takes the write lock.
+EMPLOYEE_STAGING_SQL = """
+    CREATE TEMP TABLE EmployeeImport (
+        Seq INTEGER PRIMARY KEY,
+        Name BLOB NOT NULL,
+        NameIdx BLOB NOT NULL,
+        Age INTEGER NOT NULL,
+        PhNum BLOB NOT NULL,
+        SecurityLevel INTEGER NOT NULL,
+        LoginPassword TEXT NOT NULL
+    );
+"""
+
+
+def import_employees(
+    connection: sqlite3.Connection,
+    records: Iterable[Tuple[int, Dict[str, Any]]],
+    result: ImportResult,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    strict: bool = False,
+    max_rows: Optional[int] = None,
+) -> ImportResult:
+    """
+    Validate and insert employees in one transaction.
+
+    Every password costs a full scrypt hash, so rows are first encrypted and
+    hashed chunk by chunk into a TEMP staging table, outside any write
+    transaction on company.db. The staged rows are then copied into
+    Employee and indexed in one short transaction.
+
+    Invalid rows are reported on result and skipped; with strict=True any
+    invalid row means nothing is inserted. With max_rows set, a file with
+    more valid rows than that raises ValueError and nothing is inserted.
+    """
+    def valid_rows() -> Iterator[Tuple[None, str, int, str, int, str]]:
+        accepted = 0
+        for line, record in records:
+            try:
+                name, age, phone, security_level, password = validate_employee(record)
+            except ValueError as e:
+                result.reject(line, str(e))
+                continue
+            accepted += 1
+            if max_rows is not None and accepted > max_rows:
+                raise ValueError(f"more than {max_rows} employees; nothing was imported")
+            yield None, name, age, phone, security_level, password
+
+    strict_check = _strict_check(result, strict)
+    if connection.in_transaction:
+        connection.commit()
+    connection.execute("DROP TABLE IF EXISTS temp.EmployeeImport;")
+    connection.execute(EMPLOYEE_STAGING_SQL)
+    try:
+        for chunk in bulk_load.iter_chunks(valid_rows(), chunk_size):
+            connection.executemany(
+                """
+                INSERT INTO temp.EmployeeImport (Name, NameIdx, Age, PhNum, SecurityLevel, LoginPassword)
+                VALUES (?, ?, ?, ?, ?, ?);
+                """,
+                [row[1:] for row in employee_create_db.encrypt_employee_rows(chunk)],
+            )
+            connection.commit()
+        strict_check(connection)
+
+        connection.execute("BEGIN IMMEDIATE;")
+        last_id = connection.execute("SELECT COALESCE(MAX(UserId), 0) FROM Employee;").fetchone()[0]
+        result.inserted = connection.execute(
+            """
+            INSERT INTO Employee (Name, NameIdx, Age, PhNum, SecurityLevel, LoginPassword)
+            SELECT Name, NameIdx, Age, PhNum, SecurityLevel, LoginPassword
+            FROM temp.EmployeeImport ORDER BY Seq;
+            """
+        ).rowcount
+        # New rows got their UserIds from SQLite, so index them from the table.
+        search_index.index_after(connection, last_id, chunk_size)
+        connection.commit()
+    finally:
+        # Rolls back a failed copy; the staged rows are dropped either way.
+        if connection.in_transaction:
+            connection.rollback()
+        connection.execute("DROP TABLE IF EXISTS temp.EmployeeImport;")
+    return result
+
+
+def import_pay_raises(
+    connection: sqlite3.Connection,
+    records: Iterable[Tuple[int, Dict[str, Any]]],
+    result: ImportResult,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    strict: bool = False,
+) -> ImportResult:
+    """
+    Validate and insert pay raises in one transaction, chunk by chunk.
+
+    Employee IDs are checked once per chunk rather than per row, and the
+    report aggregates are updated in the same transaction.
+    """
+    # Line numbers of validated rows not yet encrypted, in input order.
+    lines: Deque[int] = deque()
+    deltas: reporting.Deltas = {}
+
+    def valid_rows() -> Iterator[Tuple[None, int, str, float]]:
+        for line, record in records:
+            try:
+                emp_id, pay_raise_date, amount = validate_pay_raise(record)
+            except ValueError as e:
+                result.reject(line, str(e))
+                continue
+            lines.append(line)
+            yield None, emp_id, pay_raise_date, amount
+
+    def encrypt(chunk: Sequence[Tuple[None, int, str, float]]) -> List[Tuple[None, int, str, bytes]]:
+        emp_ids = sorted({emp_id for _, emp_id, _, _ in chunk})
+        known = set()
+        for start in range(0, len(emp_ids), 500):
+            part = emp_ids[start:start + 500]
+            known.update(
+                row[0]
+                for row in connection.execute(
+                    f"SELECT UserId FROM Employee WHERE UserId IN ({', '.join('?' * len(part))});", part
+                )
+            )
+        accepted = []
+        for row in chunk:
+            line = lines.popleft()
+            if row[1] not in known:
+                result.reject(line, f"Employee ID {row[1]} does not exist")
+                continue
+            accepted.append(row)
+            reporting.add_delta(deltas, row[1], row[2], f"{row[3]:.2f}")
+        return payraise_create_db.encrypt_pay_raise_rows(accepted)
+
+    strict_check = _strict_check(result, strict)
+
+    def before_commit(conn: sqlite3.Connection) -> None:
+        strict_check(conn)
+        reporting.apply_deltas(conn, deltas)
+
+    result.inserted = bulk_load.load_rows(
+        connection,
+        payraise_create_db.INSERT_SQL,
+        valid_rows(),
+        encrypt,
+        chunk_size=chunk_size,
+        progress_every=0,
+        before_commit=before_commit,
+    )
+    return result
+
+
+def import_stream(
+    connection: sqlite3.Connection,
+    kind: str,
+    stream: TextIO,
+    fmt: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    strict: bool = False,
+    result: Optional[ImportResult] = None,
+    max_employees: Optional[int] = None,
+) -> ImportResult:
+    """
+    Import employees or payraises from a text stream.
+
+    With strict=True a file containing any invalid row raises ValueError
+    and nothing is inserted; pass result to still see the row errors.
+    max_employees caps employee imports, whose password hashing is slow.
+    """
+    result = result if result is not None else ImportResult()
+    records = iter_records(stream, fmt, result)
+    if kind == "employees":
+        return import_employees(connection, records, result, chunk_size, strict, max_employees)
+    if kind == "payraises":
+        return import_pay_raises(connection, records, result, chunk_size, strict)
+    raise ValueError(f"Unknown kind {kind!r}; expected one of {KINDS}")
+
+
+def _keyset_chunks(
+    connection: sqlite3.Connection, sql: str, chunk_size: int
+) -> Iterator[List[sqlite3.Row]]:
+    last_id = 0
+    while True:
+        rows = connection.execute(sql, (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def export_rows(connection: sqlite3.Connection, kind: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield decrypted employees or payraises in primary-key order.
+
+    Rows are read and decrypted one keyset chunk at a time, so memory does
+    not grow with the table.
+    """
+    if kind == "employees":
+        sql = (
+            "SELECT UserId, Name, Age, PhNum, SecurityLevel FROM Employee "
+            "WHERE UserId > ? ORDER BY UserId LIMIT ?;"
+        )
+        for rows in _keyset_chunks(connection, sql, chunk_size):
+            names = security_utils.decrypt_many([row[1] for row in rows], cache=True)
+            phones = security_utils.decrypt_many([row[3] for row in rows])
+            for row, name, phone in zip(rows, names, phones):
+                yield dict(zip(EMPLOYEE_EXPORT_FIELDS, (row[0], name, row[2], phone, row[4])))
+    elif kind == "payraises":
+        sql = (
+            "SELECT PayRaiseId, EmpId, PayRaiseDate, RaiseAmt FROM EmpPayRaise "
+            "WHERE PayRaiseId > ? ORDER BY PayRaiseId LIMIT ?;"
+        )
+        for rows in _keyset_chunks(connection, sql, chunk_size):
+            amounts = security_utils.decrypt_many([row[3] for row in rows])
+            for row, amount in zip(rows, amounts):
+                yield dict(zip(PAY_RAISE_EXPORT_FIELDS, (row[0], row[1], row[2], amount)))
+    else:
+        raise ValueError(f"Unknown kind {kind!r}; expected one of {KINDS}")
+
+
+def export_lines(
+    connection: sqlite3.Connection, kind: str, fmt: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Yield the export as CSV (with header) or JSONL text, one line at a time.
+    """
+    fields = EMPLOYEE_EXPORT_FIELDS if kind == "employees" else PAY_RAISE_EXPORT_FIELDS
+    if fmt == "jsonl":
+        for record in export_rows(connection, kind, chunk_size):
+            yield json.dumps(record) + "\n"
+        return
+    if fmt != "csv":
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {FORMATS}")
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+
+    def flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writeheader()
+    yield flush()
+    for record in export_rows(connection, kind, chunk_size):
+        writer.writerow(record)
+        yield flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import or export encrypted employees and pay raises.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("import", "export"):
+        sub = commands.add_parser(command)
+        sub.add_argument("kind", choices=KINDS)
+        sub.add_argument("path", help="File to read or write; '-' for stdin/stdout.")
+        sub.add_argument("--format", choices=FORMATS, help="Defaults to the file extension, else csv.")
+        sub.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per encrypt/decrypt batch.")
+        if command == "import":
+            sub.add_argument("--strict", action="store_true", help="Import nothing if any row is invalid.")
+    args = parser.parse_args()
+    fmt = args.format or format_for(args.path)
+
+    connection = configure_connection(sqlite3.connect(DB_PATH))
+    migrations.migrate(connection)
+    try:
+        if args.command == "import":
+            stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8-sig")
+            result = ImportResult()
+            try:
+                import_stream(connection, args.kind, stream, fmt, args.chunk_size, args.strict, result)
+            except ValueError as e:
+                aborted: Optional[str] = str(e)
+            else:
+                aborted = None
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+            for line, message in result.errors:
+                print(f"line {line}: {message}", file=sys.stderr)
+            if aborted:
+                print(f"Import aborted: {aborted}", file=sys.stderr)
+                raise SystemExit(1)
+            print(f"{result.inserted} {args.kind} imported, {result.rejected} rejected.")
+        else:
+            out = sys.stdout if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+            try:
+                out.writelines(export_lines(connection, args.kind, fmt, args.chunk_size))
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
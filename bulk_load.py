@@ -0,0 +1,74 @@
+"""
+Program: Bulk Loading Helpers
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Stream large row sets into SQLite in encrypted chunks with bounded memory.
+"""
+from __future__ import annotations
+
+import sqlite3
+import time
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def iter_chunks(rows: Iterable[_T], size: int) -> Iterator[List[_T]]:
+    """
+    Yield lists of at most size items from rows without materializing it.
+    """
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def load_rows(
+    connection: sqlite3.Connection,
+    sql: str,
+    rows: Iterable[_T],
+    encrypt: Callable[[Sequence[_T]], List[_R]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress_every: int = 100_000,
+    before_commit: Optional[Callable[[sqlite3.Connection], None]] = None,
+) -> int:
+    """
+    Encrypt and insert rows chunk by chunk inside a single transaction.
+
+    Only one chunk of plaintext and ciphertext is held in memory at a time.
+    encrypt receives each chunk and returns the parameter tuples for sql;
+    it is expected to use security_utils.encrypt_many so large chunks are
+    spread over the crypto worker pool, and may drop rows it rejects.
+
+    before_commit, if given, runs after the last chunk inside the same
+    transaction, e.g. to update derived tables. Returns the number of rows
+    inserted. The transaction is rolled back if any chunk fails.
+    """
+    if connection.in_transaction:
+        connection.commit()
+    started = time.perf_counter()
+    total = 0
+    next_report = progress_every
+    connection.execute("BEGIN;")
+    try:
+        for chunk in iter_chunks(rows, chunk_size):
+            params = encrypt(chunk)
+            connection.executemany(sql, params)
+            total += len(params)
+            if progress_every and total >= next_report:
+                elapsed = time.perf_counter() - started
+                print(f"  {total} rows loaded ({total / elapsed:,.0f} rows/s)")
+                next_report += progress_every
+        if before_commit is not None:
+            before_commit(connection)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return total
@@ -0,0 +1,217 @@
+"""
+Program: Login Credentials
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Hash login passwords with scrypt and verify them on a bounded thread pool.
+"""
+from __future__ import annotations
+
+import base64
+import functools
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, List, Optional, Sequence
+
+from cryptography.exceptions import InvalidKey
+from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+import security_utils
+
+# scrypt cost: N = 2 ** log_n, block size r, parallelism p. 2**14 with r=8
+# takes about 16 MiB and tens of milliseconds per hash.
+DEFAULT_LOG_N = 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+HASH_PREFIX = "scrypt$"
+
+DEFAULT_WORKERS = 2
+# Threads for hash_many (imports, migrations), kept apart from the login
+# verifier so a bulk job never queues ahead of logins.
+DEFAULT_BULK_WORKERS = 2
+# Verifications allowed to wait for a worker before new logins are turned away.
+DEFAULT_MAX_PENDING = 16
+DEFAULT_TIMEOUT = 10.0
+
+
+class VerifierBusy(Exception):
+    """
+    Raised when the verification pool is saturated.
+    """
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _kdf(salt: bytes, log_n: int, r: int, p: int) -> Scrypt:
+    return Scrypt(salt=salt, length=HASH_BYTES, n=2 ** log_n, r=r, p=p)
+
+
+def hash_password(password: str, log_n: int = DEFAULT_LOG_N) -> str:
+    """
+    Return "scrypt$<log_n>$<r>$<p>$<salt>$<hash>" for password.
+
+    The cost parameters travel with the hash, so raising DEFAULT_LOG_N
+    later leaves existing hashes verifiable.
+    """
+    salt = os.urandom(SALT_BYTES)
+    derived = _kdf(salt, log_n, SCRYPT_R, SCRYPT_P).derive(password.encode("utf-8"))
+    return f"{HASH_PREFIX}{log_n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(derived)}"
+
+
+def hash_many(passwords: Sequence[str], log_n: int = DEFAULT_LOG_N) -> List[str]:
+    """
+    Hash many passwords across the bulk hashing threads.
+    """
+    if len(passwords) < 2:
+        return [hash_password(password, log_n) for password in passwords]
+    return list(get_bulk_executor().map(lambda password: hash_password(password, log_n), passwords))
+
+
+def is_password_hash(stored: Any) -> bool:
+    """
+    True for scrypt hashes; False for legacy Fernet-encrypted passwords.
+    """
+    return isinstance(stored, str) and stored.startswith(HASH_PREFIX)
+
+
+def needs_rehash(stored: Any, log_n: int = DEFAULT_LOG_N) -> bool:
+    """
+    True if stored is a legacy encrypted password or a cheaper scrypt hash.
+    """
+    if not is_password_hash(stored):
+        return True
+    try:
+        stored_log_n, r, p = (int(part) for part in stored[len(HASH_PREFIX):].split("$")[:3])
+    except ValueError:
+        return True
+    return (stored_log_n, r, p) < (log_n, SCRYPT_R, SCRYPT_P)
+
+
+def verify_password(stored: Any, password: str) -> bool:
+    """
+    Check password against a stored scrypt hash or a legacy encrypted password.
+    """
+    if is_password_hash(stored):
+        try:
+            log_n, r, p, salt, expected = stored[len(HASH_PREFIX):].split("$")
+            _kdf(_unb64(salt), int(log_n), int(r), int(p)).verify(password.encode("utf-8"), _unb64(expected))
+        except (InvalidKey, ValueError):
+            return False
+        return True
+    try:
+        legacy = security_utils.decrypt_text(stored)
+    except (InvalidToken, TypeError, ValueError):
+        return False
+    return hmac.compare_digest(legacy.encode("utf-8"), password.encode("utf-8"))
+
+
+@functools.lru_cache(maxsize=None)
+def _dummy_hash() -> str:
+    # Verified against when a login names no known employee, so unknown and
+    # known names take the same time.
+    return hash_password("not-a-real-password")
+
+
+class CredentialVerifier:
+    """
+    Runs password hashing on a small thread pool.
+
+    Request threads hand the scrypt work to the pool and wait for it, so at
+    most `workers` hashes (and their memory) are in flight at once. When
+    more than max_pending verifications are queued, verify() raises
+    VerifierBusy instead of letting a login flood tie up every request thread;
+    so does a verification that outlasts timeout. A timed-out job keeps its
+    place in the queue until it finishes.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="credentials")
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _run(self, func: Any, *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            raise VerifierBusy("too many logins in progress")
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is freed when the job finishes, not when the caller stops
+        # waiting, so jobs abandoned after a timeout still count.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise VerifierBusy(f"password check took longer than {self.timeout:g}s") from None
+
+    def verify(self, stored: Optional[Any], password: str) -> bool:
+        """
+        Verify password against stored; with stored None, spend the same
+        time against a dummy hash and return False.
+        """
+        if stored is None:
+            self._run(verify_password, _dummy_hash(), password)
+            return False
+        return self._run(verify_password, stored, password)
+
+    def hash(self, password: str, log_n: int = DEFAULT_LOG_N) -> str:
+        return self._run(hash_password, password, log_n)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_VERIFIER: Optional[CredentialVerifier] = None
+_BULK_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_VERIFIER_LOCK = threading.Lock()
+
+
+def get_bulk_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide pool used by hash_many, creating it on first use.
+    """
+    global _BULK_EXECUTOR
+    with _VERIFIER_LOCK:
+        if _BULK_EXECUTOR is None:
+            _BULK_EXECUTOR = ThreadPoolExecutor(max_workers=DEFAULT_BULK_WORKERS, thread_name_prefix="bulk-hash")
+        return _BULK_EXECUTOR
+
+
+def get_verifier() -> CredentialVerifier:
+    """
+    Return the process-wide verifier, creating it with the defaults on first use.
+    """
+    global _VERIFIER
+    with _VERIFIER_LOCK:
+        if _VERIFIER is None:
+            _VERIFIER = CredentialVerifier()
+        return _VERIFIER
+
+
+def configure_verifier(workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING) -> CredentialVerifier:
+    """
+    Replace the process-wide verifier with one of the given size.
+    """
+    global _VERIFIER
+    with _VERIFIER_LOCK:
+        if _VERIFIER is not None:
+            _VERIFIER.shutdown()
+        _VERIFIER = CredentialVerifier(workers=workers, max_pending=max_pending)
+        return _VERIFIER
@@ -0,0 +1,220 @@
+"""
+Program: Envelope Data Keys
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Keep column data keys wrapped by the master Fernet key and cache them unwrapped in memory.
+"""
+from __future__ import annotations
+
+import base64
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from db_pool import configure_connection
+
+KEYRING_FILE = Path(__file__).resolve().parent / "keyring.db"
+# Unwrapped keys, and the choice of active key, are trusted for this long
+# before being re-read, so a rotation made by another process is picked up.
+DEFAULT_CACHE_TTL = 300.0
+DEFAULT_MAX_CACHED = 64
+
+
+class DataKey:
+    """
+    One unwrapped data key and the ciphers derived from it.
+    """
+
+    __slots__ = ("key_id", "fernet", "_secret", "_aead")
+
+    def __init__(self, key_id: int, secret: bytes) -> None:
+        self.key_id = key_id
+        self.fernet = Fernet(secret)
+        self._secret = secret
+        self._aead: Dict[str, Any] = {}
+
+    def aead(self, name: str, factory: Callable[[bytes], Any]) -> Any:
+        """
+        Return an AEAD cipher keyed by an HKDF derivation of this data key,
+        so each algorithm gets its own independent 256-bit key.
+        """
+        cipher = self._aead.get(name)
+        if cipher is None:
+            derived = HKDF(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=None,
+                info=b"column-encryption:" + name.encode("ascii"),
+            ).derive(base64.urlsafe_b64decode(self._secret))
+            cipher = self._aead[name] = factory(derived)
+        return cipher
+
+
+class DataKeyRing:
+    """
+    Data keys stored wrapped (Fernet-encrypted) by the master key.
+
+    The newest key is active and encrypts new values; older keys remain
+    available for decryption until they are retired. Rotating either the
+    data key or the master key only touches the small DataKey table.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        master: Fernet,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        max_cached: int = DEFAULT_MAX_CACHED,
+    ) -> None:
+        self.path = str(path)
+        self.master = master
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self.unwraps = 0
+        self._keys: "OrderedDict[int, Tuple[DataKey, float]]" = OrderedDict()
+        self._active: Optional[Tuple[int, DataKey, float]] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened per lookup rather than held open: lookups only happen on a
+        # cache miss, and the ring is copied into forked crypto workers.
+        connection = configure_connection(sqlite3.connect(self.path, isolation_level=None))
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS DataKey (
+                KeyId INTEGER PRIMARY KEY,
+                WrappedKey BLOB NOT NULL,
+                CreatedAt REAL NOT NULL
+            );
+            """
+        )
+        return connection
+
+    def _unwrap(self, key_id: int, wrapped: bytes) -> DataKey:
+        key = DataKey(key_id, self.master.decrypt(wrapped))
+        self.unwraps += 1
+        self._keys[key_id] = (key, time.monotonic() + self.cache_ttl)
+        self._keys.move_to_end(key_id)
+        while len(self._keys) > self.max_cached:
+            self._keys.popitem(last=False)
+        return key
+
+    def _insert_key(self, connection: sqlite3.Connection) -> int:
+        cursor = connection.execute(
+            "INSERT INTO DataKey (WrappedKey, CreatedAt) VALUES (?, ?);",
+            (self.master.encrypt(Fernet.generate_key()), time.time()),
+        )
+        return cursor.lastrowid
+
+    def active(self) -> Tuple[int, DataKey]:
+        """
+        Return (key_id, key) for the key new values are encrypted with,
+        creating the first data key if the ring is empty.
+        """
+        with self._lock:
+            if self._active is not None and self._active[2] > time.monotonic():
+                return self._active[0], self._active[1]
+            with closing(self._connect()) as connection:
+                row = connection.execute("SELECT KeyId, WrappedKey FROM DataKey ORDER BY KeyId DESC LIMIT 1;").fetchone()
+                if row is None:
+                    connection.execute("BEGIN IMMEDIATE;")
+                    row = connection.execute(
+                        "SELECT KeyId, WrappedKey FROM DataKey ORDER BY KeyId DESC LIMIT 1;"
+                    ).fetchone()
+                    if row is None:
+                        self._insert_key(connection)
+                        row = connection.execute(
+                            "SELECT KeyId, WrappedKey FROM DataKey ORDER BY KeyId DESC LIMIT 1;"
+                        ).fetchone()
+                    connection.execute("COMMIT;")
+            key_id, wrapped = row
+            key = self._unwrap(key_id, wrapped)
+            self._active = (key_id, key, time.monotonic() + self.cache_ttl)
+            return key_id, key
+
+    def get(self, key_id: int) -> DataKey:
+        """
+        Return the unwrapped data key for key_id, raising InvalidToken if the
+        key is unknown or has been retired.
+        """
+        with self._lock:
+            entry = self._keys.get(key_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._keys.move_to_end(key_id)
+                return entry[0]
+            with closing(self._connect()) as connection:
+                row = connection.execute("SELECT WrappedKey FROM DataKey WHERE KeyId = ?;", (key_id,)).fetchone()
+            if row is None:
+                self._keys.pop(key_id, None)
+                raise InvalidToken(f"unknown data key {key_id}")
+            return self._unwrap(key_id, row[0])
+
+    def rotate(self) -> int:
+        """
+        Create a new data key and make it the active one. Returns its ID.
+        """
+        with self._lock:
+            with closing(self._connect()) as connection:
+                key_id = self._insert_key(connection)
+            self._active = None
+        return key_id
+
+    def retire(self, key_id: int) -> None:
+        """
+        Delete a data key. Values still encrypted with it become unreadable,
+        so only retire keys the re-encryption job has moved everything off.
+        """
+        with self._lock:
+            with closing(self._connect()) as connection:
+                newest = connection.execute("SELECT MAX(KeyId) FROM DataKey;").fetchone()[0]
+                if key_id == newest:
+                    raise ValueError(f"data key {key_id} is active and cannot be retired")
+                connection.execute("DELETE FROM DataKey WHERE KeyId = ?;", (key_id,))
+            self._keys.pop(key_id, None)
+
+    def rewrap(self, new_master: Fernet) -> int:
+        """
+        Re-wrap every data key under new_master in one transaction.
+
+        Returns the number of keys re-wrapped. The caller is responsible for
+        persisting new_master before any other process needs it.
+        """
+        with self._lock:
+            with closing(self._connect()) as connection:
+                connection.execute("BEGIN IMMEDIATE;")
+                try:
+                    rows = connection.execute("SELECT KeyId, WrappedKey FROM DataKey;").fetchall()
+                    connection.executemany(
+                        "UPDATE DataKey SET WrappedKey = ? WHERE KeyId = ?;",
+                        [(new_master.encrypt(self.master.decrypt(wrapped)), key_id) for key_id, wrapped in rows],
+                    )
+                    connection.execute("COMMIT;")
+                except Exception:
+                    connection.execute("ROLLBACK;")
+                    raise
+            self.master = new_master
+            self._keys.clear()
+            self._active = None
+        return len(rows)
+
+    def keys(self) -> List[Dict[str, Any]]:
+        """
+        Describe every stored data key, oldest first.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT KeyId, CreatedAt FROM DataKey ORDER BY KeyId;").fetchall()
+        newest = rows[-1][0] if rows else None
+        return [{"key_id": key_id, "created_at": created_at, "active": key_id == newest} for key_id, created_at in rows]
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._active = None
@@ -0,0 +1,126 @@
+"""
+Program: SQLite Connection Pool
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Share tuned SQLite connections between the Flask app and the deletion server.
+"""
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Type, Union
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CACHED_STATEMENTS = 256
+
+# Applied once when a pooled connection is opened, not on every checkout.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",  # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456;",  # 256 MB
+    "PRAGMA busy_timeout = 5000;",
+)
+
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """
+    Apply the shared per-connection PRAGMA settings.
+    """
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections.
+
+    Connections are created lazily up to size and handed out most-recently-used
+    first so hot connections keep their page and statement caches warm.
+    """
+
+    def __init__(
+        self,
+        database: Union[str, Path],
+        size: int = DEFAULT_POOL_SIZE,
+        row_factory: Optional[Callable[[sqlite3.Cursor, tuple], Any]] = None,
+        cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+        timeout: Optional[float] = 30.0,
+        factory: Type[sqlite3.Connection] = sqlite3.Connection,
+    ) -> None:
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.database = str(database)
+        self.size = size
+        self.row_factory = row_factory
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.factory = factory
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.database,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=self.factory,
+        )
+        configure_connection(conn)
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Check out a connection, opening a new one if the pool is not yet full.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._open()
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"timed out waiting for a database connection (pool size {self.size})"
+            ) from None
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """
+        Return a connection to the pool, rolling back any open transaction.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out a connection for the duration of a with block.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self) -> None:
+        """
+        Close every connection the pool has opened.
+        """
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
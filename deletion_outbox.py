@@ -0,0 +1,304 @@
+"""
+Program: Pay Raise Deletion Outbox
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Queue deletion requests in the web app and deliver them to the deletion server in the background.
+"""
+from __future__ import annotations
+
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import security_utils
+from db_pool import configure_connection
+from deletion_protocol import DeletionClient, ProtocolError, format_batch_message
+
+# Record states. queued and retrying are pending; the rest are final.
+QUEUED = "queued"
+RETRYING = "retrying"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+# Server statuses that settle a record; anything else is retried.
+FINAL_SERVER_STATUSES = {"deleted", "not_found", "invalid"}
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 60.0
+# Settled records stay queryable through the status endpoint this long.
+DEFAULT_RETENTION = 3600.0
+# How often an idle sender looks for retries that have come due.
+IDLE_POLL_INTERVAL = 1.0
+
+
+class MemoryOutboxStore:
+    """
+    In-process outbox. Pending requests are lost if the app restarts.
+    """
+
+    def __init__(self, retention: float = DEFAULT_RETENTION) -> None:
+        self.retention = retention
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records[record["request_id"]] = record
+
+    def due(self, limit: int, now: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            pending = [
+                dict(record)
+                for record in self._records.values()
+                if record["status"] in (QUEUED, RETRYING) and record["next_attempt_at"] <= now
+            ]
+        return pending[:limit]
+
+    def update(self, request_id: str, **fields: Any) -> None:
+        with self._lock:
+            record = self._records.get(request_id)
+            if record is not None:
+                record.update(fields)
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(request_id)
+            return dict(record) if record is not None else None
+
+    def prune(self, now: float) -> None:
+        with self._lock:
+            expired = [
+                request_id
+                for request_id, record in self._records.items()
+                if record["status"] in (DELIVERED, FAILED) and record["updated_at"] + self.retention < now
+            ]
+            for request_id in expired:
+                del self._records[request_id]
+
+
+class SqliteOutboxStore:
+    """
+    Durable outbox spooled to its own SQLite file so queued requests survive restarts.
+    """
+
+    COLUMNS = (
+        "request_id",
+        "emp_id",
+        "pay_raise_date",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "server_status",
+        "message",
+        "created_at",
+        "updated_at",
+    )
+
+    def __init__(self, path: Union[str, Path], retention: float = DEFAULT_RETENTION) -> None:
+        self.retention = retention
+        self._conn = configure_connection(sqlite3.connect(str(path), check_same_thread=False))
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS DeletionOutbox (
+                    request_id TEXT PRIMARY KEY,
+                    emp_id INTEGER NOT NULL,
+                    pay_raise_date TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    server_status TEXT,
+                    message TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_due ON DeletionOutbox (status, next_attempt_at);"
+            )
+            self._conn.commit()
+
+    def _row_to_record(self, row: tuple) -> Dict[str, Any]:
+        return dict(zip(self.COLUMNS, row))
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO DeletionOutbox ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))});",
+                tuple(record[column] for column in self.COLUMNS),
+            )
+            self._conn.commit()
+
+    def due(self, limit: int, now: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT {', '.join(self.COLUMNS)}
+                FROM DeletionOutbox
+                WHERE status IN (?, ?) AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?;
+                """,
+                (QUEUED, RETRYING, now, limit),
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def update(self, request_id: str, **fields: Any) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE DeletionOutbox SET {assignments} WHERE request_id = ?;",
+                (*fields.values(), request_id),
+            )
+            self._conn.commit()
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM DeletionOutbox WHERE request_id = ?;",
+                (request_id,),
+            ).fetchone()
+        return self._row_to_record(row) if row is not None else None
+
+    def prune(self, now: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM DeletionOutbox WHERE status IN (?, ?) AND updated_at < ?;",
+                (DELIVERED, FAILED, now - self.retention),
+            )
+            self._conn.commit()
+
+
+class DeletionOutbox:
+    """
+    Background sender that drains queued deletion requests in batches.
+
+    submit() only records the request and wakes the sender, so the caller
+    never waits on the deletion server. Each drain sends up to batch_size
+    records as one encrypted batch message. Records the server could not
+    settle, or that hit a connection error, are retried with exponential
+    backoff and jitter until max_attempts is reached.
+    """
+
+    def __init__(
+        self,
+        client: DeletionClient,
+        store: Union[MemoryOutboxStore, SqliteOutboxStore, None] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_backoff: float = DEFAULT_BASE_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+    ) -> None:
+        self.client = client
+        self.store = store if store is not None else MemoryOutboxStore()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="deletion-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, emp_id: int, pay_raise_date: str) -> str:
+        """
+        Queue one deletion and return its request ID.
+        """
+        now = time.time()
+        request_id = uuid.uuid4().hex
+        self.store.add(
+            {
+                "request_id": request_id,
+                "emp_id": emp_id,
+                "pay_raise_date": pay_raise_date,
+                "status": QUEUED,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "server_status": None,
+                "message": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        self._wake.set()
+        return request_id
+
+    def status(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(request_id)
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_or_fail(self, record: Dict[str, Any], message: str, now: float) -> None:
+        attempts = record["attempts"] + 1
+        if attempts >= self.max_attempts:
+            self.store.update(record["request_id"], status=FAILED, attempts=attempts, message=message, updated_at=now)
+        else:
+            self.store.update(
+                record["request_id"],
+                status=RETRYING,
+                attempts=attempts,
+                next_attempt_at=now + self._backoff(attempts),
+                message=message,
+                updated_at=now,
+            )
+
+    def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        message = format_batch_message((record["emp_id"], record["pay_raise_date"]) for record in batch)
+        try:
+            reply = self.client.send(security_utils.encrypt_text(message))
+        except (OSError, ProtocolError) as e:
+            now = time.time()
+            for record in batch:
+                self._retry_or_fail(record, f"Deletion server unavailable: {e}", now)
+            return
+
+        # Single-record messages get a flat reply; batches list one result per record.
+        results = reply.get("results") or [reply] * len(batch)
+        now = time.time()
+        for record, result in zip(batch, results):
+            if result.get("status") in FINAL_SERVER_STATUSES:
+                self.store.update(
+                    record["request_id"],
+                    status=DELIVERED,
+                    attempts=record["attempts"] + 1,
+                    server_status=result["status"],
+                    message=result.get("message"),
+                    updated_at=now,
+                )
+            else:
+                self._retry_or_fail(record, result.get("message") or "Deletion server error", now)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            # Cleared before reading the store, so a submit() that lands
+            # after the read leaves the event set and the wait returns at once.
+            self._wake.clear()
+            now = time.time()
+            batch = self.store.due(self.batch_size, now)
+            if batch:
+                self._send_batch(batch)
+                continue
+            self.store.prune(now)
+            self._wake.wait(timeout=IDLE_POLL_INTERVAL)
@@ -0,0 +1,143 @@
+"""
+Program: Pay Raise Deletion Protocol
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Length-prefixed framing and a reusable client for the pay raise deletion server.
+"""
+from __future__ import annotations
+
+import json
+import socket
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+HOST = "localhost"
+PORT = 9999
+MESSAGE_SEPARATOR = "^%$"
+# A batch message holds several "EmpId^%$PayRaiseDate" records, one per line,
+# inside a single encrypted envelope.
+RECORD_SEPARATOR = "\n"
+
+# Every frame is a 4-byte big-endian payload length followed by the payload.
+# Requests carry one encrypted token; replies carry a small JSON status object.
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 1024 * 1024
+
+# Raw Fernet tokens always begin with the base64 form of the 0x80 version
+# byte, which no length header under MAX_FRAME_SIZE can start with. The
+# server uses this to keep accepting unframed one-shot messages.
+LEGACY_TOKEN_PREFIX = b"gA"
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a peer sends a malformed or oversized frame.
+    """
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ProtocolError("connection closed mid-frame")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """
+    Read one frame, returning None if the peer closed the connection cleanly.
+    """
+    header = _recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"frame of {size} bytes exceeds {MAX_FRAME_SIZE}")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        raise ProtocolError("connection closed mid-frame")
+    return payload
+
+
+def encode_reply(status: str, message: str, results: Optional[List[Dict[str, Any]]] = None) -> bytes:
+    reply: Dict[str, Any] = {"status": status, "message": message}
+    if results is not None:
+        reply["results"] = results
+    return json.dumps(reply).encode("utf-8")
+
+
+def decode_reply(payload: bytes) -> Dict[str, Any]:
+    return json.loads(payload.decode("utf-8"))
+
+
+def format_deletion_message(emp_id: int, pay_raise_date: str) -> str:
+    return f"{emp_id}{MESSAGE_SEPARATOR}{pay_raise_date}"
+
+
+def format_batch_message(records: Iterable[Tuple[int, str]]) -> str:
+    return RECORD_SEPARATOR.join(format_deletion_message(emp_id, date) for emp_id, date in records)
+
+
+class DeletionClient:
+    """
+    Thread-safe client that keeps one persistent connection to the server.
+
+    The connection is opened on first use and reopened once if the server
+    dropped it between requests.
+    """
+
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: float = 5.0) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        return self._sock
+
+    def _reset(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def send(self, token: bytes) -> Dict[str, Any]:
+        """
+        Send one encrypted request and wait for the server's status reply.
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    sock = self._connect()
+                    send_frame(sock, token)
+                    reply = recv_frame(sock)
+                    if reply is None:
+                        raise ConnectionResetError("server closed the connection")
+                    return decode_reply(reply)
+                except (OSError, ProtocolError):
+                    self._reset()
+                    if attempt:
+                        raise
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        with self._lock:
+            self._reset()
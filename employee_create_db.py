@@ -2,14 +2,21 @@
 Program: Employee Table Encryption Setup
 Author: betty phipps
 Date: 2025-11-13
-Purpose: Drop, recreate, and populate the Employee table with encrypted fields.
+Purpose: Migrate, reset, and populate the Employee table with encrypted fields.
 """
 from __future__ import annotations
 
+import argparse
+import random
 import sqlite3
+import time
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
+import bulk_load
+import credentials
+import migrations
+import search_index
 import security_utils
 
 DB_PATH = Path(__file__).resolve().parent / "company.db"
@@ -24,67 +31,224 @@ EMPLOYEE_ROWS: Iterable[Tuple[int, str, int, str, int, str]] = [
     (6, "Felix Brown", 45, "555-600-7766", 2, "Felix^Pass"),
 ]
 
+FIRST_NAMES = (
+    "Alice", "Brian", "Carla", "Dinesh", "Emily", "Felix", "Grace", "Hiro",
+    "Ines", "Jamal", "Keiko", "Luis", "Maya", "Noah", "Olga", "Priya",
+)
+LAST_NAMES = (
+    "Johnson", "Smith", "Gomez", "Patel", "Zhang", "Brown", "Okafor", "Tanaka",
+    "Silva", "Novak", "Kim", "Haddad", "Larsen", "Murphy", "Rossi", "Nguyen",
+)
+# Login password of every --employees row; hashed once per run.
+SYNTHETIC_PASSWORD = "Synth3tic!Pass"
+
+INSERT_SQL = """
+    INSERT INTO Employee (UserId, Name, NameIdx, Age, PhNum, SecurityLevel, LoginPassword)
+    VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+UPSERT_SQL = """
+    INSERT INTO Employee (UserId, Name, NameIdx, Age, PhNum, SecurityLevel, LoginPassword)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (UserId) DO UPDATE SET
+        Name = excluded.Name,
+        NameIdx = excluded.NameIdx,
+        Age = excluded.Age,
+        PhNum = excluded.PhNum,
+        SecurityLevel = excluded.SecurityLevel,
+        LoginPassword = excluded.LoginPassword;
+"""
+
+
+def encrypt_employee_row(
+    row: Tuple[int, str, int, str, int, str]
+) -> Tuple[int, bytes, bytes, int, bytes, int, str]:
+    return encrypt_employee_rows([row])[0]
+
+
+def encrypt_employee_rows(
+    rows: Sequence[Tuple[int, str, int, str, int, str]],
+    password_log_n: int = credentials.DEFAULT_LOG_N,
+    password_hash: Optional[str] = None,
+) -> List[Tuple[int, bytes, bytes, int, bytes, int, str]]:
+    """
+    Encrypt many employee rows at once, one encrypt_many batch per column.
+    Passwords are scrypt-hashed rather than encrypted; pass password_hash
+    to store that one hash for every row instead.
+    """
+    rows = list(rows)
+    names = security_utils.encrypt_many([row[1] for row in rows])
+    phones = security_utils.encrypt_many([row[3] for row in rows])
+    if password_hash is None:
+        passwords = credentials.hash_many([row[5] for row in rows], password_log_n)
+    else:
+        passwords = [password_hash] * len(rows)
+    return [
+        (user_id, enc_name, security_utils.blind_index(name), age, enc_phone, security_level, enc_password)
+        for (user_id, name, age, _, security_level, _), enc_name, enc_phone, enc_password in zip(
+            rows, names, phones, passwords
+        )
+    ]
+
+
+def backfill_name_index() -> None:
+    connection = sqlite3.connect(DB_PATH)
+    migrations.migrate(connection)
+    updated = migrations.backfill_name_index(connection)
+    connection.commit()
+    connection.close()
+    print(f"NameIdx backfilled for {updated} employee records.")
+
+
+def hash_passwords(log_n: int) -> None:
+    connection = sqlite3.connect(DB_PATH)
+    migrations.migrate(connection)
+    updated = migrations.hash_legacy_passwords(connection, log_n)
+    connection.commit()
+    connection.close()
+    print(f"LoginPassword hashed with scrypt for {updated} employee records.")
+
+
+def generate_employee_rows(count: int, first_id: int, seed: int) -> Iterator[Tuple[int, str, int, str, int, str]]:
+    """
+    Lazily yield count synthetic employees with UserIds starting at first_id.
+
+    Names carry the UserId so every generated login is unique; the same seed
+    always produces the same rows. Every generated employee shares
+    SYNTHETIC_PASSWORD.
+    """
+    rng = random.Random(seed)
+    for user_id in range(first_id, first_id + count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {user_id}"
+        phone = f"555-{rng.randrange(100, 1000)}-{rng.randrange(0, 10000):04d}"
+        yield user_id, name, rng.randrange(18, 66), phone, rng.randrange(1, 4), SYNTHETIC_PASSWORD
+
 
-def encrypt_employee_row(row: Tuple[int, str, int, str, int, str]) -> Tuple[int, bytes, int, bytes, int, bytes]:
-    user_id, name, age, phone, security_level, password = row
-    return (
-        user_id,
-        security_utils.encrypt_text(name),
-        age,
-        security_utils.encrypt_text(phone),
-        security_level,
-        security_utils.encrypt_text(password),
+def generate(count: int, seed: int, append: bool, chunk_size: int, password_log_n: int = credentials.DEFAULT_LOG_N) -> None:
+    """
+    Stream count synthetic employees into the table in one transaction.
+    """
+    connection = sqlite3.connect(DB_PATH)
+    version = migrations.migrate(connection)
+    print(f"Schema at version {version}.")
+
+    if not append:
+        connection.execute("DELETE FROM Employee;")
+        connection.commit()
+        print("Employee table cleared.")
+    first_id = connection.execute("SELECT COALESCE(MAX(UserId), 0) + 1 FROM Employee;").fetchone()[0]
+    # One scrypt hash for the whole run: hashing per row at full cost would
+    # take hours for a million employees.
+    password_hash = credentials.hash_password(SYNTHETIC_PASSWORD, password_log_n)
+
+    def encrypt_and_index(chunk: Sequence[Tuple[int, str, int, str, int, str]]) -> List[Tuple]:
+        # Index from the plaintext while it is at hand, in the same transaction.
+        search_index.index_employees(connection, [(row[0], row[1], row[3]) for row in chunk])
+        return encrypt_employee_rows(chunk, password_hash=password_hash)
+
+    started = time.perf_counter()
+    inserted = bulk_load.load_rows(
+        connection,
+        INSERT_SQL,
+        generate_employee_rows(count, first_id, seed),
+        encrypt_and_index,
+        chunk_size=chunk_size,
     )
+    elapsed = time.perf_counter() - started
+    print(f"{inserted} synthetic employee records inserted (UserId {first_id}-{first_id + inserted - 1}) in {elapsed:.1f}s.")
+    print(f"Every synthetic employee logs in with the password {SYNTHETIC_PASSWORD!r}.")
+    connection.close()
 
 
-def main() -> None:
+def main(append: bool = False) -> None:
     connection = sqlite3.connect(DB_PATH)
     cursor = connection.cursor()
 
-    cursor.execute("DROP TABLE IF EXISTS Employee;")
-    print("Employee table dropped.")
+    version = migrations.migrate(connection)
+    print(f"Schema at version {version}.")
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS Employee (
-            UserId INTEGER PRIMARY KEY,
-            Name BLOB NOT NULL,
-            Age INTEGER NOT NULL,
-            PhNum BLOB NOT NULL,
-            SecurityLevel INTEGER NOT NULL,
-            LoginPassword BLOB NOT NULL
-        );
-        """
-    )
-    print("Employee table created.")
+    if not append:
+        cursor.execute("DELETE FROM Employee;")
+        print("Employee table cleared.")
 
-    encrypted_rows = [encrypt_employee_row(row) for row in EMPLOYEE_ROWS]
+    encrypted_rows = encrypt_employee_rows(EMPLOYEE_ROWS)
 
-    cursor.executemany(
-        """
-        INSERT INTO Employee (UserId, Name, Age, PhNum, SecurityLevel, LoginPassword)
-        VALUES (?, ?, ?, ?, ?, ?);
-        """,
-        encrypted_rows,
-    )
+    cursor.executemany(UPSERT_SQL if append else INSERT_SQL, encrypted_rows)
+    if append:
+        search_index.remove_employees(connection, [row[0] for row in EMPLOYEE_ROWS])
+    search_index.index_employees(connection, [(row[0], row[1], row[3]) for row in EMPLOYEE_ROWS])
     connection.commit()
-    print(f"{len(encrypted_rows)} employee records inserted.")
+    print(f"{len(encrypted_rows)} employee records {'upserted' if append else 'inserted'}.")
 
-    cursor.execute("SELECT UserId, Name, Age, PhNum, SecurityLevel, LoginPassword FROM Employee;")
+    seeded_ids = [row[0] for row in encrypted_rows]
+    cursor.execute(
+        f"""
+        SELECT UserId, Name, Age, PhNum, SecurityLevel, LoginPassword
+        FROM Employee
+        WHERE UserId IN ({', '.join('?' * len(seeded_ids))})
+        ORDER BY UserId;
+        """,
+        seeded_ids,
+    )
     all_rows = cursor.fetchall()
     for db_row in all_rows:
         print(tuple(db_row))
 
+    # Passwords are one-way hashes now, so they come from the seed rows;
+    # names are still decrypted to show the round trip.
     print("\nDecrypted credentials for mentor validation:")
-    for user_id, enc_name, _, _, security_level, enc_password in all_rows:
-        name = security_utils.decrypt_text(enc_name)
-        password = security_utils.decrypt_text(enc_password)
-        print(f"UserId {user_id}: Name={name}, Password={password}, SecurityLevel={security_level}")
+    names = security_utils.decrypt_many([row[1] for row in all_rows])
+    seeded_passwords = {row[0]: row[5] for row in EMPLOYEE_ROWS}
+    for (user_id, _, _, _, security_level, _), name in zip(all_rows, names):
+        print(f"UserId {user_id}: Name={name}, Password={seeded_passwords[user_id]}, SecurityLevel={security_level}")
 
     connection.close()
     print("Connection closed.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Migrate and seed the encrypted Employee table.")
+    parser.add_argument(
+        "--backfill-name-index",
+        action="store_true",
+        help="Populate NameIdx on an existing Employee table instead of reseeding it.",
+    )
+    parser.add_argument(
+        "--employees",
+        type=int,
+        metavar="N",
+        help="Generate N synthetic employees instead of the six fixed rows.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --employees.")
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Keep existing rows: upsert the fixed rows, or add generated rows after the current max UserId.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=bulk_load.DEFAULT_CHUNK_SIZE,
+        help="Rows encrypted and inserted per executemany call.",
+    )
+    parser.add_argument(
+        "--hash-passwords",
+        action="store_true",
+        help="Replace legacy encrypted LoginPassword values with scrypt hashes instead of reseeding.",
+    )
+    parser.add_argument(
+        "--password-log-n",
+        type=int,
+        default=credentials.DEFAULT_LOG_N,
+        help="scrypt cost as log2(N) for seeded, generated (one shared hash) or --hash-passwords "
+        "passwords; weaker hashes are upgraded at the user's next login.",
+    )
+    args = parser.parse_args()
+    if args.backfill_name_index:
+        backfill_name_index()
+    elif args.hash_passwords:
+        hash_passwords(args.password_log_n)
+    elif args.employees is not None:
+        generate(args.employees, args.seed, args.append, args.chunk_size, args.password_log_n)
+    else:
+        main(append=args.append)
 
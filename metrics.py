@@ -0,0 +1,336 @@
+"""
+Program: Metrics Registry
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Lightweight counters, gauges and histograms rendered in Prometheus text format.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; suits both sub-millisecond SQLite calls and slow page renders.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Per-request operation counts, e.g. decrypts per page.
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Named collection of metrics that renders the Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Process-wide default registry.
+REGISTRY = Registry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics for registry on a daemon thread and return the server.
+    """
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class RequestTimings:
+    """
+    Time spent in SQLite and Fernet by the current request (or message).
+    """
+
+    __slots__ = (
+        "started",
+        "db_seconds",
+        "db_queries",
+        "decrypt_seconds",
+        "decrypt_count",
+        "render_seconds",
+        "render_mark",
+    )
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.decrypt_seconds = 0.0
+        self.decrypt_count = 0
+        self.render_seconds = 0.0
+        self.render_mark: Optional[Tuple[float, float, float]] = None
+
+    def begin_render(self) -> None:
+        self.render_mark = (time.perf_counter(), self.db_seconds, self.decrypt_seconds)
+
+    def end_render(self) -> None:
+        """
+        Add the render time since begin_render, excluding SQLite and Fernet
+        time spent meanwhile (streamed templates decrypt while rendering).
+        """
+        if self.render_mark is None:
+            return
+        started, db_before, decrypt_before = self.render_mark
+        elapsed = time.perf_counter() - started
+        overlap = (self.db_seconds - db_before) + (self.decrypt_seconds - decrypt_before)
+        self.render_seconds += max(0.0, elapsed - overlap)
+        self.render_mark = None
+
+
+_local = threading.local()
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _local.timings = timings
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return getattr(_local, "timings", None)
+
+
+def end_request() -> Optional[RequestTimings]:
+    timings = current_timings()
+    _local.timings = None
+    return timings
+
+
+def observe_crypto(operation: str, count: int, seconds: float) -> None:
+    """
+    security_utils observer: attribute decrypt work to the current request.
+    """
+    timings = current_timings()
+    if timings is not None and operation == "decrypt":
+        timings.decrypt_count += count
+        timings.decrypt_seconds += seconds
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that adds time spent executing and fetching to the current request.
+    """
+
+    def _timed(self, method: Any, *args: Any) -> Any:
+        timings = current_timings()
+        if timings is None:
+            return method(*args)
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            timings.db_seconds += time.perf_counter() - started
+
+    def execute(self, *args: Any) -> Any:
+        timings = current_timings()
+        if timings is not None:
+            timings.db_queries += 1
+        return self._timed(super().execute, *args)
+
+    def executemany(self, *args: Any) -> Any:
+        timings = current_timings()
+        if timings is not None:
+            timings.db_queries += 1
+        return self._timed(super().executemany, *args)
+
+    def fetchone(self) -> Any:
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, *args: Any) -> Any:
+        return self._timed(super().fetchmany, *args)
+
+    def fetchall(self) -> Any:
+        return self._timed(super().fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including those behind the execute shortcuts,
+    are TimedCursors.
+    """
+
+    def cursor(self, factory: Any = TimedCursor) -> sqlite3.Cursor:  # type: ignore[override]
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute builds its cursor internally without calling
+    # self.cursor(), so route the shortcuts through a TimedCursor explicitly.
+    def execute(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        return self.cursor().executemany(*args)
@@ -0,0 +1,372 @@
+"""
+Program: Schema Migration Runner
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Create and upgrade the company.db schema in place, tracked with PRAGMA user_version.
+"""
+from __future__ import annotations
+
+import sqlite3
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import credentials
+import security_utils
+
+DB_PATH = Path(__file__).resolve().parent / "company.db"
+
+# (table, integer primary key, encrypted columns), for jobs that walk every
+# ciphertext such as re-keying. Only BLOB values are ciphertext:
+# LoginPassword also holds scrypt hashes as TEXT, which those jobs skip.
+ENCRYPTED_COLUMNS: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = (
+    ("Employee", "UserId", ("Name", "PhNum", "LoginPassword")),
+    ("EmpPayRaise", "PayRaiseId", ("RaiseAmt",)),
+    ("PayRaiseAggregate", "AggregateId", ("TotalAmt",)),
+)
+# Encrypted columns the re-key job leaves alone. Sessions expire within
+# SESSION_TTL and are encrypted with the active key whenever they are saved,
+# so they move off an old key by themselves, but until then they still need
+# it: key usage counts them so the key is not retired under them.
+TRANSIENT_ENCRYPTED_COLUMNS: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = (
+    ("Session", "SessionId", ("Data",)),
+)
+
+
+def backfill_name_index(connection: sqlite3.Connection) -> int:
+    """
+    Populate NameIdx for Employee rows that do not have one yet.
+    Returns the number of rows updated. The caller commits.
+    """
+    rows = connection.execute("SELECT UserId, Name FROM Employee WHERE NameIdx IS NULL;").fetchall()
+    names = security_utils.decrypt_many([enc_name for _, enc_name in rows])
+    connection.executemany(
+        "UPDATE Employee SET NameIdx = ? WHERE UserId = ?;",
+        [(security_utils.blind_index(name), user_id) for (user_id, _), name in zip(rows, names)],
+    )
+    return len(rows)
+
+
+def hash_legacy_passwords(connection: sqlite3.Connection, log_n: int, chunk_size: int = 1000) -> int:
+    """
+    Replace Fernet-encrypted LoginPassword values with scrypt hashes.
+    Returns the number of rows updated. The caller commits.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            "SELECT UserId, LoginPassword FROM Employee WHERE UserId > ? AND typeof(LoginPassword) = 'blob' "
+            "ORDER BY UserId LIMIT ?;",
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+        hashes = credentials.hash_many(security_utils.decrypt_many([row[1] for row in rows]), log_n)
+        connection.executemany(
+            "UPDATE Employee SET LoginPassword = ? WHERE UserId = ?;",
+            [(password_hash, user_id) for (user_id, _), password_hash in zip(rows, hashes)],
+        )
+        updated += len(rows)
+
+
+def raise_year(pay_raise_date: str) -> int:
+    """
+    Year a raise is reported under; 0 if the date does not start with one.
+    """
+    try:
+        return int(pay_raise_date[:4])
+    except (TypeError, ValueError):
+        return 0
+
+
+def rebuild_pay_raise_aggregates(connection: sqlite3.Connection, chunk_size: int = 10_000) -> int:
+    """
+    Recompute PayRaiseAggregate from EmpPayRaise.
+
+    Raises are decrypted chunk by chunk, so memory grows with the number of
+    (EmpId, year) groups rather than rows. Returns the number of groups.
+    The caller commits.
+    """
+    totals: Dict[Tuple[int, int], List] = defaultdict(lambda: [Decimal(0), 0])
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            "SELECT PayRaiseId, EmpId, PayRaiseDate, RaiseAmt FROM EmpPayRaise WHERE PayRaiseId > ? "
+            "ORDER BY PayRaiseId LIMIT ?;",
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        amounts = security_utils.decrypt_many([row[3] for row in rows])
+        for (_, emp_id, pay_raise_date, _), amount in zip(rows, amounts):
+            group = totals[(emp_id, raise_year(pay_raise_date))]
+            group[0] += Decimal(amount)
+            group[1] += 1
+
+    connection.execute("DELETE FROM PayRaiseAggregate;")
+    keys = list(totals)
+    encrypted = security_utils.encrypt_many([f"{totals[key][0]:.2f}" for key in keys])
+    connection.executemany(
+        "INSERT INTO PayRaiseAggregate (EmpId, Year, TotalAmt, RaiseCount) VALUES (?, ?, ?, ?);",
+        [(emp_id, year, token, totals[(emp_id, year)][1]) for (emp_id, year), token in zip(keys, encrypted)],
+    )
+    return len(keys)
+
+
+def _column_names(connection: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table});")]
+
+
+def _create_employee(connection: sqlite3.Connection) -> None:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS Employee (
+            UserId INTEGER PRIMARY KEY,
+            Name BLOB NOT NULL,
+            Age INTEGER NOT NULL,
+            PhNum BLOB NOT NULL,
+            SecurityLevel INTEGER NOT NULL,
+            LoginPassword BLOB NOT NULL
+        );
+        """
+    )
+
+
+def _create_pay_raise(connection: sqlite3.Connection) -> None:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS EmpPayRaise (
+            PayRaiseId INTEGER PRIMARY KEY,
+            EmpId INTEGER NOT NULL,
+            PayRaiseDate TEXT NOT NULL,
+            RaiseAmt BLOB NOT NULL,
+            FOREIGN KEY (EmpId) REFERENCES Employee(UserId)
+        );
+        """
+    )
+
+
+def _add_name_index(connection: sqlite3.Connection) -> None:
+    if "NameIdx" not in _column_names(connection, "Employee"):
+        connection.execute("ALTER TABLE Employee ADD COLUMN NameIdx BLOB;")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_employee_name_idx ON Employee (NameIdx);")
+    backfill_name_index(connection)
+
+
+def _add_pay_raise_indexes(connection: sqlite3.Connection) -> None:
+    # my_pay_raises and the delete paths filter on EmpId (and PayRaiseDate);
+    # the listing pages order and paginate on (PayRaiseDate, PayRaiseId).
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_emppayraise_emp_date ON EmpPayRaise (EmpId, PayRaiseDate);"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_emppayraise_date_id ON EmpPayRaise (PayRaiseDate, PayRaiseId);"
+    )
+
+
+def _create_rekey_checkpoint(connection: sqlite3.Connection) -> None:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS RekeyCheckpoint (
+            TableName TEXT PRIMARY KEY,
+            TargetKeyId INTEGER NOT NULL,
+            LastId INTEGER,
+            Rotated INTEGER NOT NULL,
+            Completed INTEGER NOT NULL,
+            UpdatedAt REAL NOT NULL
+        );
+        """
+    )
+
+
+def _add_rekey_target_cipher(connection: sqlite3.Connection) -> None:
+    if "TargetCipher" not in _column_names(connection, "RekeyCheckpoint"):
+        connection.execute("ALTER TABLE RekeyCheckpoint ADD COLUMN TargetCipher TEXT NOT NULL DEFAULT 'fernet';")
+
+
+def _create_pay_raise_aggregate(connection: sqlite3.Connection) -> None:
+    # Encrypted running total and plain count of raises per employee and year.
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS PayRaiseAggregate (
+            AggregateId INTEGER PRIMARY KEY,
+            EmpId INTEGER NOT NULL,
+            Year INTEGER NOT NULL,
+            TotalAmt BLOB NOT NULL,
+            RaiseCount INTEGER NOT NULL,
+            UNIQUE (EmpId, Year)
+        );
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_payraiseaggregate_year ON PayRaiseAggregate (Year);")
+    rebuild_pay_raise_aggregates(connection)
+
+
+def _create_session(connection: sqlite3.Connection) -> None:
+    # Server-side sessions; Data is the encrypted JSON session payload.
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS Session (
+            SessionId TEXT PRIMARY KEY,
+            UserId INTEGER,
+            Data BLOB NOT NULL,
+            ExpiresAt REAL NOT NULL
+        );
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_session_userid ON Session (UserId);")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_session_expiresat ON Session (ExpiresAt);")
+    # Sessions cache the user's SecurityLevel, so drop them when it changes
+    # or the employee is removed, whoever makes the change.
+    connection.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employee_securitylevel_sessions
+        AFTER UPDATE OF SecurityLevel ON Employee
+        WHEN OLD.SecurityLevel IS NOT NEW.SecurityLevel
+        BEGIN
+            DELETE FROM Session WHERE UserId = NEW.UserId;
+        END;
+        """
+    )
+    connection.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employee_delete_sessions
+        AFTER DELETE ON Employee
+        BEGIN
+            DELETE FROM Session WHERE UserId = OLD.UserId;
+        END;
+        """
+    )
+
+
+def _create_employee_search_token(connection: sqlite3.Connection) -> None:
+    # Imported here: search_index builds on this module.
+    import search_index
+
+    # Keyed-HMAC n-gram tokens of Name and PhNum; the primary key is the
+    # token lookup index.
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS EmployeeSearchToken (
+            Token BLOB NOT NULL,
+            UserId INTEGER NOT NULL,
+            PRIMARY KEY (Token, UserId)
+        ) WITHOUT ROWID;
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_employeesearchtoken_userid ON EmployeeSearchToken (UserId);")
+    connection.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employee_delete_search_tokens
+        AFTER DELETE ON Employee
+        BEGIN
+            DELETE FROM EmployeeSearchToken WHERE UserId = OLD.UserId;
+        END;
+        """
+    )
+    search_index.rebuild(connection)
+
+
+# Tables whose rows are listed in the portal; their change counters feed
+# page ETags and the rendered-fragment cache (see page_cache).
+VERSIONED_TABLES = ("Employee", "EmpPayRaise")
+
+
+def _create_table_version(connection: sqlite3.Connection) -> None:
+    # One change counter per listed table, bumped by triggers so every
+    # writer (the portal, imports, the deletion server, scripts) counts.
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS TableVersion (
+            TableName TEXT PRIMARY KEY,
+            Version INTEGER NOT NULL,
+            UpdatedAt REAL NOT NULL
+        );
+        """
+    )
+    for table in VERSIONED_TABLES:
+        connection.execute(
+            "INSERT OR IGNORE INTO TableVersion (TableName, Version, UpdatedAt) VALUES (?, 1, (julianday('now') - 2440587.5) * 86400.0);",
+            (table,),
+        )
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            connection.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE TableVersion SET Version = Version + 1, UpdatedAt = (julianday('now') - 2440587.5) * 86400.0
+                    WHERE TableName = '{table}';
+                END;
+                """
+            )
+
+
+# (version, description, upgrade). Versions are applied in order and never
+# renumbered; add new steps at the end. Each step must also cope with a
+# database created before migrations existed (user_version 0).
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "create Employee", _create_employee),
+    (2, "create EmpPayRaise", _create_pay_raise),
+    (3, "add Employee.NameIdx blind index", _add_name_index),
+    (4, "add EmpPayRaise lookup and ordering indexes", _add_pay_raise_indexes),
+    (5, "create RekeyCheckpoint", _create_rekey_checkpoint),
+    (6, "add RekeyCheckpoint.TargetCipher", _add_rekey_target_cipher),
+    (7, "create PayRaiseAggregate", _create_pay_raise_aggregate),
+    (8, "create Session and Employee session triggers", _create_session),
+    (9, "create EmployeeSearchToken", _create_employee_search_token),
+    (10, "create TableVersion and change-counter triggers", _create_table_version),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(connection: sqlite3.Connection) -> int:
+    return connection.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection, target: Optional[int] = None) -> int:
+    """
+    Apply every migration above the database's user_version, up to target.
+
+    Each step runs in its own transaction together with the user_version
+    bump, so an interrupted upgrade resumes from the last completed step.
+    Returns the resulting schema version.
+    """
+    target = LATEST_VERSION if target is None else target
+    if connection.in_transaction:
+        connection.commit()
+    version = current_version(connection)
+    for step_version, description, upgrade in MIGRATIONS:
+        if step_version <= version or step_version > target:
+            continue
+        connection.execute("BEGIN;")
+        try:
+            upgrade(connection)
+            connection.execute(f"PRAGMA user_version = {step_version};")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        print(f"Applied migration {step_version}: {description}")
+        version = step_version
+    return version
+
+
+def main() -> None:
+    connection = sqlite3.connect(DB_PATH)
+    before = current_version(connection)
+    after = migrate(connection)
+    connection.close()
+    if after == before:
+        print(f"Schema already at version {after}.")
+    else:
+        print(f"Schema upgraded from version {before} to {after}.")
+
+
+if __name__ == "__main__":
+    main()
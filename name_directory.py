@@ -0,0 +1,150 @@
+"""
+Program: Employee Name Directory
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Keep decrypted employee names in a sorted in-memory index for the login page and autocomplete.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Tuple
+
+import security_utils
+
+DEFAULT_CHUNK_SIZE = 5000
+# How often the directory checks Employee for rows written by other
+# processes (bulk imports, the create-db scripts).
+DEFAULT_REFRESH_INTERVAL = 30.0
+
+
+class NameDirectory:
+    """
+    Decrypted employee names sorted case-insensitively.
+
+    The directory is built on first use and then kept current by add() for
+    inserts made through the app. At most once per refresh_interval it
+    compares MAX(UserId) and COUNT(*) with what it holds: rows appended
+    elsewhere are loaded incrementally, anything else (deletes, reseeds)
+    triggers a full rebuild.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, refresh_interval: float = DEFAULT_REFRESH_INTERVAL) -> None:
+        self.chunk_size = chunk_size
+        self.refresh_interval = refresh_interval
+        # Parallel lists: casefolded sort keys, and (name, UserId) entries.
+        self._keys: List[str] = []
+        self._entries: List[Tuple[str, int]] = []
+        self._max_id = 0
+        self._loaded = False
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, user_id: int, name: str) -> None:
+        key = name.casefold()
+        index = bisect.bisect_right(self._keys, key)
+        self._keys.insert(index, key)
+        self._entries.insert(index, (name, user_id))
+        self._max_id = max(self._max_id, user_id)
+
+    def _merge(self, rows: List[Tuple[str, str, int]]) -> None:
+        # Merge a sorted batch of (key, name, UserId) in one linear pass.
+        current = ((key, name, user_id) for key, (name, user_id) in zip(self._keys, self._entries))
+        merged = list(heapq.merge(current, rows))
+        self._keys = [key for key, _, _ in merged]
+        self._entries = [(name, user_id) for _, name, user_id in merged]
+        self._max_id = max(self._max_id, max((user_id for _, _, user_id in rows), default=0))
+
+    def _decrypted_after(self, connection: sqlite3.Connection, after: int) -> Iterator[List[Tuple[int, str]]]:
+        # Chunks of (UserId, name) for rows above after, decrypted in batches.
+        while True:
+            rows = connection.execute(
+                "SELECT UserId, Name FROM Employee WHERE UserId > ? ORDER BY UserId LIMIT ?;",
+                (after, self.chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+            after = rows[-1][0]
+            names = security_utils.decrypt_many([row[1] for row in rows])
+            yield [(user_id, name) for (user_id, _), name in zip(rows, names)]
+
+    def _sorted_after(self, connection: sqlite3.Connection, after: int) -> List[Tuple[str, str, int]]:
+        # One sort per batch instead of an insertion per row.
+        return sorted(
+            (name.casefold(), name, user_id)
+            for chunk in self._decrypted_after(connection, after)
+            for user_id, name in chunk
+        )
+
+    def _rebuild(self, connection: sqlite3.Connection) -> None:
+        self._keys, self._entries, self._max_id = [], [], 0
+        self._merge(self._sorted_after(connection, 0))
+        self._loaded = True
+
+    def refresh(self, connection: sqlite3.Connection, force: bool = False) -> None:
+        """
+        Bring the directory up to date with Employee if it is due for a check.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded and not force and now < self._next_check:
+                return
+            self._next_check = now + self.refresh_interval
+            if not self._loaded:
+                self._rebuild(connection)
+                return
+            max_id, count = connection.execute("SELECT COALESCE(MAX(UserId), 0), COUNT(*) FROM Employee;").fetchone()
+            if (max_id, count) == (self._max_id, len(self._entries)):
+                return
+            appended = connection.execute(
+                "SELECT COUNT(*) FROM Employee WHERE UserId > ?;", (self._max_id,)
+            ).fetchone()[0]
+            if max_id > self._max_id and count == len(self._entries) + appended:
+                self._merge(self._sorted_after(connection, self._max_id))
+            else:
+                self._rebuild(connection)
+
+    def add(self, user_id: int, name: str) -> None:
+        """
+        Record an employee the app just inserted, without touching the database.
+        Rows a refresh has already loaded are ignored.
+        """
+        with self._lock:
+            if self._loaded and user_id > self._max_id:
+                self._insert(user_id, name)
+
+    def mark_stale(self) -> None:
+        """
+        Check Employee on the next refresh, e.g. after a bulk import.
+        """
+        with self._lock:
+            self._next_check = 0.0
+
+    def first(self, limit: int) -> List[str]:
+        """
+        Up to limit names in alphabetical order.
+        """
+        with self._lock:
+            return [name for name, _ in self._entries[:limit]]
+
+    def search(self, prefix: str, limit: int) -> List[str]:
+        """
+        Up to limit distinct names starting with prefix, ignoring case.
+        """
+        key = prefix.casefold()
+        matches: List[str] = []
+        with self._lock:
+            index = bisect.bisect_left(self._keys, key)
+            while index < len(self._keys) and len(matches) < limit and self._keys[index].startswith(key):
+                name = self._entries[index][0]
+                if not matches or matches[-1] != name:
+                    matches.append(name)
+                index += 1
+        return matches
+
@@ -0,0 +1,128 @@
+"""
+Program: Page Validation and Fragment Cache
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Track per-table change counters and cache rendered listing fragments by table version.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+import migrations
+
+# Tables whose changes are counted by TableVersion triggers.
+VERSIONED_TABLES = migrations.VERSIONED_TABLES
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# (table, version) pairs plus the newest UpdatedAt among them.
+TableVersions = Tuple[Tuple[Tuple[str, int], ...], float]
+
+
+def table_versions(connection: Any, tables: Sequence[str]) -> TableVersions:
+    """
+    Return the change counters of tables and when the latest of them changed.
+    """
+    rows = connection.execute(
+        f"SELECT TableName, Version, UpdatedAt FROM TableVersion WHERE TableName IN ({', '.join('?' * len(tables))});",
+        tuple(tables),
+    ).fetchall()
+    found = {row[0]: (row[1], row[2]) for row in rows}
+    versions = tuple((table, found.get(table, (0, 0.0))[0]) for table in tables)
+    updated_at = max((found.get(table, (0, 0.0))[1] for table in tables), default=0.0)
+    return versions, updated_at
+
+
+def template_digest(folder: Path) -> str:
+    """
+    Digest of every template file, so pages cached or validated against
+    an older deployment's templates stop matching once they change.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(folder.rglob("*")):
+        if path.is_file():
+            digest.update(path.relative_to(folder).as_posix().encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def page_etag(parts: Iterable[Any]) -> str:
+    """
+    Strong ETag over everything a rendered page depends on.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+class FragmentCache:
+    """
+    Bounded LRU of rendered HTML fragments.
+
+    Keys embed the table versions a fragment was rendered from, so a change
+    to the table makes old entries unreachable; they age out of the LRU
+    instead of being invalidated. Entries larger than max_entry_bytes, such
+    as very large pages, are not cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_entry_bytes: Optional[int] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
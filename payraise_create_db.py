@@ -2,14 +2,21 @@
 Program: Employee Pay Raise Encryption Setup
 Author: betty phipps
 Date: 2025-11-13
-Purpose: Drop, recreate, and populate the EmpPayRaise table with encrypted raise amounts.
+Purpose: Migrate, reset, and populate the EmpPayRaise table with encrypted raise amounts.
 """
 from __future__ import annotations
 
+import argparse
+import datetime
+import random
 import sqlite3
+import time
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Iterable, Iterator, List, Sequence, Tuple
 
+import bulk_load
+import migrations
+import reporting
 import security_utils
 
 DB_PATH = Path(__file__).resolve().parent / "company.db"
@@ -24,45 +31,154 @@ PAY_RAISE_ROWS: Iterable[Tuple[int, int, str, float]] = [
     (6, 6, "2025-06-30", 4100.90),
 ]
 
+# Generated raises fall between these dates.
+FIRST_RAISE_DATE = datetime.date(2015, 1, 1)
+LAST_RAISE_DATE = datetime.date(2025, 12, 31)
+
+INSERT_SQL = """
+    INSERT INTO EmpPayRaise (PayRaiseId, EmpId, PayRaiseDate, RaiseAmt)
+    VALUES (?, ?, ?, ?);
+"""
+UPSERT_SQL = """
+    INSERT INTO EmpPayRaise (PayRaiseId, EmpId, PayRaiseDate, RaiseAmt)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (PayRaiseId) DO UPDATE SET
+        EmpId = excluded.EmpId,
+        PayRaiseDate = excluded.PayRaiseDate,
+        RaiseAmt = excluded.RaiseAmt;
+"""
+
 
 def encrypt_pay_raise_row(row: Tuple[int, int, str, float]) -> Tuple[int, int, str, bytes]:
-    raise_id, emp_id, date_value, amount = row
-    encrypted_amount = security_utils.encrypt_text(f"{amount:.2f}")
-    return raise_id, emp_id, date_value, encrypted_amount
+    return encrypt_pay_raise_rows([row])[0]
+
+
+def encrypt_pay_raise_rows(rows: Sequence[Tuple[int, int, str, float]]) -> List[Tuple[int, int, str, bytes]]:
+    """
+    Encrypt the RaiseAmt column of many pay raise rows in a single batch.
+    """
+    rows = list(rows)
+    amounts = security_utils.encrypt_many([f"{amount:.2f}" for _, _, _, amount in rows])
+    return [
+        (raise_id, emp_id, date_value, encrypted_amount)
+        for (raise_id, emp_id, date_value, _), encrypted_amount in zip(rows, amounts)
+    ]
+
+
+def iter_employee_ids(connection: sqlite3.Connection, chunk_size: int) -> Iterator[int]:
+    """
+    Walk Employee.UserId in keyset-ordered chunks so large tables are never fully loaded.
+    """
+    last_id = 0
+    while True:
+        ids = [
+            row[0]
+            for row in connection.execute(
+                "SELECT UserId FROM Employee WHERE UserId > ? ORDER BY UserId LIMIT ?;",
+                (last_id, chunk_size),
+            )
+        ]
+        if not ids:
+            return
+        yield from ids
+        last_id = ids[-1]
+
+
+def generate_pay_raise_rows(
+    employee_ids: Iterable[int], per_employee: int, first_id: int, seed: int
+) -> Iterator[Tuple[int, int, str, float]]:
+    """
+    Lazily yield per_employee synthetic raises for every employee ID.
+    """
+    rng = random.Random(seed)
+    span = (LAST_RAISE_DATE - FIRST_RAISE_DATE).days
+    raise_id = first_id
+    for emp_id in employee_ids:
+        for _ in range(per_employee):
+            date_value = FIRST_RAISE_DATE + datetime.timedelta(days=rng.randrange(span + 1))
+            yield raise_id, emp_id, date_value.isoformat(), round(rng.uniform(500, 5000), 2)
+            raise_id += 1
+
+
+def generate(per_employee: int, seed: int, append: bool, chunk_size: int) -> None:
+    """
+    Stream per_employee synthetic raises for every existing employee in one transaction.
+    """
+    connection = sqlite3.connect(DB_PATH)
+    version = migrations.migrate(connection)
+    print(f"Schema at version {version}.")
+
+    if not append:
+        connection.execute("DELETE FROM EmpPayRaise;")
+        connection.execute("DELETE FROM PayRaiseAggregate;")
+        connection.commit()
+        print("EmpPayRaise table cleared.")
+    first_id = connection.execute("SELECT COALESCE(MAX(PayRaiseId), 0) + 1 FROM EmpPayRaise;").fetchone()[0]
+
+    # Aggregate deltas are accumulated from the plaintext as each chunk is
+    # encrypted, then applied once in the load's transaction.
+    deltas: reporting.Deltas = {}
+
+    def encrypt(chunk: Sequence[Tuple[int, int, str, float]]) -> List[Tuple[int, int, str, bytes]]:
+        for _, emp_id, date_value, amount in chunk:
+            reporting.add_delta(deltas, emp_id, date_value, f"{amount:.2f}")
+        return encrypt_pay_raise_rows(chunk)
+
+    started = time.perf_counter()
+    inserted = bulk_load.load_rows(
+        connection,
+        INSERT_SQL,
+        generate_pay_raise_rows(iter_employee_ids(connection, chunk_size), per_employee, first_id, seed),
+        encrypt,
+        chunk_size=chunk_size,
+        before_commit=lambda conn: reporting.apply_deltas(conn, deltas),
+    )
+    elapsed = time.perf_counter() - started
+    print(f"{inserted} synthetic pay raise records inserted in {elapsed:.1f}s.")
+    connection.close()
 
 
-def main() -> None:
+def main(append: bool = False) -> None:
     connection = sqlite3.connect(DB_PATH)
     cursor = connection.cursor()
 
-    cursor.execute("DROP TABLE IF EXISTS EmpPayRaise;")
-    print("EmpPayRaise table dropped.")
-
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS EmpPayRaise (
-            PayRaiseId INTEGER PRIMARY KEY,
-            EmpId INTEGER NOT NULL,
-            PayRaiseDate TEXT NOT NULL,
-            RaiseAmt BLOB NOT NULL,
-            FOREIGN KEY (EmpId) REFERENCES Employee(UserId)
-        );
-        """
+    version = migrations.migrate(connection)
+    print(f"Schema at version {version}.")
+
+    if not append:
+        cursor.execute("DELETE FROM EmpPayRaise;")
+        cursor.execute("DELETE FROM PayRaiseAggregate;")
+        print("EmpPayRaise table cleared.")
+
+    encrypted_rows = encrypt_pay_raise_rows(PAY_RAISE_ROWS)
+    seeded_ids = [row[0] for row in encrypted_rows]
+    if append:
+        # Rows about to be overwritten leave the aggregates first.
+        replaced = cursor.execute(
+            f"""
+            SELECT EmpId, PayRaiseDate, RaiseAmt
+            FROM EmpPayRaise
+            WHERE PayRaiseId IN ({', '.join('?' * len(seeded_ids))});
+            """,
+            seeded_ids,
+        ).fetchall()
+        reporting.record_deletions(connection, replaced)
+    cursor.executemany(UPSERT_SQL if append else INSERT_SQL, encrypted_rows)
+    reporting.record_raises(
+        connection, [(emp_id, date_value, f"{amount:.2f}") for _, emp_id, date_value, amount in PAY_RAISE_ROWS]
     )
-    print("EmpPayRaise table created.")
+    connection.commit()
+    print(f"{len(encrypted_rows)} pay raise records {'upserted' if append else 'inserted'}.")
 
-    encrypted_rows = [encrypt_pay_raise_row(row) for row in PAY_RAISE_ROWS]
-    cursor.executemany(
-        """
-        INSERT INTO EmpPayRaise (PayRaiseId, EmpId, PayRaiseDate, RaiseAmt)
-        VALUES (?, ?, ?, ?);
+    cursor.execute(
+        f"""
+        SELECT PayRaiseId, EmpId, PayRaiseDate, RaiseAmt
+        FROM EmpPayRaise
+        WHERE PayRaiseId IN ({', '.join('?' * len(seeded_ids))})
+        ORDER BY PayRaiseId;
         """,
-        encrypted_rows,
+        seeded_ids,
     )
-    connection.commit()
-    print(f"{len(encrypted_rows)} pay raise records inserted.")
-
-    cursor.execute("SELECT PayRaiseId, EmpId, PayRaiseDate, RaiseAmt FROM EmpPayRaise;")
     all_rows = cursor.fetchall()
     for db_row in all_rows:
         print(tuple(db_row))
@@ -72,5 +188,28 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Migrate and seed the encrypted EmpPayRaise table.")
+    parser.add_argument(
+        "--raises-per-employee",
+        type=int,
+        metavar="M",
+        help="Generate M synthetic raises for every existing employee instead of the six fixed rows.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --raises-per-employee.")
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Keep existing rows: upsert the fixed rows, or add generated rows after the current max PayRaiseId.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=bulk_load.DEFAULT_CHUNK_SIZE,
+        help="Rows encrypted and inserted per executemany call.",
+    )
+    args = parser.parse_args()
+    if args.raises_per_employee is not None:
+        generate(args.raises_per_employee, args.seed, args.append, args.chunk_size)
+    else:
+        main(append=args.append)
 
@@ -6,111 +6,694 @@ Purpose: TCP server that receives encrypted deletion requests and processes pay
 """
 from __future__ import annotations
 
-import sqlite3
+import argparse
+import functools
+import multiprocessing
+import os
+import queue
+import signal
+import socket
 import socketserver
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
+from cryptography.fernet import InvalidToken
+
+import metrics
+import migrations
+import replay_cache
+import reporting
 import security_utils
+from db_pool import ConnectionPool
+from deletion_protocol import (
+    HOST,
+    LEGACY_TOKEN_PREFIX,
+    MESSAGE_SEPARATOR,
+    PORT,
+    RECORD_SEPARATOR,
+    ProtocolError,
+    encode_reply,
+    recv_frame,
+    send_frame,
+)
 
 DB_PATH = Path(__file__).resolve().parent / "company.db"
-MESSAGE_SEPARATOR = "^%$"
-HOST = "localhost"
-PORT = 9999
+DB_POOL_SIZE = 4
+MAX_WORKERS = 16
+# Persistent connections that stay idle this long are closed to free a worker.
+IDLE_TIMEOUT = 60.0
+# Group commit: flush once this many records are queued or the oldest has
+# waited this long, whichever comes first.
+MAX_BATCH = 500
+MAX_WAIT = 0.005
+# Prometheus text metrics are served on this port; 0 disables the endpoint.
+# In supervisor mode worker N serves them on METRICS_PORT + N.
+METRICS_PORT = 9998
+# A group commit that finds the database locked by another worker process
+# (beyond the connection's busy_timeout) is retried this many times.
+BUSY_RETRIES = 3
+BUSY_BACKOFF = 0.05
+# On shutdown, in-flight connections get this long to finish.
+DRAIN_TIMEOUT = 10.0
+# A crashed worker is restarted after RESTART_DELAY, doubling up to
+# MAX_RESTART_DELAY while it keeps exiting within STABLE_AFTER seconds.
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+STABLE_AFTER = 30.0
 
+_POOL = ConnectionPool(DB_PATH, size=DB_POOL_SIZE)
 
-class PayRaiseDeletionHandler(socketserver.BaseRequestHandler):
+MESSAGES = metrics.REGISTRY.counter(
+    "deletion_messages_total", "Deletion messages received, by reply status.", ("status",)
+)
+DECRYPT_FAILURES = metrics.REGISTRY.counter(
+    "deletion_decrypt_failures_total", "Deletion messages that failed decryption or validation."
+)
+RECORDS = metrics.REGISTRY.counter("deletion_records_total", "Deletion records processed, by outcome.", ("status",))
+DELETED_ROWS = metrics.REGISTRY.counter("deletion_rows_deleted_total", "EmpPayRaise rows deleted.")
+MESSAGE_SECONDS = metrics.REGISTRY.histogram(
+    "deletion_message_seconds", "Time from receiving a deletion message to having its reply ready."
+)
+GROUP_COMMIT_RECORDS = metrics.REGISTRY.histogram(
+    "deletion_group_commit_records", "Records applied per group commit.", buckets=metrics.COUNT_BUCKETS
+)
+REPLAY_CACHE = metrics.REGISTRY.gauge(
+    "deletion_replay_cache", "Replay cache counters and size.", ("stat",)
+)
+BUSY_RETRIES_TOTAL = metrics.REGISTRY.counter(
+    "deletion_busy_retries_total", "Group commits retried because the database was locked."
+)
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is None:
+        return "locked" in str(error)
+    return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+class GroupCommitter:
     """
-    Request handler for processing encrypted pay raise deletion requests.
+    Coalesces deletion requests from many handler threads into shared commits.
+
+    The first queued request opens a batch; the committer keeps collecting
+    until max_batch records are pending or max_wait seconds have passed, then
+    applies them all in one transaction so the whole group shares one fsync.
+    Every request's records are kept together in the same transaction.
     """
 
-    def handle(self) -> None:
+    def __init__(self, pool: ConnectionPool, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT) -> None:
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Optional[Tuple[List[Tuple[int, str]], Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-committer", daemon=True)
+        self._thread.start()
+
+    def submit(self, records: List[Tuple[int, str]]) -> List[int]:
         """
-        Handle incoming connection: receive, decrypt, validate, and delete record.
+        Queue (EmpId, PayRaiseDate) pairs for deletion and wait for the commit.
+
+        Returns the number of rows deleted for each pair, in order.
         """
-        # Receive encrypted message
-        encrypted_data = self.request.recv(4096)
+        future: Future = Future()
+        self._queue.put((records, future))
+        return future.result()
 
-        if not encrypted_data:
-            print(f"{self.client_address[0]} sent empty message")
-            return
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
 
-        try:
-            # Decrypt message
-            decrypted_message = security_utils.decrypt_text(encrypted_data)
-            print(f"{self.client_address[0]}    sent message:    {decrypted_message}")
-
-            # Split message using preset separator
-            parts = decrypted_message.split(MESSAGE_SEPARATOR)
-            if len(parts) != 2:
-                print(f"ERROR: Invalid message format. Expected 2 parts separated by '{MESSAGE_SEPARATOR}', got {len(parts)}")
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            pending = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while pending < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                pending += len(item[0])
+            self._flush(batch)
+            if stopping:
                 return
 
-            emp_id_str, pay_raise_date = parts[0].strip(), parts[1].strip()
+    def _apply(self, batch: List[Tuple[List[Tuple[int, str]], Future]]) -> List[List[int]]:
+        with self.pool.connection() as connection:
+            results = []
+            removed: List[Tuple[int, str, bytes]] = []
+            for records, _ in batch:
+                counts = []
+                for emp_id, pay_raise_date in records:
+                    deleted = connection.execute(
+                        """
+                        DELETE FROM EmpPayRaise
+                        WHERE EmpId = ? AND PayRaiseDate = ?
+                        RETURNING EmpId, PayRaiseDate, RaiseAmt;
+                        """,
+                        (emp_id, pay_raise_date),
+                    ).fetchall()
+                    counts.append(len(deleted))
+                    removed.extend(deleted)
+                results.append(counts)
+            # Keep the report aggregates in step, in the same commit.
+            reporting.record_deletions(connection, removed)
+            connection.commit()
+        return results
 
+    def _apply_with_retry(self, batch: List[Tuple[List[Tuple[int, str]], Future]]) -> List[List[int]]:
+        # Other worker processes write through their own connections; the
+        # pool releases (and rolls back) the connection after each attempt.
+        for attempt in range(BUSY_RETRIES):
             try:
-                emp_id = int(emp_id_str)
-            except ValueError:
-                print(f"ERROR: Invalid Employee ID format: '{emp_id_str}'")
-                return
+                return self._apply(batch)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                BUSY_RETRIES_TOTAL.inc()
+                print(f"Database busy, retrying group commit: {e}")
+                time.sleep(BUSY_BACKOFF * 2 ** attempt)
+        return self._apply(batch)
 
-            print(f"EmpId: {emp_id}")
-            print(f"PayRaiseDate: {pay_raise_date}")
+    def _flush(self, batch: List[Tuple[List[Tuple[int, str]], Future]]) -> None:
+        try:
+            results = self._apply_with_retry(batch)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        records_in_batch = sum(len(records) for records, _ in batch)
+        GROUP_COMMIT_RECORDS.observe(records_in_batch)
+        DELETED_ROWS.inc(sum(sum(counts) for counts in results))
+        print(f"Group commit: {records_in_batch} records from {len(batch)} requests")
+        for (_, future), counts in zip(batch, results):
+            future.set_result(counts)
 
-            # Validate that record exists
-            connection = sqlite3.connect(DB_PATH)
-            cursor = connection.cursor()
 
-            cursor.execute(
-                """
-                SELECT PayRaiseId
-                FROM EmpPayRaise
-                WHERE EmpId = ? AND PayRaiseDate = ?;
-                """,
-                (emp_id, pay_raise_date),
-            )
-            record = cursor.fetchone()
+_COMMITTER: Optional[GroupCommitter] = None
 
-            if not record:
-                print(f"ERROR: No pay raise record found for Employee ID {emp_id} with date {pay_raise_date}")
-                connection.close()
-                return
 
-            # Delete the record
-            cursor.execute(
-                """
-                DELETE FROM EmpPayRaise
-                WHERE EmpId = ? AND PayRaiseDate = ?;
-                """,
-                (emp_id, pay_raise_date),
-            )
-            connection.commit()
-            connection.close()
+def get_committer() -> GroupCommitter:
+    global _COMMITTER
+    if _COMMITTER is None:
+        _COMMITTER = GroupCommitter(_POOL)
+    return _COMMITTER
 
-            print("Record successfully deleted")
 
+_REPLAY_CACHE: Optional[replay_cache.ReplayCache] = None
+DECRYPT_FAILED = "Decryption or validation failed"
+
+
+def get_replay_cache() -> replay_cache.ReplayCache:
+    global _REPLAY_CACHE
+    if _REPLAY_CACHE is None:
+        _REPLAY_CACHE = replay_cache.ReplayCache()
+    return _REPLAY_CACHE
+
+
+def parse_record(record: str) -> Tuple[int, str]:
+    """
+    Split one "EmpId^%$PayRaiseDate" record, raising ValueError if malformed.
+    """
+    parts = record.split(MESSAGE_SEPARATOR)
+    if len(parts) != 2:
+        raise ValueError(f"Invalid message format. Expected 2 parts separated by '{MESSAGE_SEPARATOR}', got {len(parts)}")
+
+    emp_id_str, pay_raise_date = parts[0].strip(), parts[1].strip()
+    try:
+        emp_id = int(emp_id_str)
+    except ValueError:
+        raise ValueError(f"Invalid Employee ID format: '{emp_id_str}'") from None
+    return emp_id, pay_raise_date
+
+
+def process_message(encrypted_data: bytes, client: str) -> Tuple[str, str, Optional[List[Dict[str, Any]]]]:
+    """
+    Decrypt, validate and apply one deletion request or batch.
+
+    Returns (status, message, results). For a single record status is one of
+    "deleted", "not_found", "invalid" or "error" and results is None. For a
+    batch status is "ok" and results lists the outcome of every record.
+
+    A token seen recently gets the reply it got the first time, without
+    being decrypted or applied again; Fernet tokens older than the replay
+    cache's max_age are refused as "invalid".
+    """
+    started = time.perf_counter()
+    cache = get_replay_cache()
+    key = cache.key(encrypted_data)
+    reply = None
+    if cache.is_too_old(key):
+        print(f"ERROR: {client} sent a message older than {cache.max_age:.0f}s")
+        reply = "invalid", "Message expired", None
+    else:
+        reply = cache.get(key)
+        if reply is not None:
+            print(f"{client}    resent a message already processed; replying from cache")
+    if reply is None:
+        reply = _process_message(encrypted_data, client)
+        # Server errors are left out so a resend is processed again, and
+        # undecryptable tokens so junk cannot push out real entries.
+        if reply[0] != "error" and reply[1] != DECRYPT_FAILED:
+            cache.put(key, reply)
+    for stat, value in cache.stats().items():
+        REPLAY_CACHE.set(value, stat=stat)
+    status, message, results = reply
+    MESSAGE_SECONDS.observe(time.perf_counter() - started)
+    MESSAGES.inc(status=status)
+    return status, message, results
+
+
+def _process_message(encrypted_data: bytes, client: str) -> Tuple[str, str, Optional[List[Dict[str, Any]]]]:
+    try:
+        # Decrypt message
+        decrypted_message = security_utils.decrypt_text(encrypted_data)
+    except (InvalidToken, ValueError) as e:
+        print(f"ERROR: Decryption or validation failed: {e}")
+        DECRYPT_FAILURES.inc()
+        return "invalid", DECRYPT_FAILED, None
+
+    records = decrypted_message.split(RECORD_SEPARATOR)
+    if len(records) == 1:
+        print(f"{client}    sent message:    {decrypted_message}")
+    else:
+        print(f"{client}    sent batch of {len(records)} records")
+
+    outcomes: List[Dict[str, Any]] = []
+    valid: List[Tuple[int, str]] = []
+    for record in records:
+        try:
+            emp_id, pay_raise_date = parse_record(record)
         except ValueError as e:
-            print(f"ERROR: Decryption or validation failed: {e}")
+            print(f"ERROR: {e}")
+            outcomes.append({"record": record, "status": "invalid", "message": str(e)})
+            continue
+        outcomes.append({"emp_id": emp_id, "pay_raise_date": pay_raise_date})
+        valid.append((emp_id, pay_raise_date))
+
+    counts: List[int] = []
+    if valid:
+        try:
+            counts = get_committer().submit(valid)
         except sqlite3.Error as e:
             print(f"ERROR: Database operation failed: {e}")
+            return "error", "Database operation failed", None
         except Exception as e:
             print(f"ERROR: Unexpected error: {e}")
+            return "error", "Unexpected error", None
+
+    count_iter = iter(counts)
+    for outcome in outcomes:
+        if "status" in outcome:
+            continue
+        if next(count_iter):
+            outcome["status"] = "deleted"
+            outcome["message"] = "Record successfully deleted"
+        else:
+            outcome["status"] = "not_found"
+            outcome["message"] = (
+                f"No pay raise record found for Employee ID {outcome['emp_id']} "
+                f"with date {outcome['pay_raise_date']}"
+            )
+    for outcome in outcomes:
+        RECORDS.inc(status=outcome["status"])
+
+    if len(outcomes) == 1:
+        outcome = outcomes[0]
+        if outcome["status"] == "deleted":
+            print(f"EmpId: {outcome['emp_id']}")
+            print(f"PayRaiseDate: {outcome['pay_raise_date']}")
+            print("Record successfully deleted")
+        elif outcome["status"] == "not_found":
+            print(f"ERROR: {outcome['message']}")
+        return outcome["status"], outcome["message"], None
+
+    deleted = sum(1 for outcome in outcomes if outcome["status"] == "deleted")
+    summary = f"{deleted} of {len(outcomes)} records deleted"
+    print(summary)
+    return "ok", summary, outcomes
+
+
+class PayRaiseDeletionHandler(socketserver.BaseRequestHandler):
+    """
+    Request handler for processing encrypted pay raise deletion requests.
+
+    A connection either carries length-prefixed frames, each answered with a
+    status frame, or a single unframed legacy token terminated by close.
+    """
+
+    def handle(self) -> None:
+        """
+        Handle incoming connection: receive, decrypt, validate, and delete records.
+        """
+        client = self.client_address[0]
+        self.request.settimeout(IDLE_TIMEOUT)
+
+        try:
+            prefix = self.request.recv(len(LEGACY_TOKEN_PREFIX), socket.MSG_PEEK)
+            if not prefix:
+                print(f"{client} sent empty message")
+                return
+            if prefix == LEGACY_TOKEN_PREFIX:
+                self.handle_legacy(client)
+                return
+
+            while True:
+                encrypted_data = recv_frame(self.request)
+                if encrypted_data is None:
+                    return
+                status, message, results = process_message(encrypted_data, client)
+                send_frame(self.request, encode_reply(status, message, results))
+        except socket.timeout:
+            print(f"{client} idle for {IDLE_TIMEOUT:.0f}s, closing connection")
+        except ProtocolError as e:
+            print(f"ERROR: Protocol error from {client}: {e}")
+        except OSError as e:
+            print(f"ERROR: Connection error from {client}: {e}")
+
+    def handle_legacy(self, client: str) -> None:
+        """
+        Read an unframed token until the client closes its side, then process it.
+        """
+        chunks = []
+        while True:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        process_message(b"".join(chunks), client)
+
+
+class ThreadedDeletionServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Thread-per-connection server with a cap on concurrently served clients.
+
+    When max_workers connections are active the accept loop waits for one
+    to finish instead of spawning more threads. With reuse_port several
+    processes can bind the same port and the kernel spreads connections
+    across them; alternatively, pass an already-listening socket shared
+    with other processes as listener.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        handler_class: type,
+        max_workers: int = MAX_WORKERS,
+        reuse_port: bool = False,
+        listener: Optional[socket.socket] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.reuse_port = reuse_port
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._connections: Set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
+        super().__init__(server_address, handler_class, bind_and_activate=listener is None)
+        if listener is not None:
+            self.socket.close()
+            self.socket = listener
+            self.server_address = listener.getsockname()
+
+    def server_bind(self) -> None:
+        # Set explicitly: socketserver only honours allow_reuse_port from
+        # Python 3.11 on.
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request: socket.socket, client_address: Tuple[str, int]) -> None:
+        self._slots.acquire()
+        with self._connections_lock:
+            self._connections.add(request)
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            with self._connections_lock:
+                self._connections.discard(request)
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request: socket.socket, client_address: Tuple[str, int]) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._connections_lock:
+                self._connections.discard(request)
+            self._slots.release()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Wait up to timeout for open connections to finish, after shutdown()
+        has stopped new ones being accepted.
+
+        Connections are shut for reading, so a persistent client idling
+        between frames is disconnected while a request already received
+        still gets its reply. Returns False if any were still open at the
+        deadline.
+        """
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        acquired = 0
+        try:
+            while acquired < self.max_workers:
+                if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    return False
+                acquired += 1
+            return True
+        finally:
+            for _ in range(acquired):
+                self._slots.release()
+
+
+def serve(args: argparse.Namespace, index: int = 0, listener: Optional[socket.socket] = None) -> None:
+    """
+    Run one server process until SIGINT or SIGTERM, then drain it.
+
+    Each process has its own connection pool, group committer and metrics
+    endpoint. Without listener, a supervised worker binds the port itself
+    with SO_REUSEPORT.
+    """
+    global _COMMITTER, _REPLAY_CACHE
+    _COMMITTER = GroupCommitter(_POOL, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    _REPLAY_CACHE = replay_cache.ReplayCache(
+        max_entries=args.replay_cache_size,
+        ttl=args.max_message_age or replay_cache.DEFAULT_MAX_AGE,
+        max_age=args.max_message_age or None,
+    )
+    server = ThreadedDeletionServer(
+        (HOST, PORT),
+        PayRaiseDeletionHandler,
+        max_workers=args.max_workers,
+        reuse_port=args.processes > 1 and listener is None,
+        listener=listener,
+    )
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    name = f"Worker {index} (pid {os.getpid()})" if args.processes > 1 else "Pay Raise Deletion Server"
+    print(f"{name} listening on {HOST}:{PORT} ({args.max_workers} connections)")
+    metrics_server = None
+    if args.metrics_port:
+        metrics_port = args.metrics_port + index
+        metrics_server = metrics.start_metrics_server(HOST, metrics_port)
+        print(f"{name} metrics available at http://{HOST}:{metrics_port}/metrics")
+    threading.Thread(target=server.serve_forever, name="deletion-accept", daemon=True).start()
+    try:
+        while not stop.wait(1.0):
+            pass
+        print(f"{name} draining...")
+        server.shutdown()
+        server.server_close()
+        if not server.drain(args.drain_timeout):
+            print(f"{name}: connections still open after {args.drain_timeout:.0f}s, closing anyway")
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        _COMMITTER.stop()
+        _POOL.close_all()
+    print(f"{name} stopped.")
+
+
+class WorkerSupervisor:
+    """
+    Pre-forks worker processes that serve the deletion port together.
+
+    Decrypting deletion messages is CPU-bound, so one process is capped by
+    the GIL however many handler threads it runs. The supervisor starts
+    `processes` copies of target(index), restarts any that exit (backing
+    off while one keeps crashing), and on SIGINT or SIGTERM asks every
+    worker to drain and waits for them, killing any still running after
+    drain_timeout plus a grace period.
+    """
+
+    def __init__(self, target: Callable[[int], None], processes: int, drain_timeout: float = DRAIN_TIMEOUT) -> None:
+        self.target = target
+        self.processes = processes
+        self.drain_timeout = drain_timeout
+        self._context = multiprocessing.get_context("fork")
+        self._workers: Dict[int, Any] = {}
+        self._started_at: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._delays: Dict[int, float] = {index: RESTART_DELAY for index in range(processes)}
+        self._stopping = threading.Event()
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(target=self.target, args=(index,), name=f"deletion-worker-{index}")
+        process.start()
+        self._workers[index] = process
+        self._started_at[index] = time.monotonic()
+        self._restart_at.pop(index, None)
+
+    def _reap(self, index: int) -> None:
+        process = self._workers.pop(index)
+        process.join()
+        now = time.monotonic()
+        if now - self._started_at[index] >= STABLE_AFTER:
+            self._delays[index] = RESTART_DELAY
+        delay = self._delays[index]
+        self._delays[index] = min(delay * 2, MAX_RESTART_DELAY)
+        self._restart_at[index] = now + delay
+        print(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}; restarting in {delay:.0f}s")
+
+    def run(self) -> None:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self._stopping.set())
+        for index in range(self.processes):
+            self._start(index)
+        while not self._stopping.is_set():
+            sentinels = {process.sentinel: index for index, process in self._workers.items()}
+            for sentinel in wait(list(sentinels), timeout=1.0):
+                self._reap(sentinels[sentinel])
+            if self._stopping.is_set():
+                break
+            now = time.monotonic()
+            for index, restart_at in list(self._restart_at.items()):
+                if restart_at <= now:
+                    self._start(index)
+        self.stop()
+
+    def stop(self) -> None:
+        """
+        Ask every worker to drain, then wait for them to exit.
+        """
+        print(f"Stopping {len(self._workers)} workers...")
+        for process in self._workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.drain_timeout + 5.0
+        for index, process in self._workers.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"Worker {index} (pid {process.pid}) did not stop in time; killing it")
+                process.kill()
+                process.join()
+        self._workers.clear()
+        print("Server stopped.")
 
 
 def main() -> None:
     """
-    Start the TCP server on localhost:9999.
+    Start the TCP server on localhost:9999, optionally as several processes.
     """
-    server = socketserver.TCPServer((HOST, PORT), PayRaiseDeletionHandler)
-    print(f"Pay Raise Deletion Server listening on {HOST}:{PORT}")
+    parser = argparse.ArgumentParser(description="Serve encrypted pay raise deletion requests.")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="Maximum concurrent client connections.")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Maximum records per group commit.")
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=MAX_WAIT * 1000,
+        help="Longest a request waits for others to join its group commit.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="Port for the Prometheus /metrics endpoint (0 disables it); worker N adds N.",
+    )
+    parser.add_argument(
+        "--replay-cache-size",
+        type=int,
+        default=replay_cache.DEFAULT_MAX_ENTRIES,
+        help="Recently processed tokens remembered to answer duplicates.",
+    )
+    parser.add_argument(
+        "--max-message-age",
+        type=float,
+        default=replay_cache.DEFAULT_MAX_AGE,
+        help="Refuse Fernet tokens older than this many seconds (0 disables the check).",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Worker processes sharing the port (0 = one per CPU).",
+    )
+    parser.add_argument(
+        "--shared-socket",
+        action="store_true",
+        help="Have workers inherit one listening socket instead of binding with SO_REUSEPORT.",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=DRAIN_TIMEOUT,
+        help="Seconds open connections get to finish on shutdown.",
+    )
+    args = parser.parse_args()
+    args.processes = args.processes or os.cpu_count() or 1
+    if args.processes > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        parser.error("--processes needs a platform that supports fork")
+
+    with _POOL.connection() as connection:
+        migrations.migrate(connection)
+
     print("Press Ctrl+C to stop the server")
+    if args.processes == 1:
+        serve(args)
+        return
+
+    # Workers must open their own SQLite connections and crypto pool.
+    _POOL.close_all()
+    security_utils.shutdown_pool()
+    listener = None
+    if args.shared_socket or not hasattr(socket, "SO_REUSEPORT"):
+        listener = socket.create_server((HOST, PORT), backlog=ThreadedDeletionServer.request_queue_size)
+    print(f"Starting {args.processes} workers on {HOST}:{PORT}")
     try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\nServer stopped.")
-        server.shutdown()
+        WorkerSupervisor(functools.partial(serve, args, listener=listener), args.processes, args.drain_timeout).run()
+    finally:
+        if listener is not None:
+            listener.close()
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,66 @@
+"""
+Program: Token Bucket Rate Limiter
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Throttle repeated actions, such as login attempts, per client key in bounded memory.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+DEFAULT_MAX_KEYS = 100_000
+
+
+class TokenBucketLimiter:
+    """
+    One token bucket per key, holding up to capacity tokens and refilling at
+    refill_rate tokens per second.
+
+    Buckets live in an LRU of at most max_keys entries. An evicted key comes
+    back with a full bucket, so max_keys should comfortably exceed the
+    number of clients active within capacity / refill_rate seconds.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int = DEFAULT_MAX_KEYS) -> None:
+        # A bucket that never refills would lock a key out for good and
+        # report an infinite wait.
+        if refill_rate <= 0:
+            raise ValueError(f"refill_rate must be positive, got {refill_rate!r}")
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at), least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, tokens: float = 1.0, now: Optional[float] = None) -> float:
+        """
+        Take tokens from key's bucket.
+
+        Returns 0.0 if they were available, otherwise the number of seconds
+        until they will be; nothing is taken in that case.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            available, updated_at = self._buckets.get(key, (self.capacity, now))
+            available = min(self.capacity, available + (now - updated_at) * self.refill_rate)
+            if available >= tokens:
+                available -= tokens
+                wait = 0.0
+            else:
+                wait = (tokens - available) / self.refill_rate
+            self._buckets[key] = (available, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
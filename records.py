@@ -0,0 +1,150 @@
+"""
+Program: Lazy Row Records
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Compact row objects that decrypt encrypted columns only when they are read.
+"""
+from __future__ import annotations
+
+import functools
+import sqlite3
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Type
+
+import migrations
+import security_utils
+
+# Encrypted column names per table, from the schema's single source of truth.
+ENCRYPTED = {table: frozenset(columns) for table, _, columns in migrations.ENCRYPTED_COLUMNS}
+
+
+class Record:
+    """
+    Base for projection record types built by projection().
+
+    A record keeps the tuple SQLite returned, plus a small dict of the
+    encrypted columns decrypted so far. Plain columns are read straight
+    from the tuple; encrypted ones are decrypted on first access and
+    memoized, so a template that never shows a column never pays for it.
+    Records support both attribute (row.Name) and item (row["Name"]) access.
+    """
+
+    __slots__ = ("_row", "_plain")
+
+    table: str = ""
+    columns: Tuple[str, ...] = ()
+    select_list: str = ""
+    _index: Dict[str, int] = {}
+    _cached: frozenset = frozenset()
+
+    def __init__(self, row: Tuple[Any, ...]) -> None:
+        self._row = row
+        self._plain: Dict[str, str] | None = None
+
+    @classmethod
+    def from_cursor(cls, cursor: sqlite3.Cursor, row: Tuple[Any, ...]) -> "Record":
+        """
+        sqlite3 row_factory; the SELECT must list cls.select_list in order.
+        """
+        return cls(row)
+
+    def _decrypted(self, column: str) -> str:
+        plain = self._plain
+        if plain is None:
+            plain = self._plain = {}
+        value = plain.get(column)
+        if value is None:
+            value = plain[column] = security_utils.decrypt_text(
+                self._row[self._index[column]], cache=column in self._cached
+            )
+        return value
+
+    def __getitem__(self, column: str) -> Any:
+        try:
+            return getattr(self, column)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def raw(self, column: str) -> Any:
+        """
+        The stored value of column, without decrypting it.
+        """
+        return self._row[self._index[column]]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {column: getattr(self, column) for column in self.columns}
+
+    @classmethod
+    def prefetch(cls, records: Sequence["Record"], columns: Iterable[str] = ()) -> Sequence["Record"]:
+        """
+        Decrypt columns (default: every encrypted column in the projection)
+        for a whole chunk of records with one decrypt_many call each.
+        """
+        columns = list(columns) or [column for column in cls.columns if column in ENCRYPTED.get(cls.table, ())]
+        for column in columns:
+            index = cls._index[column]
+            pending = [record for record in records if record._plain is None or column not in record._plain]
+            values = security_utils.decrypt_many([record._row[index] for record in pending], cache=column in cls._cached)
+            for record, value in zip(pending, values):
+                if record._plain is None:
+                    record._plain = {}
+                record._plain[column] = value
+        return records
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{column}={self._row[i]!r}' for i, column in enumerate(self.columns))})"
+
+
+def _plain_property(index: int) -> property:
+    return property(lambda self: self._row[index])
+
+
+def _encrypted_property(column: str) -> property:
+    return property(lambda self: self._decrypted(column))
+
+
+@functools.lru_cache(maxsize=None)
+def projection(table: str, columns: Tuple[str, ...], cached: Tuple[str, ...] = ()) -> Type[Record]:
+    """
+    Return the record type for selecting columns from table.
+
+    Columns listed in migrations.ENCRYPTED_COLUMNS for the table decrypt
+    lazily; those in cached go through the shared plaintext cache. Use the
+    type's select_list in the SELECT and from_cursor as the row factory.
+    """
+    encrypted = ENCRYPTED.get(table, frozenset())
+    namespace: Dict[str, Any] = {
+        "__slots__": (),
+        "table": table,
+        "columns": columns,
+        "select_list": ", ".join(columns),
+        "_index": {column: index for index, column in enumerate(columns)},
+        "_cached": frozenset(cached),
+    }
+    for index, column in enumerate(columns):
+        namespace[column] = _encrypted_property(column) if column in encrypted else _plain_property(index)
+    return type(f"{table}Record", (Record,), namespace)
+
+
+def select(
+    connection: sqlite3.Connection,
+    record_type: Type[Record],
+    where: str = "",
+    params: Sequence[Any] = (),
+) -> sqlite3.Cursor:
+    """
+    Run "SELECT <projection> FROM <table> <where>" with rows as record_type.
+
+    where holds everything after the table name (WHERE, ORDER BY, LIMIT).
+    """
+    cursor = connection.cursor()
+    cursor.row_factory = record_type.from_cursor
+    return cursor.execute(f"SELECT {record_type.select_list} FROM {record_type.table} {where};", params)
+
+
+def fetch_all(
+    connection: sqlite3.Connection,
+    record_type: Type[Record],
+    where: str = "",
+    params: Sequence[Any] = (),
+) -> List[Record]:
+    return select(connection, record_type, where, params).fetchall()
@@ -0,0 +1,215 @@
+"""
+Program: Resumable Re-key Job
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Rotate every encrypted column onto the active data key in throttled, checkpointed chunks.
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import migrations
+import security_utils
+from db_pool import configure_connection
+
+DB_PATH = Path(__file__).resolve().parent / "company.db"
+
+DEFAULT_CHUNK_SIZE = 1000
+# Rows per second across all tables; 0 disables throttling.
+DEFAULT_ROWS_PER_SECOND = 5000.0
+
+
+def load_checkpoint(connection: sqlite3.Connection, table: str, target_key_id: int) -> Tuple[Optional[int], int, bool]:
+    """
+    Return (last_id, rotated, completed) for table.
+
+    A checkpoint recorded for a different target key or cipher backend is
+    stale (the key was rotated or the backend changed since) and the table
+    starts over.
+    """
+    row = connection.execute(
+        "SELECT TargetKeyId, TargetCipher, LastId, Rotated, Completed FROM RekeyCheckpoint WHERE TableName = ?;",
+        (table,),
+    ).fetchone()
+    if row is None or (row[0], row[1]) != (target_key_id, security_utils.CIPHER):
+        return None, 0, False
+    return row[2], row[3], bool(row[4])
+
+
+def save_checkpoint(
+    connection: sqlite3.Connection,
+    table: str,
+    target_key_id: int,
+    last_id: Optional[int],
+    rotated: int,
+    completed: bool,
+) -> None:
+    connection.execute(
+        """
+        INSERT INTO RekeyCheckpoint (TableName, TargetKeyId, TargetCipher, LastId, Rotated, Completed, UpdatedAt)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (TableName) DO UPDATE SET
+            TargetKeyId = excluded.TargetKeyId,
+            TargetCipher = excluded.TargetCipher,
+            LastId = excluded.LastId,
+            Rotated = excluded.Rotated,
+            Completed = excluded.Completed,
+            UpdatedAt = excluded.UpdatedAt;
+        """,
+        (table, target_key_id, security_utils.CIPHER, last_id, rotated, int(completed), time.time()),
+    )
+
+
+def rekey_table(
+    connection: sqlite3.Connection,
+    table: str,
+    key_column: str,
+    columns: Tuple[str, ...],
+    target_key_id: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    rows_per_second: float = DEFAULT_ROWS_PER_SECOND,
+) -> int:
+    """
+    Rotate one table's encrypted columns, resuming from its checkpoint.
+
+    Rows are walked in primary-key order. Each chunk's tokens are rotated by
+    security_utils.rotate_many (fanned out over the crypto worker pool), then
+    written together with the new checkpoint in one short transaction, so an
+    interrupted run resumes after the last committed chunk. A row is only
+    updated if its ciphertext is unchanged, so concurrent app writes win.
+    Returns the number of values rotated in this table overall.
+    """
+    last_id, rotated, completed = load_checkpoint(connection, table, target_key_id)
+    if completed:
+        print(f"{table}: already rotated to data key {target_key_id} ({rotated} values)")
+        return rotated
+    if last_id is not None:
+        print(f"{table}: resuming after {key_column} {last_id} ({rotated} values rotated so far)")
+
+    started = time.perf_counter()
+    scanned = 0
+    while True:
+        rows = connection.execute(
+            f"""
+            SELECT {key_column}, {', '.join(columns)}
+            FROM {table}
+            WHERE ? IS NULL OR {key_column} > ?
+            ORDER BY {key_column}
+            LIMIT ?;
+            """,
+            (last_id, last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        stale = [
+            (row[0], index, row[index])
+            for row in rows
+            for index in range(1, len(columns) + 1)
+            if isinstance(row[index], bytes) and not security_utils.is_current(row[index], target_key_id)
+        ]
+        fresh = security_utils.rotate_many([token for _, _, token in stale]) if stale else []
+        connection.execute("BEGIN;")
+        try:
+            for index, column in enumerate(columns, start=1):
+                updates = [
+                    (new, row_id, old) for (row_id, position, old), new in zip(stale, fresh) if position == index
+                ]
+                if updates:
+                    connection.executemany(
+                        f"UPDATE {table} SET {column} = ? WHERE {key_column} = ? AND {column} = ?;",
+                        updates,
+                    )
+            rotated += len(stale)
+            save_checkpoint(connection, table, target_key_id, last_id, rotated, completed=False)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        scanned += len(rows)
+        if rows_per_second:
+            # Sleep off any lead over the target rate so the live app keeps
+            # getting database time between chunks.
+            lead = scanned / rows_per_second - (time.perf_counter() - started)
+            if lead > 0:
+                time.sleep(lead)
+        elapsed = time.perf_counter() - started
+        print(f"  {table}: {scanned} rows scanned, {rotated} values rotated ({scanned / elapsed:,.0f} rows/s)")
+
+    connection.execute("BEGIN;")
+    save_checkpoint(connection, table, target_key_id, last_id, rotated, completed=True)
+    connection.commit()
+    print(f"{table}: rotated {rotated} values to data key {target_key_id}")
+    return rotated
+
+
+def rekey(
+    connection: sqlite3.Connection,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    rows_per_second: float = DEFAULT_ROWS_PER_SECOND,
+    restart: bool = False,
+) -> int:
+    """
+    Rotate every encrypted column onto the active data key.
+
+    Returns the total number of values rotated, including those rotated by
+    an earlier interrupted run towards the same key.
+    """
+    if connection.in_transaction:
+        connection.commit()
+    if restart:
+        connection.execute("DELETE FROM RekeyCheckpoint;")
+        connection.commit()
+    target_key_id, _ = security_utils.get_keyring().active()
+    return sum(
+        rekey_table(connection, table, key_column, columns, target_key_id, chunk_size, rows_per_second)
+        for table, key_column, columns in migrations.ENCRYPTED_COLUMNS
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rotate all encrypted columns onto the active data key.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per committed chunk.")
+    parser.add_argument(
+        "--rows-per-second",
+        type=float,
+        default=DEFAULT_ROWS_PER_SECOND,
+        help="Throttle to roughly this many rows per second (0 for no limit).",
+    )
+    parser.add_argument("--workers", type=int, help="Crypto worker processes (defaults to CRYPTO_WORKERS).")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start from the beginning.")
+    parser.add_argument("--rotate", action="store_true", help="Create a new active data key before re-keying.")
+    parser.add_argument(
+        "--cipher",
+        choices=sorted(security_utils.CIPHER_BACKENDS),
+        help="Convert values to this cipher backend (defaults to CRYPTO_CIPHER).",
+    )
+    args = parser.parse_args()
+
+    if args.workers:
+        security_utils.configure_batching(workers=args.workers)
+    if args.cipher:
+        security_utils.configure_cipher(args.cipher)
+    # Leave transactions to rekey_table so each chunk commits on its own.
+    connection = configure_connection(sqlite3.connect(DB_PATH, isolation_level=None))
+    try:
+        migrations.migrate(connection)
+        if args.rotate:
+            print(f"Data key {security_utils.get_keyring().rotate()} is now active.")
+        total = rekey(connection, chunk_size=args.chunk_size, rows_per_second=args.rows_per_second, restart=args.restart)
+        print(f"Re-key complete: {total} values on the active data key.")
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to resume from the last committed chunk.")
+    finally:
+        connection.close()
+        security_utils.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Program: Deletion Replay Cache
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Remember recently processed deletion tokens so resent or replayed messages skip decryption and the database.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import security_utils
+
+DEFAULT_MAX_ENTRIES = 50_000
+# Messages older than this are refused; entries are kept as long, so any
+# replay young enough to be accepted is still in the cache (unless evicted
+# for space, which the evictions counter shows).
+DEFAULT_MAX_AGE = 300.0
+# Fernet timestamps this far in the future are tolerated, as Fernet does.
+MAX_CLOCK_SKEW = 60.0
+
+# (token digest, embedded Fernet timestamp or None).
+ReplayKey = Tuple[bytes, Optional[int]]
+
+
+class ReplayCache:
+    """
+    Bounded, TTL-evicted map from deletion token to the reply it produced.
+
+    Tokens are identified by a digest plus the Fernet timestamp read from
+    the token without decrypting it, so a duplicate is answered from memory
+    before any Fernet or SQLite work. Only settled replies should be
+    stored; a message that failed with a server error is processed again
+    when it is resent. With max_age set, Fernet tokens older than max_age
+    are refused outright. Tokens of the AEAD backends carry no timestamp
+    and are never refused for age.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_MAX_AGE,
+        max_age: Optional[float] = DEFAULT_MAX_AGE,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.too_old = 0
+        self._entries: "OrderedDict[ReplayKey, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: bytes) -> ReplayKey:
+        return hashlib.blake2b(token, digest_size=16).digest(), security_utils.token_timestamp(token)
+
+    def is_too_old(self, key: ReplayKey) -> bool:
+        """
+        True if the token's timestamp is outside max_age (or too far ahead).
+        The timestamp is unverified, but altering it breaks the token's HMAC,
+        so refusing on it cannot make a forged token acceptable.
+        """
+        timestamp = key[1]
+        if self.max_age is None or timestamp is None:
+            return False
+        now = time.time()
+        old = timestamp < now - self.max_age or timestamp > now + MAX_CLOCK_SKEW
+        if old:
+            with self._lock:
+                self.too_old += 1
+        return old
+
+    def get(self, key: ReplayKey) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            reply, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return reply
+
+    def put(self, key: ReplayKey, reply: Any) -> int:
+        """
+        Remember reply for key. Returns the number of entries evicted to make room.
+        """
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (reply, now + self.ttl)
+            # Insertion order is expiry order, so expired entries are at the front.
+            while self._entries:
+                oldest_key, (_, expires_at) = next(iter(self._entries.items()))
+                if expires_at >= now and len(self._entries) <= self.max_entries:
+                    break
+                del self._entries[oldest_key]
+                if expires_at < now:
+                    self.expired += 1
+                else:
+                    self.evictions += 1
+                    evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "too_old": self.too_old,
+            }
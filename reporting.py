@@ -0,0 +1,207 @@
+"""
+Program: Pay Raise Reporting
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Maintain encrypted per-employee, per-year raise totals and build reports from them.
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import migrations
+import security_utils
+from db_pool import configure_connection
+
+DB_PATH = Path(__file__).resolve().parent / "company.db"
+
+CENTS = Decimal("0.01")
+
+# (EmpId, year) -> [amount delta, count delta]
+Deltas = Dict[Tuple[int, int], List[Any]]
+
+
+def _money(value: Decimal) -> str:
+    return f"{value.quantize(CENTS, rounding=ROUND_HALF_UP)}"
+
+
+def apply_deltas(connection: sqlite3.Connection, deltas: Deltas) -> None:
+    """
+    Add amount and count deltas to PayRaiseAggregate.
+
+    Only the affected groups are decrypted and re-encrypted. Call this after
+    the matching EmpPayRaise write, inside the same transaction: the write
+    already holds SQLite's write lock, so concurrent updaters cannot
+    interleave their read-modify-write. Groups whose count reaches zero are
+    removed. The caller commits.
+    """
+    deltas = {key: value for key, value in deltas.items() if value[1] or value[0]}
+    if not deltas:
+        return
+    keys = list(deltas)
+    existing: Dict[Tuple[int, int], Tuple[bytes, int]] = {}
+    for start in range(0, len(keys), 400):
+        chunk = keys[start:start + 400]
+        rows = connection.execute(
+            f"""
+            SELECT EmpId, Year, TotalAmt, RaiseCount
+            FROM PayRaiseAggregate
+            WHERE (EmpId, Year) IN (VALUES {', '.join('(?, ?)' for _ in chunk)});
+            """,
+            [part for key in chunk for part in key],
+        ).fetchall()
+        existing.update({(row[0], row[1]): (row[2], row[3]) for row in rows})
+
+    existing_keys = list(existing)
+    current = dict(zip(existing_keys, security_utils.decrypt_many([existing[key][0] for key in existing_keys])))
+    upserts: List[Tuple[int, int, str, int]] = []
+    removed: List[Tuple[int, int]] = []
+    for (emp_id, year), (amount, count) in deltas.items():
+        new_count = (existing[(emp_id, year)][1] if (emp_id, year) in existing else 0) + count
+        new_total = Decimal(current.get((emp_id, year), "0")) + amount
+        if new_count <= 0:
+            removed.append((emp_id, year))
+        else:
+            upserts.append((emp_id, year, _money(new_total), new_count))
+
+    if removed:
+        connection.executemany("DELETE FROM PayRaiseAggregate WHERE EmpId = ? AND Year = ?;", removed)
+    if upserts:
+        tokens = security_utils.encrypt_many([total for _, _, total, _ in upserts])
+        connection.executemany(
+            """
+            INSERT INTO PayRaiseAggregate (EmpId, Year, TotalAmt, RaiseCount)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (EmpId, Year) DO UPDATE SET
+                TotalAmt = excluded.TotalAmt,
+                RaiseCount = excluded.RaiseCount;
+            """,
+            [(emp_id, year, token, count) for (emp_id, year, _, count), token in zip(upserts, tokens)],
+        )
+
+
+def add_delta(deltas: Deltas, emp_id: int, pay_raise_date: str, amount: Any, sign: int = 1) -> None:
+    """
+    Accumulate one raise (sign 1) or removed raise (sign -1) into deltas.
+    """
+    group = deltas.setdefault((emp_id, migrations.raise_year(pay_raise_date)), [Decimal(0), 0])
+    group[0] += sign * Decimal(str(amount))
+    group[1] += sign
+
+
+def record_raises(connection: sqlite3.Connection, raises: Iterable[Tuple[int, str, Any]]) -> None:
+    """
+    Fold newly inserted (EmpId, PayRaiseDate, amount) raises into the aggregates.
+    """
+    deltas: Deltas = {}
+    for emp_id, pay_raise_date, amount in raises:
+        add_delta(deltas, emp_id, pay_raise_date, amount)
+    apply_deltas(connection, deltas)
+
+
+def record_deletions(connection: sqlite3.Connection, deleted: Iterable[Tuple[int, str, bytes]]) -> None:
+    """
+    Remove deleted (EmpId, PayRaiseDate, encrypted RaiseAmt) raises from the aggregates.
+    """
+    deleted = list(deleted)
+    amounts = security_utils.decrypt_many([token for _, _, token in deleted])
+    deltas: Deltas = {}
+    for (emp_id, pay_raise_date, _), amount in zip(deleted, amounts):
+        add_delta(deltas, emp_id, pay_raise_date, amount, sign=-1)
+    apply_deltas(connection, deltas)
+
+
+def _summarize(groups: Dict[Any, List[Any]], key_name: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            key_name: key,
+            "total": _money(total),
+            "count": count,
+            "average": _money(total / count) if count else _money(Decimal(0)),
+        }
+        for key, (total, count) in groups.items()
+    ]
+
+
+def yearly_report(connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """
+    Total, count and average raise per year, newest first.
+    """
+    rows = connection.execute("SELECT Year, TotalAmt, RaiseCount FROM PayRaiseAggregate ORDER BY Year DESC;").fetchall()
+    totals = security_utils.decrypt_many([row[1] for row in rows], cache=True)
+    groups: Dict[int, List[Any]] = defaultdict(lambda: [Decimal(0), 0])
+    for (year, _, count), total in zip(rows, totals):
+        groups[year][0] += Decimal(total)
+        groups[year][1] += count
+    return _summarize(groups, "year")
+
+
+def employee_report(
+    connection: sqlite3.Connection,
+    year: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = 100,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Total, count and average raise per employee, optionally for one year.
+
+    Employees are paginated by EmpId; returns (entries, next_after), where
+    next_after is None on the last page.
+    """
+    year_filter = "AND Year = ?" if year is not None else ""
+    year_params: Tuple[Any, ...] = (year,) if year is not None else ()
+    emp_ids = [
+        row[0]
+        for row in connection.execute(
+            f"""
+            SELECT DISTINCT EmpId FROM PayRaiseAggregate
+            WHERE EmpId > ? {year_filter}
+            ORDER BY EmpId
+            LIMIT ?;
+            """,
+            (after if after is not None else -1, *year_params, limit + 1),
+        )
+    ]
+    next_after = emp_ids[limit - 1] if len(emp_ids) > limit else None
+    emp_ids = emp_ids[:limit]
+    if not emp_ids:
+        return [], None
+
+    rows = connection.execute(
+        f"""
+        SELECT EmpId, TotalAmt, RaiseCount FROM PayRaiseAggregate
+        WHERE EmpId BETWEEN ? AND ? {year_filter}
+        ORDER BY EmpId;
+        """,
+        (emp_ids[0], emp_ids[-1], *year_params),
+    ).fetchall()
+    totals = security_utils.decrypt_many([row[1] for row in rows], cache=True)
+    groups: Dict[int, List[Any]] = defaultdict(lambda: [Decimal(0), 0])
+    for (emp_id, _, count), total in zip(rows, totals):
+        groups[emp_id][0] += Decimal(total)
+        groups[emp_id][1] += count
+    return _summarize(groups, "emp_id"), next_after
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pay raise aggregate reports.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute PayRaiseAggregate from EmpPayRaise.")
+    args = parser.parse_args()
+
+    connection = configure_connection(sqlite3.connect(DB_PATH))
+    migrations.migrate(connection)
+    if args.rebuild:
+        groups = migrations.rebuild_pay_raise_aggregates(connection)
+        connection.commit()
+        print(f"Rebuilt {groups} (employee, year) aggregates.")
+    for entry in yearly_report(connection):
+        print(f"{entry['year']}: {entry['count']} raises, total ${entry['total']}, average ${entry['average']}")
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
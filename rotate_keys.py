@@ -0,0 +1,129 @@
+"""
+Program: Data Key Rotation
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Rotate envelope data keys or the master key, and re-encrypt columns onto the active data key.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from cryptography.fernet import Fernet
+
+import migrations
+import rekey
+import security_utils
+from db_pool import configure_connection
+
+DB_PATH = Path(__file__).resolve().parent / "company.db"
+
+
+def key_usage(connection: sqlite3.Connection) -> Dict[Optional[int], int]:
+    """
+    Count stored values per data key ID, sessions included; legacy
+    master-key tokens count under None.
+    """
+    usage: Counter = Counter()
+    versions = [bytes([version]) for version in security_utils.ENVELOPE_VERSIONS]
+    for table, _, columns in migrations.ENCRYPTED_COLUMNS + migrations.TRANSIENT_ENCRYPTED_COLUMNS:
+        for column in columns:
+            rows = connection.execute(
+                f"""
+                SELECT CASE WHEN substr({column}, 1, 1) IN ({', '.join('?' * len(versions))})
+                            THEN substr({column}, 2, 4) END AS KeyId,
+                       COUNT(*)
+                FROM {table}
+                WHERE typeof({column}) = 'blob'
+                GROUP BY KeyId;
+                """,
+                versions,
+            )
+            for key_id, count in rows:
+                usage[int.from_bytes(key_id, "big") if key_id is not None else None] += count
+    return dict(usage)
+
+
+def print_status(connection: sqlite3.Connection) -> None:
+    usage = key_usage(connection)
+    for key in security_utils.get_keyring().keys():
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(key["created_at"]))
+        marker = " (active)" if key["active"] else ""
+        print(f"Data key {key['key_id']}{marker}: created {created}, {usage.get(key['key_id'], 0)} values")
+    if usage.get(None):
+        print(f"Legacy master-key values: {usage[None]}")
+
+
+def rotate_master_key(connection: sqlite3.Connection) -> None:
+    """
+    Replace fernet.key and re-wrap every data key under the new master key.
+
+    Legacy values are encrypted directly with the old master key, so this
+    refuses to run until re-encryption has moved all of them onto data keys.
+    """
+    legacy = key_usage(connection).get(None, 0)
+    if legacy:
+        raise SystemExit(f"{legacy} legacy values still use the master key; run 'reencrypt' first.")
+    new_key = Fernet.generate_key()
+    # Keep the new key on disk before any data key depends on it.
+    pending = security_utils.KEY_FILE.with_name(security_utils.KEY_FILE.name + ".new")
+    pending.write_bytes(new_key)
+    count = security_utils.get_keyring().rewrap(Fernet(new_key))
+    os.replace(pending, security_utils.KEY_FILE)
+    security_utils.reload_key()
+    print(f"Master key rotated; re-wrapped {count} data keys. Restart the app and deletion server.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage envelope encryption keys.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="List data keys and how many values each encrypts.")
+    commands.add_parser("rotate", help="Create a new active data key; existing values stay readable.")
+    reencrypt_parser = commands.add_parser("reencrypt", help="Move every value onto the active data key.")
+    reencrypt_parser.add_argument(
+        "--batch-size", type=int, default=rekey.DEFAULT_CHUNK_SIZE, help="Rows per transaction."
+    )
+    reencrypt_parser.add_argument(
+        "--rows-per-second",
+        type=float,
+        default=rekey.DEFAULT_ROWS_PER_SECOND,
+        help="Throttle to roughly this many rows per second (0 for no limit).",
+    )
+    retire_parser = commands.add_parser("retire", help="Delete a data key that no stored value uses.")
+    retire_parser.add_argument("key_id", type=int)
+    commands.add_parser("rotate-master", help="Replace fernet.key and re-wrap the data keys.")
+    args = parser.parse_args()
+
+    connection = configure_connection(sqlite3.connect(DB_PATH))
+    migrations.migrate(connection)
+    try:
+        if args.command == "status":
+            print_status(connection)
+        elif args.command == "rotate":
+            key_id = security_utils.get_keyring().rotate()
+            print(f"Data key {key_id} is now active. Run 'reencrypt' to move existing values onto it.")
+        elif args.command == "reencrypt":
+            total = rekey.rekey(connection, chunk_size=args.batch_size, rows_per_second=args.rows_per_second)
+            print(f"Re-encrypted {total} values.")
+        elif args.command == "retire":
+            in_use = key_usage(connection).get(args.key_id, 0)
+            if in_use:
+                raise SystemExit(
+                    f"Data key {args.key_id} still encrypts {in_use} values; run 'reencrypt' first"
+                    " (sessions move off it as they are saved or expire)."
+                )
+            security_utils.get_keyring().retire(args.key_id)
+            print(f"Data key {args.key_id} retired.")
+        elif args.command == "rotate-master":
+            rotate_master_key(connection)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
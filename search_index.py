@@ -0,0 +1,226 @@
+"""
+Program: Employee Search Index
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Search encrypted employee names and phone numbers through keyed-HMAC n-gram tokens.
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import sqlite3
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+import migrations
+import records
+import security_utils
+from db_pool import configure_connection
+
+DB_PATH = Path(__file__).resolve().parent / "company.db"
+
+NGRAM = 3
+# Words shorter than NGRAM are matched as prefixes of this many characters.
+SHORT_PREFIXES = (1, 2)
+TOKEN_BYTES = 16
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_LIMIT = 50
+# Candidate rows fetched per round while filtering out n-gram false positives.
+CANDIDATE_BATCH = 200
+
+FIELDS = ("name", "phone")
+
+SearchRecord = records.projection(
+    "Employee", ("UserId", "Name", "Age", "PhNum", "SecurityLevel"), cached=("Name",)
+)
+
+
+def normalize_name(value: str) -> List[str]:
+    """
+    Casefolded words of value, with punctuation dropped.
+    """
+    return re.sub(r"[^\w\s]", "", value.casefold()).split()
+
+
+def normalize_phone(value: str) -> str:
+    return re.sub(r"\D", "", value)
+
+
+def _grams(word: str) -> Set[str]:
+    if len(word) < NGRAM:
+        return {f"p{len(word)}:{word}"}
+    return {f"g:{word[i:i + NGRAM]}" for i in range(len(word) - NGRAM + 1)}
+
+
+def _token(field: str, gram: str) -> bytes:
+    # Field-separated so a name gram never matches a phone gram.
+    return security_utils.blind_index(f"search:{field}:{gram}")[:TOKEN_BYTES]
+
+
+def _indexed_grams(word: str) -> Set[str]:
+    # Every n-gram, plus the short prefixes that one- and two-character queries look up.
+    grams = _grams(word) if len(word) >= NGRAM else set()
+    grams.update(f"p{size}:{word[:size]}" for size in SHORT_PREFIXES if len(word) >= size)
+    return grams
+
+
+def tokens_for(name: str, phone: str) -> Set[bytes]:
+    """
+    Every search token for one employee.
+    """
+    tokens = {_token("name", gram) for word in normalize_name(name) for gram in _indexed_grams(word)}
+    tokens.update(_token("phone", gram) for gram in _indexed_grams(normalize_phone(phone)))
+    return tokens
+
+
+def query_tokens(field: str, query: str) -> Set[bytes]:
+    """
+    Tokens a row must have to possibly match query; empty if query has no searchable text.
+    """
+    words = normalize_name(query) if field == "name" else [normalize_phone(query)]
+    return {_token(field, gram) for word in words if word for gram in _grams(word)}
+
+
+def matches(field: str, query: str, name: str, phone: str) -> bool:
+    """
+    Exact check on decrypted values, to drop rows that only share n-grams.
+    """
+    if field == "phone":
+        return normalize_phone(query) in normalize_phone(phone)
+    words = normalize_name(name)
+    return all(
+        any(word.startswith(part) if len(part) < NGRAM else part in word for word in words)
+        for part in normalize_name(query)
+    )
+
+
+def guess_field(query: str) -> str:
+    """
+    "phone" for queries made of digits and separators, otherwise "name".
+    """
+    return "phone" if re.fullmatch(r"[\d\s()+.-]+", query) and normalize_phone(query) else "name"
+
+
+def index_employees(connection: sqlite3.Connection, employees: Iterable[Tuple[int, str, str]]) -> int:
+    """
+    Add tokens for (UserId, name, phone) plaintext rows. Returns the number
+    of token rows written. The caller commits.
+    """
+    postings = [(token, user_id) for user_id, name, phone in employees for token in tokens_for(name, phone)]
+    connection.executemany("INSERT OR IGNORE INTO EmployeeSearchToken (Token, UserId) VALUES (?, ?);", postings)
+    return len(postings)
+
+
+def remove_employees(connection: sqlite3.Connection, user_ids: Sequence[int]) -> None:
+    """
+    Drop the tokens of employees about to be re-indexed. The caller commits.
+    """
+    connection.executemany("DELETE FROM EmployeeSearchToken WHERE UserId = ?;", [(user_id,) for user_id in user_ids])
+
+
+def index_after(connection: sqlite3.Connection, after_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Decrypt and index every employee with UserId above after_id, e.g. rows
+    a bulk import just inserted. Returns the number of employees indexed.
+    The caller commits.
+    """
+    indexed = 0
+    while True:
+        rows = connection.execute(
+            "SELECT UserId, Name, PhNum FROM Employee WHERE UserId > ? ORDER BY UserId LIMIT ?;",
+            (after_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return indexed
+        after_id = rows[-1][0]
+        names = security_utils.decrypt_many([row[1] for row in rows])
+        phones = security_utils.decrypt_many([row[2] for row in rows])
+        index_employees(connection, [(row[0], name, phone) for row, name, phone in zip(rows, names, phones)])
+        indexed += len(rows)
+
+
+def rebuild(connection: sqlite3.Connection, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Recompute EmployeeSearchToken from Employee. Returns the number of
+    employees indexed. The caller commits.
+    """
+    connection.execute("DELETE FROM EmployeeSearchToken;")
+    return index_after(connection, 0, chunk_size)
+
+
+def search(
+    connection: sqlite3.Connection,
+    query: str,
+    field: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    after: int = 0,
+) -> Tuple[List[records.Record], Optional[int]]:
+    """
+    Employees whose name (or phone) contains query, in UserId order.
+
+    Candidates come from an indexed lookup of the query's tokens; only
+    those rows are fetched and decrypted to confirm the match. Returns
+    (matches, next_after), where next_after is None on the last page.
+    """
+    field = field or guess_field(query)
+    tokens = sorted(query_tokens(field, query))
+    if not tokens:
+        return [], None
+
+    found: List[records.Record] = []
+    while len(found) <= limit:
+        candidate_ids = [
+            row[0]
+            for row in connection.execute(
+                f"""
+                SELECT UserId FROM EmployeeSearchToken
+                WHERE Token IN ({', '.join('?' * len(tokens))}) AND UserId > ?
+                GROUP BY UserId
+                HAVING COUNT(*) = ?
+                ORDER BY UserId
+                LIMIT ?;
+                """,
+                (*tokens, after, len(tokens), CANDIDATE_BATCH),
+            )
+        ]
+        if not candidate_ids:
+            break
+        after = candidate_ids[-1]
+        candidates = records.fetch_all(
+            connection,
+            SearchRecord,
+            f"WHERE UserId IN ({', '.join('?' * len(candidate_ids))}) ORDER BY UserId",
+            candidate_ids,
+        )
+        for record in candidates:
+            if matches(field, query, record.Name, record.PhNum):
+                found.append(record)
+    if len(found) > limit:
+        return found[:limit], found[limit - 1].UserId
+    return found, None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search or rebuild the encrypted employee search index.")
+    parser.add_argument("query", nargs="?", help="Name or phone fragment to search for.")
+    parser.add_argument("--field", choices=FIELDS, help="Search this field (guessed from the query by default).")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--rebuild", action="store_true", help="Recompute EmployeeSearchToken from Employee.")
+    args = parser.parse_args()
+
+    connection = configure_connection(sqlite3.connect(DB_PATH))
+    migrations.migrate(connection)
+    if args.rebuild:
+        indexed = rebuild(connection)
+        connection.commit()
+        print(f"Indexed {indexed} employees.")
+    if args.query:
+        found, _ = search(connection, args.query, args.field, args.limit)
+        for record in found:
+            print(f"{record.UserId}: {record.Name}, {record.PhNum}")
+        print(f"{len(found)} matches.")
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,106 @@ Utility helpers for symmetric encryption/decryption across the project.
 """
 from __future__ import annotations
 
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
 
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+import data_keys
 
 KEY_FILE = Path(__file__).resolve().parent / "fernet.key"
+INDEX_KEY_FILE = Path(__file__).resolve().parent / "blind_index.key"
 _FERNET: Optional[Fernet] = None
+_KEY_ID: Optional[bytes] = None
+_INDEX_KEY: Optional[bytes] = None
+_KEYRING: Optional[data_keys.DataKeyRing] = None
+
+# Envelope tokens: version byte naming the cipher backend, 4-byte data key
+# ID, then the backend's ciphertext under that data key. Legacy tokens are
+# bare Fernet tokens under the master key and always start with "g", so the
+# first byte tells them apart.
+_ENVELOPE_HEADER = struct.Struct(">BI")
+# Backend used for new values: "fernet", "aes-gcm" or "chacha20-poly1305".
+CIPHER = os.environ.get("CRYPTO_CIPHER", "fernet")
+
+# Batches at or below BATCH_SIZE items are processed in-process; larger ones
+# are split into BATCH_SIZE chunks and fanned out across WORKERS processes.
+BATCH_SIZE = int(os.environ.get("CRYPTO_BATCH_SIZE", "2048"))
+WORKERS = int(os.environ.get("CRYPTO_WORKERS", str(min(4, os.cpu_count() or 1))))
+_POOL: Optional[ProcessPoolExecutor] = None
+_PLAINTEXT_CACHE: Optional["PlaintextCache"] = None
+# Optional callback(operation, count, seconds) for instrumentation.
+_OBSERVER: Optional[Callable[[str, int, float], None]] = None
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+class FernetBackend:
+    """
+    Fernet token (AES-128-CBC plus HMAC-SHA256, base64) under the data key.
+    """
+
+    name = "fernet"
+    version = 0x01
+
+    def encrypt(self, key: data_keys.DataKey, header: bytes, data: bytes) -> bytes:
+        return header + key.fernet.encrypt(data)
+
+    def decrypt(self, key: data_keys.DataKey, token: bytes) -> bytes:
+        return key.fernet.decrypt(token[_ENVELOPE_HEADER.size:])
+
+
+class AeadBackend:
+    """
+    Raw binary AEAD: header, 12-byte nonce, ciphertext and 16-byte tag.
+
+    The header is authenticated as associated data, so a token cannot be
+    relabelled with another key ID or backend. Overhead is 33 bytes against
+    roughly 60 plus base64 expansion for Fernet.
+    """
+
+    NONCE_SIZE = 12
+
+    def __init__(self, name: str, version: int, factory: Callable[[bytes], Any]) -> None:
+        self.name = name
+        self.version = version
+        self.factory = factory
+
+    def encrypt(self, key: data_keys.DataKey, header: bytes, data: bytes) -> bytes:
+        nonce = os.urandom(self.NONCE_SIZE)
+        return header + nonce + key.aead(self.name, self.factory).encrypt(nonce, data, header)
+
+    def decrypt(self, key: data_keys.DataKey, token: bytes) -> bytes:
+        start = _ENVELOPE_HEADER.size
+        nonce = token[start:start + self.NONCE_SIZE]
+        try:
+            return key.aead(self.name, self.factory).decrypt(nonce, token[start + self.NONCE_SIZE:], token[:start])
+        except InvalidTag:
+            raise InvalidToken("AEAD authentication failed") from None
+
+
+CIPHER_BACKENDS: Dict[str, Any] = {
+    backend.name: backend
+    for backend in (
+        FernetBackend(),
+        AeadBackend("aes-gcm", 0x02, AESGCM),
+        AeadBackend("chacha20-poly1305", 0x03, ChaCha20Poly1305),
+    )
+}
+_BACKENDS_BY_VERSION: Dict[int, Any] = {backend.version: backend for backend in CIPHER_BACKENDS.values()}
+ENVELOPE_VERSIONS = tuple(sorted(_BACKENDS_BY_VERSION))
 
 
 def _load_or_create_key() -> bytes:
@@ -25,26 +118,457 @@ def get_cipher() -> Fernet:
     """
     Return a module-wide Fernet cipher instance.
     """
-    global _FERNET
+    global _FERNET, _KEY_ID
     if _FERNET is None:
-        _FERNET = Fernet(_load_or_create_key())
+        key = _load_or_create_key()
+        _FERNET = Fernet(key)
+        _KEY_ID = hashlib.sha256(key).digest()[:8]
     return _FERNET
 
 
+def get_keyring() -> data_keys.DataKeyRing:
+    """
+    Return the module-wide ring of data keys wrapped by the master key.
+    """
+    global _KEYRING
+    if _KEYRING is None:
+        _KEYRING = data_keys.DataKeyRing(data_keys.KEYRING_FILE, get_cipher())
+    return _KEYRING
+
+
+def reload_key() -> None:
+    """
+    Drop the cached cipher and data keys so the next call re-reads KEY_FILE.
+
+    The batch worker pool and the plaintext cache are tied to the old key and
+    are discarded with it.
+    """
+    global _FERNET, _KEY_ID, _KEYRING
+    _FERNET = None
+    _KEY_ID = None
+    _KEYRING = None
+    shutdown_pool()
+    if _PLAINTEXT_CACHE is not None:
+        _PLAINTEXT_CACHE.clear()
+
+
+def _backend() -> Any:
+    try:
+        return CIPHER_BACKENDS[CIPHER]
+    except KeyError:
+        raise ValueError(f"unknown cipher backend {CIPHER!r}; expected one of {sorted(CIPHER_BACKENDS)}") from None
+
+
+def configure_cipher(name: str) -> None:
+    """
+    Choose the backend for new values. Existing values of every backend,
+    including legacy master-key Fernet tokens, keep decrypting.
+    """
+    global CIPHER
+    if name not in CIPHER_BACKENDS:
+        raise ValueError(f"unknown cipher backend {name!r}; expected one of {sorted(CIPHER_BACKENDS)}")
+    CIPHER = name
+    shutdown_pool()
+
+
+def data_key_id(token: bytes) -> Optional[int]:
+    """
+    Return the data key ID embedded in token, or None for a legacy token.
+    """
+    if not token or token[0] not in _BACKENDS_BY_VERSION or len(token) < _ENVELOPE_HEADER.size:
+        return None
+    return _ENVELOPE_HEADER.unpack_from(token)[1]
+
+
+def is_current(token: bytes, key_id: int) -> bool:
+    """
+    True if token is encrypted with data key key_id and the configured backend.
+    """
+    return data_key_id(token) == key_id and token[0] == _backend().version
+
+
+def token_timestamp(token: bytes) -> Optional[int]:
+    """
+    Return the Unix time embedded in a Fernet token, enveloped or legacy,
+    without verifying the token. None for the AEAD backends, which carry
+    no timestamp, and for malformed tokens.
+    """
+    backend = _BACKENDS_BY_VERSION.get(token[0]) if token else None
+    if backend is None:
+        inner = token
+    elif backend.version == FernetBackend.version:
+        inner = token[_ENVELOPE_HEADER.size:]
+    else:
+        return None
+    try:
+        # Fernet: version byte 0x80, then a big-endian 64-bit timestamp.
+        prefix = base64.urlsafe_b64decode(inner[:12])
+    except ValueError:
+        return None
+    if len(prefix) < 9 or prefix[0] != 0x80:
+        return None
+    return struct.unpack_from(">Q", prefix, 1)[0]
+
+
+def _decrypt_bytes(token: bytes) -> bytes:
+    backend = _BACKENDS_BY_VERSION.get(token[0]) if token else None
+    if backend is None:
+        return get_cipher().decrypt(token)
+    if len(token) < _ENVELOPE_HEADER.size:
+        raise InvalidToken("truncated envelope header")
+    _, key_id = _ENVELOPE_HEADER.unpack_from(token)
+    return backend.decrypt(get_keyring().get(key_id), token)
+
+
+def _decrypt_token(token: bytes) -> str:
+    return _decrypt_bytes(token).decode("utf-8")
+
+
 def encrypt_text(value: str) -> bytes:
     """
-    Encrypt a string value and return the ciphertext as bytes.
+    Encrypt a string value with the active data key and return the ciphertext as bytes.
     """
     if value is None:
         raise ValueError("value must not be None")
-    return get_cipher().encrypt(value.encode("utf-8"))
+    return _encrypt_chunk([value])[0]
 
 
-def decrypt_text(token: bytes) -> str:
+def decrypt_text(token: bytes, cache: bool = False) -> str:
     """
     Decrypt ciphertext bytes back into their original string form.
+
+    When cache is true and the plaintext cache is enabled, a previously
+    decrypted value for the same token is returned without touching Fernet.
     """
     if token is None:
         raise ValueError("token must not be None")
-    return get_cipher().decrypt(token).decode("utf-8")
+    plaintext_cache = _PLAINTEXT_CACHE if cache else None
+    if plaintext_cache is not None:
+        cached = plaintext_cache.get(token)
+        if cached is not None:
+            return cached
+    if _OBSERVER is None:
+        value = _decrypt_token(token)
+    else:
+        started = time.perf_counter()
+        value = _decrypt_token(token)
+        _OBSERVER("decrypt", 1, time.perf_counter() - started)
+    if plaintext_cache is not None:
+        plaintext_cache.put(token, value)
+    return value
+
+
+def set_observer(observer: Optional[Callable[[str, int, float], None]]) -> None:
+    """
+    Register a callback invoked as observer(operation, count, seconds) after
+    every Fernet decrypt, or None to stop observing.
+    """
+    global _OBSERVER
+    _OBSERVER = observer
+
+
+def configure_batching(batch_size: Optional[int] = None, workers: Optional[int] = None) -> None:
+    """
+    Override the chunk size and process count used by encrypt_many/decrypt_many.
+    """
+    global BATCH_SIZE, WORKERS
+    if batch_size is not None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        BATCH_SIZE = batch_size
+    if workers is not None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        WORKERS = workers
+    shutdown_pool()
+
+
+def shutdown_pool() -> None:
+    """
+    Stop the batch worker pool, if one has been started.
+    """
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown()
+        _POOL = None
+
+
+def _init_worker(key: bytes, keyring_path: str, cipher: str) -> None:
+    global _FERNET, _KEYRING, CIPHER
+    _FERNET = Fernet(key)
+    _KEYRING = data_keys.DataKeyRing(keyring_path, _FERNET)
+    CIPHER = cipher
 
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(
+            max_workers=WORKERS,
+            initializer=_init_worker,
+            initargs=(_load_or_create_key(), get_keyring().path, CIPHER),
+        )
+    return _POOL
+
+
+def _encrypt_chunk(values: Sequence[str]) -> List[bytes]:
+    key_id, key = get_keyring().active()
+    backend = _backend()
+    header = _ENVELOPE_HEADER.pack(backend.version, key_id)
+    return [backend.encrypt(key, header, value.encode("utf-8")) for value in values]
+
+
+def _decrypt_chunk(tokens: Sequence[bytes]) -> List[str]:
+    return [_decrypt_token(token) for token in tokens]
+
+
+def _rotate_chunk(tokens: Sequence[bytes]) -> List[bytes]:
+    key_id, active = get_keyring().active()
+    backend = _backend()
+    header = _ENVELOPE_HEADER.pack(backend.version, key_id)
+    rotators: Dict[Optional[int], MultiFernet] = {}
+    rotated = []
+    for token in tokens:
+        if is_current(token, key_id):
+            rotated.append(token)
+            continue
+        source = data_key_id(token)
+        fernet_source = source is None or token[0] == FernetBackend.version
+        if backend.version != FernetBackend.version or not fernet_source:
+            # Changing cipher backend: there is no token-level rotate.
+            rotated.append(backend.encrypt(active, header, _decrypt_bytes(token)))
+            continue
+        rotator = rotators.get(source)
+        if rotator is None:
+            old = get_cipher() if source is None else get_keyring().get(source).fernet
+            rotator = rotators[source] = MultiFernet([active.fernet, old])
+        inner = token if source is None else token[_ENVELOPE_HEADER.size:]
+        rotated.append(header + rotator.rotate(inner))
+    return rotated
+
+
+def _run_batched(func: Callable[[Sequence[_T]], List[_R]], items: Sequence[_T], batch_size: int) -> List[_R]:
+    if WORKERS <= 1 or len(items) <= batch_size:
+        return func(items)
+    chunks = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+    results: List[_R] = []
+    for chunk_result in _get_pool().map(func, chunks):
+        results.extend(chunk_result)
+    return results
+
+
+def _decrypt_batched(tokens: Sequence[bytes], batch_size: int) -> List[str]:
+    if _OBSERVER is None or not tokens:
+        return _run_batched(_decrypt_chunk, tokens, batch_size)
+    started = time.perf_counter()
+    values = _run_batched(_decrypt_chunk, tokens, batch_size)
+    _OBSERVER("decrypt", len(tokens), time.perf_counter() - started)
+    return values
+
+
+def encrypt_many(values: Sequence[str], batch_size: Optional[int] = None) -> List[bytes]:
+    """
+    Encrypt a sequence of strings, preserving order.
+
+    Small batches reuse the module cipher directly; large batches are split
+    into chunks and encrypted across the worker pool.
+    """
+    values = list(values)
+    if any(value is None for value in values):
+        raise ValueError("values must not contain None")
+    return _run_batched(_encrypt_chunk, values, batch_size or BATCH_SIZE)
+
+
+def rotate_many(tokens: Sequence[bytes], batch_size: Optional[int] = None) -> List[bytes]:
+    """
+    Re-encrypt tokens under the active data key, preserving order.
+
+    Fernet tokens are rotated with MultiFernet.rotate, so each keeps its
+    original timestamp; tokens from another backend are decrypted and
+    re-encrypted. Plaintext never leaves the worker that rotates it. Tokens
+    already under the active key and backend are returned unchanged.
+    """
+    tokens = list(tokens)
+    if any(token is None for token in tokens):
+        raise ValueError("tokens must not contain None")
+    return _run_batched(_rotate_chunk, tokens, batch_size or BATCH_SIZE)
+
+
+def decrypt_many(tokens: Sequence[bytes], batch_size: Optional[int] = None, cache: bool = False) -> List[str]:
+    """
+    Decrypt a sequence of ciphertext tokens, preserving order.
+
+    With cache=True only the tokens missing from the plaintext cache are
+    decrypted; the rest are served from memory.
+    """
+    tokens = list(tokens)
+    if any(token is None for token in tokens):
+        raise ValueError("tokens must not contain None")
+    plaintext_cache = _PLAINTEXT_CACHE if cache else None
+    if plaintext_cache is None:
+        return _decrypt_batched(tokens, batch_size or BATCH_SIZE)
+
+    results: List[Optional[str]] = [plaintext_cache.get(token) for token in tokens]
+    missing = [index for index, value in enumerate(results) if value is None]
+    if missing:
+        decrypted = _decrypt_batched([tokens[index] for index in missing], batch_size or BATCH_SIZE)
+        for index, value in zip(missing, decrypted):
+            results[index] = value
+            plaintext_cache.put(tokens[index], value)
+    return results  # type: ignore[return-value]
+
+
+class PlaintextCache:
+    """
+    Bounded LRU map from ciphertext digest to decrypted plaintext.
+
+    Entries are limited by count and by an approximate byte budget, expire
+    after ttl seconds, and are dropped wholesale if the Fernet key changes.
+    """
+
+    # Rough per-entry cost of the digest key and bookkeeping tuple.
+    ENTRY_OVERHEAD = 96
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 4 * 1024 * 1024, ttl: float = 300.0) -> None:
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("max_entries and max_bytes must be positive")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[bytes, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._key_id: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(token: bytes) -> bytes:
+        return hashlib.blake2b(token, digest_size=16).digest()
+
+    def _check_key(self) -> None:
+        get_cipher()
+        if self._key_id != _KEY_ID:
+            self._entries.clear()
+            self._bytes = 0
+            self._key_id = _KEY_ID
+
+    def _discard(self, digest: bytes) -> None:
+        _, _, size = self._entries.pop(digest)
+        self._bytes -= size
+
+    def get(self, token: bytes) -> Optional[str]:
+        digest = self._digest(token)
+        with self._lock:
+            self._check_key()
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._discard(digest)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return value
+
+    def put(self, token: bytes, value: str) -> None:
+        digest = self._digest(token)
+        size = len(value.encode("utf-8")) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_key()
+            if digest in self._entries:
+                self._discard(digest)
+            self._entries[digest] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate(self, tokens: Optional[Iterable[bytes]] = None) -> None:
+        with self._lock:
+            if tokens is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for token in tokens:
+                digest = self._digest(token)
+                if digest in self._entries:
+                    self._discard(digest)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def enable_plaintext_cache(max_entries: int = 10_000, max_bytes: int = 4 * 1024 * 1024, ttl: float = 300.0) -> None:
+    """
+    Turn on the in-process plaintext cache used by decrypt_text/decrypt_many
+    calls that pass cache=True.
+    """
+    global _PLAINTEXT_CACHE
+    _PLAINTEXT_CACHE = PlaintextCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+
+def disable_plaintext_cache() -> None:
+    global _PLAINTEXT_CACHE
+    _PLAINTEXT_CACHE = None
+
+
+def invalidate_plaintext_cache(tokens: Optional[Iterable[bytes]] = None) -> None:
+    """
+    Forget cached plaintext for the given tokens, or for everything if None.
+    """
+    if _PLAINTEXT_CACHE is not None:
+        _PLAINTEXT_CACHE.invalidate(tokens)
+
+
+def plaintext_cache_stats() -> Optional[Dict[str, int]]:
+    """
+    Return hit/miss/eviction counters and current size, or None if disabled.
+    """
+    if _PLAINTEXT_CACHE is None:
+        return None
+    return _PLAINTEXT_CACHE.stats()
+
+
+def _load_or_create_index_key() -> bytes:
+    """
+    Load the blind-index HMAC key from disk or create one if it does not exist.
+
+    The key is kept separate from the Fernet key so that re-keying the
+    ciphertext does not invalidate every stored index value.
+    """
+    if not INDEX_KEY_FILE.exists():
+        INDEX_KEY_FILE.write_bytes(base64.urlsafe_b64encode(os.urandom(32)))
+    return base64.urlsafe_b64decode(INDEX_KEY_FILE.read_bytes())
+
+
+def blind_index(value: str) -> bytes:
+    """
+    Return a deterministic keyed digest of value for equality lookups.
+
+    Fernet ciphertext is randomized, so encrypted columns cannot be compared
+    in SQL. The HMAC-SHA256 digest can, without revealing the plaintext.
+    """
+    global _INDEX_KEY
+    if value is None:
+        raise ValueError("value must not be None")
+    if _INDEX_KEY is None:
+        _INDEX_KEY = _load_or_create_index_key()
+    return hmac.new(_INDEX_KEY, value.encode("utf-8"), hashlib.sha256).digest()
@@ -0,0 +1,281 @@
+"""
+Program: Server-Side Sessions
+Author: betty phipps
+Date: 2025-11-13
+Purpose: Keep Flask session data on the server, keyed by a random session ID cookie.
+"""
+from __future__ import annotations
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from cryptography.fernet import InvalidToken
+from flask import Flask, Request, Response
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import security_utils
+
+# Idle lifetime: a session expires this long after its last use.
+DEFAULT_SESSION_TTL = 8 * 3600.0
+DEFAULT_MAX_SESSIONS = 100_000
+# Expired SQLite sessions are swept at most this often.
+DEFAULT_PRUNE_INTERVAL = 300.0
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session dict whose contents live in a session store; the cookie only carries sid.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[Dict[str, Any]] = None,
+        sid: Optional[str] = None,
+        expires_at: float = 0.0,
+    ) -> None:
+        def on_update(self: ServerSession) -> None:
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = sid is None
+        self.modified = False
+        self.previous_sid: Optional[str] = None
+
+    def regenerate(self) -> None:
+        """
+        Move the session to a fresh ID on save, e.g. at login and logout, so
+        an ID issued before authentication cannot be reused after it.
+        """
+        if self.sid is not None and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class MemorySessionStore:
+    """
+    In-process sessions with idle-TTL and LRU eviction.
+
+    Sessions are lost on restart and not shared between processes. They
+    are not told about SecurityLevel changes, so a session keeps the level
+    it was created with until it expires; use SqliteSessionStore where that
+    matters.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS) -> None:
+        self.max_sessions = max_sessions
+        # sid -> (user_id, data, expires_at), least recently used first
+        self._sessions: "OrderedDict[str, Tuple[Optional[int], Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid: str, now: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[2] <= now:
+                del self._sessions[sid]
+                return None
+            self._sessions.move_to_end(sid)
+            return dict(entry[1]), entry[2]
+
+    def save(self, sid: str, user_id: Optional[int], data: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._sessions[sid] = (user_id, dict(data), expires_at)
+            self._sessions.move_to_end(sid)
+            if len(self._sessions) > self.max_sessions:
+                # Drop expired sessions before evicting live ones.
+                now = time.time()
+                for stale in [key for key, entry in self._sessions.items() if entry[2] <= now]:
+                    del self._sessions[stale]
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (entry[0], entry[1], expires_at)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def prune(self, now: float) -> None:
+        with self._lock:
+            for sid in [sid for sid, entry in self._sessions.items() if entry[2] <= now]:
+                del self._sessions[sid]
+
+
+class SqliteSessionStore:
+    """
+    Sessions in the Session table of company.db, with Data encrypted.
+
+    Triggers on Employee delete a user's sessions when their SecurityLevel
+    changes or the row is removed, whichever process makes the change, so
+    pages never need to re-check Employee. Decoded payloads are cached per
+    process and reused while the stored ciphertext is unchanged, so a
+    session is decrypted once rather than on every request.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        max_cached: int = 10_000,
+        prune_interval: float = DEFAULT_PRUNE_INTERVAL,
+    ) -> None:
+        self.connect = connect
+        self.max_cached = max_cached
+        self.prune_interval = prune_interval
+        # sid -> (Data ciphertext, decoded data)
+        self._decoded: "OrderedDict[str, Tuple[bytes, Dict[str, Any]]]" = OrderedDict()
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+
+    def _remember(self, sid: str, token: bytes, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._decoded[sid] = (token, dict(data))
+            self._decoded.move_to_end(sid)
+            while len(self._decoded) > self.max_cached:
+                self._decoded.popitem(last=False)
+
+    def _forget(self, sid: str) -> None:
+        with self._lock:
+            self._decoded.pop(sid, None)
+
+    def load(self, sid: str, now: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        row = self.connect().execute(
+            "SELECT Data, ExpiresAt FROM Session WHERE SessionId = ? AND ExpiresAt > ?;",
+            (sid, now),
+        ).fetchone()
+        if row is None:
+            self._forget(sid)
+            return None
+        token, expires_at = bytes(row[0]), row[1]
+        with self._lock:
+            cached = self._decoded.get(sid)
+        if cached is not None and cached[0] == token:
+            return dict(cached[1]), expires_at
+        try:
+            data = json.loads(security_utils.decrypt_text(token))
+        except (InvalidToken, ValueError):
+            # Written under a retired data key or corrupted: start over.
+            return None
+        self._remember(sid, token, data)
+        return dict(data), expires_at
+
+    def save(self, sid: str, user_id: Optional[int], data: Dict[str, Any], expires_at: float) -> None:
+        token = security_utils.encrypt_text(json.dumps(data, separators=(",", ":")))
+        connection = self.connect()
+        with connection:
+            connection.execute(
+                """
+                INSERT INTO Session (SessionId, UserId, Data, ExpiresAt)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (SessionId) DO UPDATE SET
+                    UserId = excluded.UserId,
+                    Data = excluded.Data,
+                    ExpiresAt = excluded.ExpiresAt;
+                """,
+                (sid, user_id, token, expires_at),
+            )
+        self._remember(sid, token, data)
+        self.prune(time.time())
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        connection = self.connect()
+        with connection:
+            connection.execute("UPDATE Session SET ExpiresAt = ? WHERE SessionId = ?;", (expires_at, sid))
+
+    def delete(self, sid: str) -> None:
+        connection = self.connect()
+        with connection:
+            connection.execute("DELETE FROM Session WHERE SessionId = ?;", (sid,))
+        self._forget(sid)
+
+    def prune(self, now: float) -> None:
+        with self._lock:
+            if now < self._next_prune:
+                return
+            self._next_prune = now + self.prune_interval
+        connection = self.connect()
+        with connection:
+            connection.execute("DELETE FROM Session WHERE ExpiresAt <= ?;", (now,))
+
+
+SessionStore = Union[MemorySessionStore, SqliteSessionStore]
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by a session store.
+
+    The cookie holds only the session ID. Expiry is sliding: a session's
+    lifetime (app.config["SESSION_TTL"]) is extended once less than half of
+    it remains, so most requests that do not change the session write nothing.
+    """
+
+    def __init__(self, get_store: Callable[[], SessionStore]) -> None:
+        self.get_store = get_store
+
+    def open_session(self, app: Flask, request: Request) -> ServerSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            loaded = self.get_store().load(sid, time.time())
+            if loaded is not None:
+                data, expires_at = loaded
+                return ServerSession(data, sid=sid, expires_at=expires_at)
+        return ServerSession()
+
+    def save_session(self, app: Flask, session: SessionMixin, response: Response) -> None:
+        assert isinstance(session, ServerSession)
+        store = self.get_store()
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        response.vary.add("Cookie")
+
+        if session.previous_sid is not None:
+            store.delete(session.previous_sid)
+        if not session:
+            if session.sid is not None:
+                store.delete(session.sid)
+            if session.sid is not None or session.previous_sid is not None:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        ttl = app.config.get("SESSION_TTL", DEFAULT_SESSION_TTL)
+        now = time.time()
+        issue_cookie = session.sid is None
+        if issue_cookie:
+            session.sid = new_session_id()
+        if session.modified or issue_cookie:
+            session.expires_at = now + ttl
+            store.save(session.sid, session.get("user_id"), dict(session), session.expires_at)
+        elif session.expires_at - now < ttl / 2:
+            session.expires_at = now + ttl
+            store.touch(session.sid, session.expires_at)
+
+        if issue_cookie:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
@@ -0,0 +1,108 @@
+"""
+Shared fixtures: every test gets its own key files, keyring and database
+directory, so the repository's company.db and keys are never touched.
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_keys  # noqa: E402
+import security_utils  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_keys(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(security_utils, "KEY_FILE", tmp_path / "fernet.key")
+    monkeypatch.setattr(security_utils, "INDEX_KEY_FILE", tmp_path / "blind_index.key")
+    monkeypatch.setattr(data_keys, "KEYRING_FILE", tmp_path / "keyring.db")
+    monkeypatch.setattr(security_utils, "_INDEX_KEY", None)
+    security_utils.reload_key()
+    yield tmp_path
+    security_utils.reload_key()
+
+
+# (name, age, phone, SecurityLevel, password) seeded by the portal fixture.
+EMPLOYEES = [
+    ("Alice Johnson", 34, "555-0101", 1, "A1ic3!Secure"),
+    ("Bob Smith", 45, "555-0102", 2, "B0b!Secure"),
+    ("Carol White", 29, "555-0103", 3, "C4rol!Secure"),
+    ("Dan Brown", 51, "555-0104", 3, "D4n!Secure"),
+    ("Erin Black", 38, "555-0105", 3, "Er1n!Secure"),
+]
+PAY_RAISES = [
+    (1, "2024-01-15", "1000.00"),
+    (1, "2024-06-01", "250.50"),
+    (2, "2024-03-01", "400.00"),
+    (3, "2023-11-20", "75.25"),
+    (5, "2024-02-14", "600.00"),
+]
+
+
+class Portal:
+    """
+    The Flask app bound to a seeded temporary database, plus a test client.
+    """
+
+    def __init__(self, app: Any, db_path: Path) -> None:
+        self.app = app
+        self.db_path = db_path
+        self.client = app.test_client()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def login(self, name: str = "Alice Johnson", password: str = "A1ic3!Secure") -> Any:
+        return self.client.post("/", data={"name": name, "password": password})
+
+
+@pytest.fixture
+def portal(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Portal]:
+    import app as portal_app
+    import credentials
+    import employee_create_db
+    import migrations
+    import reporting
+    import search_index
+
+    db_path = tmp_path / "company.db"
+    connection = sqlite3.connect(db_path)
+    migrations.migrate(connection)
+    rows = []
+    for user_id, (name, age, phone, level, password) in enumerate(EMPLOYEES, start=1):
+        # Cheap hashes keep the fixture fast; logins re-hash them at full cost.
+        rows.extend(
+            employee_create_db.encrypt_employee_rows(
+                [(user_id, name, age, phone, level, password)],
+                password_hash=credentials.hash_password(password, log_n=10),
+            )
+        )
+    connection.executemany(employee_create_db.INSERT_SQL, rows)
+    search_index.index_employees(
+        connection, [(user_id, name, phone) for user_id, (name, _, phone, _, _) in enumerate(EMPLOYEES, start=1)]
+    )
+    connection.executemany(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (?, ?, ?);",
+        [(emp_id, date, security_utils.encrypt_text(amount)) for emp_id, date, amount in PAY_RAISES],
+    )
+    reporting.record_raises(connection, PAY_RAISES)
+    connection.commit()
+    connection.close()
+
+    monkeypatch.setitem(portal_app.app.config, "DATABASE", str(db_path))
+    monkeypatch.setitem(portal_app.app.config, "TESTING", True)
+    monkeypatch.setattr(portal_app.app, "extensions", {})
+    yield Portal(portal_app.app, db_path)
+    outbox = portal_app.app.extensions.get("deletion_outbox")
+    if outbox is not None:
+        outbox.stop(timeout=5)
+    pool = portal_app.app.extensions.get("db_pool")
+    if pool is not None:
+        pool.close_all()
+    security_utils.disable_plaintext_cache()
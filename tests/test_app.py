@@ -0,0 +1,32 @@
+"""
+Flask app wiring: the shared connection pool.
+"""
+from __future__ import annotations
+
+import threading
+from typing import List
+
+
+def test_concurrent_first_use_builds_one_pool(portal) -> None:
+    import app as portal_app
+
+    barrier = threading.Barrier(8)
+    pools: List[object] = []
+
+    def first_request() -> None:
+        barrier.wait()
+        pools.append(portal_app.get_db_pool())
+
+    threads = [threading.Thread(target=first_request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(pool) for pool in pools}) == 1
+
+
+def test_login_and_home(portal) -> None:
+    response = portal.login()
+    assert response.status_code == 302
+    assert b"Alice Johnson" in portal.client.get("/home").data
+    assert portal.login("Alice Johnson", "wrong").status_code == 200
@@ -0,0 +1,50 @@
+"""
+Batched encrypt_many/decrypt_many, inline and across the worker pool.
+"""
+from __future__ import annotations
+
+import pytest
+
+import security_utils
+
+
+@pytest.fixture
+def small_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Force several chunks through a two-process pool.
+    monkeypatch.setattr(security_utils, "BATCH_SIZE", 4)
+    monkeypatch.setattr(security_utils, "WORKERS", 2)
+
+
+def test_round_trip_inline() -> None:
+    values = ["Alice Johnson", "", "ünïcødé", "555-0101"]
+    tokens = security_utils.encrypt_many(values)
+    assert len(set(tokens)) == len(tokens)
+    assert security_utils.decrypt_many(tokens) == values
+    assert [security_utils.decrypt_text(token) for token in tokens] == values
+
+
+def test_round_trip_across_the_pool(small_batches: None) -> None:
+    values = [f"employee {n}" for n in range(25)]
+    tokens = security_utils.encrypt_many(values)
+    assert security_utils._POOL is not None
+    assert security_utils.decrypt_many(tokens) == values
+
+
+def test_pool_decrypts_legacy_tokens(small_batches: None) -> None:
+    legacy = [security_utils.get_cipher().encrypt(f"old {n}".encode("utf-8")) for n in range(10)]
+    mixed = legacy + security_utils.encrypt_many(["new 0", "new 1"])
+    assert security_utils.decrypt_many(mixed) == [f"old {n}" for n in range(10)] + ["new 0", "new 1"]
+
+
+def test_none_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        security_utils.encrypt_many(["a", None])
+    with pytest.raises(ValueError):
+        security_utils.decrypt_many([None])
+
+
+def test_configure_batching_validates() -> None:
+    with pytest.raises(ValueError):
+        security_utils.configure_batching(batch_size=0)
+    with pytest.raises(ValueError):
+        security_utils.configure_batching(workers=0)
@@ -0,0 +1,109 @@
+"""
+Employee imports: staging outside the write lock, the row cap, and logins
+during an import.
+"""
+from __future__ import annotations
+
+import io
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import bulk_io
+import credentials
+import migrations
+from db_pool import configure_connection
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "company.db"
+    connection = configure_connection(sqlite3.connect(path))
+    migrations.migrate(connection)
+    connection.close()
+    return path
+
+
+def _csv(count: int, bad_lines: int = 0) -> io.StringIO:
+    lines = ["name,age,phone,security_level,password"]
+    lines += [f"Employee {n},30,555-{n:04d},1,Passw0rd!{n}" for n in range(count)]
+    lines += ["Bad Row,not-a-number,555-0000,1,Passw0rd!"] * bad_lines
+    return io.StringIO("\n".join(lines) + "\n")
+
+
+def _import(db_path: Path, stream: io.StringIO, **kwargs) -> bulk_io.ImportResult:
+    connection = configure_connection(sqlite3.connect(db_path))
+    try:
+        return bulk_io.import_stream(connection, "employees", stream, "csv", **kwargs)
+    finally:
+        connection.close()
+
+
+def _employees(db_path: Path) -> List[tuple]:
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute("SELECT UserId, LoginPassword FROM Employee ORDER BY UserId;").fetchall()
+
+
+@pytest.fixture
+def cheap_hashes(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(credentials, "DEFAULT_LOG_N", 10)
+    original = credentials.hash_password
+    monkeypatch.setattr(credentials, "hash_password", lambda password, log_n=10: original(password, 10))
+
+
+def test_import_inserts_and_indexes(db_path: Path, cheap_hashes: None) -> None:
+    result = _import(db_path, _csv(3, bad_lines=1), chunk_size=2)
+    assert (result.inserted, result.rejected) == (3, 1)
+    rows = _employees(db_path)
+    assert [row[0] for row in rows] == [1, 2, 3]
+    assert credentials.verify_password(rows[2][1], "Passw0rd!2")
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT COUNT(DISTINCT UserId) FROM EmployeeSearchToken;").fetchone()[0] == 3
+
+
+def test_strict_import_inserts_nothing(db_path: Path, cheap_hashes: None) -> None:
+    with pytest.raises(ValueError, match="invalid rows"):
+        _import(db_path, _csv(3, bad_lines=1), strict=True)
+    assert _employees(db_path) == []
+
+
+def test_import_over_the_cap_is_refused(db_path: Path, cheap_hashes: None) -> None:
+    with pytest.raises(ValueError, match="more than 2 employees"):
+        _import(db_path, _csv(3), max_employees=2)
+    assert _employees(db_path) == []
+    assert _import(db_path, _csv(2), max_employees=2).inserted == 2
+
+
+def test_login_verifies_while_import_hashes(db_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    stored = credentials.hash_password("A1ic3!Secure", log_n=10)
+    started = threading.Event()
+    release = threading.Event()
+    original = credentials.hash_password
+
+    def slow_hash(password: str, log_n: int = credentials.DEFAULT_LOG_N) -> str:
+        started.set()
+        release.wait(10)
+        return original(password, 10)
+
+    monkeypatch.setattr(credentials, "hash_password", slow_hash)
+    outcome: List[object] = []
+    importer = threading.Thread(target=lambda: outcome.append(_import(db_path, _csv(50), chunk_size=10)))
+    importer.start()
+    try:
+        assert started.wait(5)
+        # Every bulk thread is stuck hashing, yet a login is answered at once...
+        verifier = credentials.get_verifier()
+        assert verifier.verify(stored, "A1ic3!Secure")
+        assert not verifier.verify(stored, "wrong")
+        # ...and company.db is not locked while the import hashes.
+        other = sqlite3.connect(db_path, timeout=0)
+        other.execute("BEGIN IMMEDIATE;")
+        other.rollback()
+        other.close()
+    finally:
+        release.set()
+        importer.join(30)
+    assert outcome and outcome[0].inserted == 50
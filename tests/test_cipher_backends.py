@@ -0,0 +1,85 @@
+"""
+Envelope cipher backends and version-byte dispatch.
+"""
+from __future__ import annotations
+
+from typing import Iterator
+
+import pytest
+from cryptography.fernet import InvalidToken
+
+import security_utils
+
+VERSIONS = {"fernet": 0x01, "aes-gcm": 0x02, "chacha20-poly1305": 0x03}
+
+
+@pytest.fixture(params=sorted(VERSIONS))
+def cipher(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    # monkeypatch restores the module default once configure_cipher is done with it.
+    monkeypatch.setattr(security_utils, "CIPHER", security_utils.CIPHER)
+    security_utils.configure_cipher(request.param)
+    yield request.param
+    security_utils.shutdown_pool()
+
+
+def test_round_trip(cipher: str) -> None:
+    key_id, _ = security_utils.get_keyring().active()
+    token = security_utils.encrypt_text("Alice Johnson")
+
+    assert token[0] == VERSIONS[cipher]
+    assert security_utils.data_key_id(token) == key_id
+    assert security_utils.is_current(token, key_id)
+    assert security_utils.decrypt_text(token) == "Alice Johnson"
+
+
+def test_round_trip_across_the_pool(cipher: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security_utils, "BATCH_SIZE", 4)
+    monkeypatch.setattr(security_utils, "WORKERS", 2)
+    values = [f"employee {n}" for n in range(10)]
+
+    tokens = security_utils.encrypt_many(values)
+
+    assert {token[0] for token in tokens} == {VERSIONS[cipher]}
+    assert security_utils.decrypt_many(tokens) == values
+
+
+def test_aead_tokens_carry_no_timestamp(cipher: str) -> None:
+    token = security_utils.encrypt_text("555-0101")
+    if cipher == "fernet":
+        assert security_utils.token_timestamp(token) is not None
+    else:
+        # Header, 12-byte nonce, ciphertext and 16-byte tag.
+        assert len(token) == 5 + 12 + len("555-0101") + 16
+        assert security_utils.token_timestamp(token) is None
+
+
+def test_every_backend_decrypts_under_any_configured_backend(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security_utils, "CIPHER", security_utils.CIPHER)
+    tokens = {"legacy": security_utils.get_cipher().encrypt(b"legacy")}
+    for name in VERSIONS:
+        security_utils.configure_cipher(name)
+        tokens[name] = security_utils.encrypt_text(name)
+
+    for name in VERSIONS:
+        security_utils.configure_cipher(name)
+        assert [security_utils.decrypt_text(token) for token in tokens.values()] == list(tokens)
+        # Only tokens of the configured backend count as current.
+        key_id, _ = security_utils.get_keyring().active()
+        assert [label for label, token in tokens.items() if security_utils.is_current(token, key_id)] == [name]
+
+
+@pytest.mark.parametrize("name", ["aes-gcm", "chacha20-poly1305"])
+def test_aead_header_is_authenticated(name: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security_utils, "CIPHER", name)
+    token = security_utils.encrypt_text("555-0101")
+    other = VERSIONS["chacha20-poly1305" if name == "aes-gcm" else "aes-gcm"]
+
+    # Relabelling the backend or flipping a payload bit must not decrypt.
+    for tampered in (bytes([other]) + token[1:], token[:-1] + bytes([token[-1] ^ 1])):
+        with pytest.raises(InvalidToken):
+            security_utils.decrypt_text(tampered)
+
+
+def test_unknown_backend_is_rejected() -> None:
+    with pytest.raises(ValueError, match="unknown cipher backend"):
+        security_utils.configure_cipher("rot13")
@@ -0,0 +1,36 @@
+"""
+Password hashing and the bounded login verifier.
+"""
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+import credentials
+from credentials import CredentialVerifier, VerifierBusy
+
+
+def test_hash_and_verify() -> None:
+    stored = credentials.hash_password("s3cret!", log_n=10)
+    assert credentials.verify_password(stored, "s3cret!")
+    assert not credentials.verify_password(stored, "wrong")
+    assert credentials.needs_rehash(stored)
+    assert not credentials.needs_rehash(stored, log_n=10)
+
+
+def test_timed_out_job_keeps_its_slot() -> None:
+    verifier = CredentialVerifier(workers=1, max_pending=0, timeout=0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(VerifierBusy, match="longer than"):
+            verifier._run(release.wait)
+        # The abandoned job is still running, so there is no room for another.
+        with pytest.raises(VerifierBusy, match="too many"):
+            verifier._run(lambda: True)
+        release.set()
+        verifier.executor.submit(lambda: None).result(timeout=5)
+        assert verifier._run(lambda: True) is True
+    finally:
+        release.set()
+        verifier.shutdown()
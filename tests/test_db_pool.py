@@ -0,0 +1,57 @@
+"""
+The fixed-size SQLite connection pool.
+"""
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path: Path) -> ConnectionPool:
+    pool = ConnectionPool(tmp_path / "pool.db", size=2, timeout=0.05)
+    yield pool
+    pool.close_all()
+
+
+def test_connections_are_reused_most_recent_first(pool: ConnectionPool) -> None:
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire() is second
+    assert pool.acquire() is first
+
+
+def test_size_is_a_hard_limit(pool: ConnectionPool) -> None:
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(sqlite3.OperationalError, match="pool size 2"):
+        pool.acquire()
+    pool.release(held[0])
+    assert pool.acquire() is held[0]
+
+
+def test_release_rolls_back_open_transactions(pool: ConnectionPool) -> None:
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE Item (Id INTEGER);")
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO Item VALUES (1);")
+        assert conn.in_transaction
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM Item;").fetchone()[0] == 0
+
+
+def test_connections_are_configured(pool: ConnectionPool) -> None:
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout;").fetchone()[0] == 5000
+
+
+def test_size_must_be_positive(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        ConnectionPool(tmp_path / "pool.db", size=0)
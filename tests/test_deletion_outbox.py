@@ -0,0 +1,116 @@
+"""
+The web app's deletion outbox: batching, retries and final statuses.
+"""
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+import deletion_outbox
+import security_utils
+from deletion_outbox import DELIVERED, FAILED, RETRYING, DeletionOutbox, MemoryOutboxStore, SqliteOutboxStore
+
+
+class FakeClient:
+    """
+    Stands in for DeletionClient; each send() pops the next scripted reply.
+    """
+
+    def __init__(self, *replies: Any) -> None:
+        self.replies = list(replies)
+        self.messages: List[str] = []
+
+    def send(self, token: bytes) -> Dict[str, Any]:
+        self.messages.append(security_utils.decrypt_text(token))
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_outbox(request, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., DeletionOutbox]:
+    monkeypatch.setattr(deletion_outbox, "IDLE_POLL_INTERVAL", 0.02)
+    outboxes: List[DeletionOutbox] = []
+
+    def make(client: FakeClient, **kwargs: Any) -> DeletionOutbox:
+        store = MemoryOutboxStore() if request.param == "memory" else SqliteOutboxStore(tmp_path / "spool.db")
+        kwargs.setdefault("base_backoff", 0.01)
+        kwargs.setdefault("max_backoff", 0.02)
+        outbox = DeletionOutbox(client, store, **kwargs)
+        outboxes.append(outbox)
+        return outbox
+
+    yield make
+    for outbox in outboxes:
+        outbox.stop(timeout=5)
+
+
+def _wait_for(outbox: DeletionOutbox, request_ids: List[str], statuses=(DELIVERED, FAILED), timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(outbox.status(request_id)["status"] in statuses for request_id in request_ids):
+            return
+        time.sleep(0.01)
+    raise AssertionError([outbox.status(request_id) for request_id in request_ids])
+
+
+def _ok(*statuses: str) -> Dict[str, Any]:
+    return {"status": "ok", "message": "", "results": [{"status": status, "message": status} for status in statuses]}
+
+
+def test_queued_requests_go_out_as_one_batch(make_outbox) -> None:
+    client = FakeClient(_ok("deleted", "not_found", "invalid"))
+    outbox = make_outbox(client)
+    ids = [outbox.submit(1, "2024-01-15"), outbox.submit(2, "2024-03-01"), outbox.submit(3, "bad")]
+    outbox.start()
+    _wait_for(outbox, ids)
+
+    assert client.messages == ["1^%$2024-01-15\n2^%$2024-03-01\n3^%$bad"]
+    assert [outbox.status(request_id)["server_status"] for request_id in ids] == ["deleted", "not_found", "invalid"]
+    assert {outbox.status(request_id)["status"] for request_id in ids} == {DELIVERED}
+
+
+def test_connection_errors_are_retried(make_outbox) -> None:
+    client = FakeClient(ConnectionRefusedError("down"), ConnectionRefusedError("down"), {"status": "deleted", "message": "ok"})
+    outbox = make_outbox(client)
+    outbox.start()
+    request_id = outbox.submit(1, "2024-01-15")
+    _wait_for(outbox, [request_id])
+
+    record = outbox.status(request_id)
+    assert (record["status"], record["server_status"], record["attempts"]) == (DELIVERED, "deleted", 3)
+
+
+def test_server_errors_are_retried_until_max_attempts(make_outbox) -> None:
+    client = FakeClient({"status": "error", "message": "Database operation failed"})
+    outbox = make_outbox(client, max_attempts=3)
+    outbox.start()
+    request_id = outbox.submit(1, "2024-01-15")
+    _wait_for(outbox, [request_id])
+
+    record = outbox.status(request_id)
+    assert (record["status"], record["attempts"], record["message"]) == (FAILED, 3, "Database operation failed")
+    assert len(client.messages) == 3
+
+
+def test_retry_waits_for_backoff(make_outbox) -> None:
+    client = FakeClient(ConnectionRefusedError("down"), {"status": "deleted", "message": "ok"})
+    outbox = make_outbox(client, base_backoff=60.0, max_backoff=60.0)
+    outbox.start()
+    request_id = outbox.submit(1, "2024-01-15")
+    _wait_for(outbox, [request_id], statuses=(RETRYING,))
+    time.sleep(0.2)
+    assert outbox.status(request_id)["status"] == RETRYING
+    assert len(client.messages) == 1
+
+
+def test_submit_wakes_the_idle_sender(make_outbox, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deletion_outbox, "IDLE_POLL_INTERVAL", 60.0)
+    outbox = make_outbox(FakeClient({"status": "deleted", "message": "ok"}))
+    outbox.start()
+    time.sleep(0.05)
+    _wait_for(outbox, [outbox.submit(1, "2024-01-15")], timeout=2.0)
@@ -0,0 +1,152 @@
+"""
+Deletion server framing, and how the server tells framed requests from
+legacy unframed tokens.
+"""
+from __future__ import annotations
+
+import socket
+import threading
+from typing import Iterator, List, Tuple
+
+import pytest
+
+import deletion_protocol
+import process_payraise_deletion_server as server
+import security_utils
+from deletion_protocol import (
+    FRAME_HEADER,
+    LEGACY_TOKEN_PREFIX,
+    MAX_FRAME_SIZE,
+    DeletionClient,
+    ProtocolError,
+    decode_reply,
+    encode_reply,
+    recv_frame,
+    send_frame,
+)
+
+
+@pytest.fixture
+def pair() -> Iterator[Tuple[socket.socket, socket.socket]]:
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_frame_round_trip(pair: Tuple[socket.socket, socket.socket]) -> None:
+    left, right = pair
+    for payload in (b"", b"x", b"token" * 1000):
+        send_frame(left, payload)
+        assert recv_frame(right) == payload
+
+
+def test_several_frames_on_one_connection(pair: Tuple[socket.socket, socket.socket]) -> None:
+    left, right = pair
+    send_frame(left, b"first")
+    send_frame(left, b"second")
+    left.close()
+    assert recv_frame(right) == b"first"
+    assert recv_frame(right) == b"second"
+    assert recv_frame(right) is None
+
+
+def test_clean_close_returns_none(pair: Tuple[socket.socket, socket.socket]) -> None:
+    left, right = pair
+    left.close()
+    assert recv_frame(right) is None
+
+
+@pytest.mark.parametrize("sent", [b"\x00\x00", FRAME_HEADER.pack(10) + b"short"])
+def test_close_mid_frame(pair: Tuple[socket.socket, socket.socket], sent: bytes) -> None:
+    left, right = pair
+    left.sendall(sent)
+    left.close()
+    with pytest.raises(ProtocolError):
+        recv_frame(right)
+
+
+def test_oversized_frames_rejected(pair: Tuple[socket.socket, socket.socket]) -> None:
+    left, right = pair
+    with pytest.raises(ProtocolError):
+        send_frame(left, b"x" * (MAX_FRAME_SIZE + 1))
+    left.sendall(FRAME_HEADER.pack(MAX_FRAME_SIZE + 1))
+    with pytest.raises(ProtocolError):
+        recv_frame(right)
+
+
+def test_reply_round_trip() -> None:
+    results = [{"emp_id": 1, "pay_raise_date": "2024-01-01", "status": "deleted"}]
+    assert decode_reply(encode_reply("ok", "done", results)) == {
+        "status": "ok",
+        "message": "done",
+        "results": results,
+    }
+    assert "results" not in decode_reply(encode_reply("error", "failed"))
+
+
+def test_batch_message_format() -> None:
+    message = deletion_protocol.format_batch_message([(1, "2024-01-01"), (2, "2024-02-01")])
+    assert message.split(deletion_protocol.RECORD_SEPARATOR) == ["1^%$2024-01-01", "2^%$2024-02-01"]
+
+
+def test_legacy_prefix_never_starts_a_frame() -> None:
+    legacy = security_utils.get_cipher().encrypt(b"1^%$2024-01-01")
+    assert legacy.startswith(LEGACY_TOKEN_PREFIX)
+    # The largest allowed length still has a zero first byte.
+    for size in (0, 1, len(legacy), MAX_FRAME_SIZE):
+        assert not FRAME_HEADER.pack(size).startswith(LEGACY_TOKEN_PREFIX)
+    # Enveloped tokens, which the app sends framed, start with their version byte.
+    assert not security_utils.encrypt_text("1^%$2024-01-01").startswith(LEGACY_TOKEN_PREFIX)
+
+
+@pytest.fixture
+def running_server(monkeypatch: pytest.MonkeyPatch) -> Iterator[Tuple[int, List[bytes]]]:
+    received: List[bytes] = []
+
+    def fake_process_message(encrypted_data: bytes, client: str):
+        received.append(encrypted_data)
+        return "ok", f"processed {len(encrypted_data)} bytes", None
+
+    monkeypatch.setattr(server, "process_message", fake_process_message)
+    tcp_server = server.ThreadedDeletionServer(("127.0.0.1", 0), server.PayRaiseDeletionHandler, max_workers=4)
+    thread = threading.Thread(target=tcp_server.serve_forever, daemon=True)
+    thread.start()
+    yield tcp_server.server_address[1], received
+    tcp_server.shutdown()
+    tcp_server.server_close()
+    thread.join()
+
+
+def test_server_reads_legacy_token_to_eof(running_server: Tuple[int, List[bytes]]) -> None:
+    port, received = running_server
+    token = security_utils.get_cipher().encrypt(b"1^%$2024-01-01")
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        # Split writes must still arrive as one token.
+        sock.sendall(token[:10])
+        sock.sendall(token[10:])
+        sock.shutdown(socket.SHUT_WR)
+        assert sock.recv(1) == b""
+    assert received == [token]
+
+
+def test_server_answers_each_frame(running_server: Tuple[int, List[bytes]]) -> None:
+    port, received = running_server
+    tokens = [security_utils.encrypt_text(f"{n}^%$2024-01-01") for n in range(3)]
+    client = DeletionClient("127.0.0.1", port)
+    try:
+        replies = [client.send(token) for token in tokens]
+    finally:
+        client.close()
+    assert [reply["message"] for reply in replies] == [f"processed {len(token)} bytes" for token in tokens]
+    assert received == tokens
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="SO_REUSEPORT not available")
+def test_workers_can_share_a_port_with_reuse_port() -> None:
+    first = server.ThreadedDeletionServer(("127.0.0.1", 0), server.PayRaiseDeletionHandler, reuse_port=True)
+    try:
+        second = server.ThreadedDeletionServer(first.server_address, server.PayRaiseDeletionHandler, reuse_port=True)
+        second.server_close()
+    finally:
+        first.server_close()
@@ -0,0 +1,152 @@
+"""
+Deletion server shutdown: draining open connections and supervising
+pre-forked workers.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import pytest
+
+import process_payraise_deletion_server as server
+import security_utils
+from deletion_protocol import recv_frame, send_frame
+
+
+@pytest.fixture
+def gate(monkeypatch: pytest.MonkeyPatch) -> Tuple[threading.Event, threading.Event]:
+    # (started, release): process_message signals started, then blocks until released.
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_process_message(encrypted_data: bytes, client: str):
+        started.set()
+        release.wait(5)
+        return "ok", "processed", None
+
+    monkeypatch.setattr(server, "process_message", blocking_process_message)
+    return started, release
+
+
+@pytest.fixture
+def tcp_server() -> Iterator[server.ThreadedDeletionServer]:
+    tcp_server = server.ThreadedDeletionServer(("127.0.0.1", 0), server.PayRaiseDeletionHandler, max_workers=4)
+    thread = threading.Thread(target=tcp_server.serve_forever, daemon=True)
+    thread.start()
+    yield tcp_server
+    tcp_server.shutdown()
+    tcp_server.server_close()
+    thread.join()
+
+
+def stop_accepting(tcp_server: server.ThreadedDeletionServer) -> None:
+    tcp_server.shutdown()
+    tcp_server.server_close()
+
+
+def test_drain_disconnects_idle_clients(tcp_server, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, "process_message", lambda data, client: ("ok", "processed", None))
+    with socket.create_connection(tcp_server.server_address) as sock:
+        send_frame(sock, security_utils.encrypt_text("1^%$2024-01-01"))
+        assert recv_frame(sock) is not None
+        stop_accepting(tcp_server)
+
+        started = time.monotonic()
+        assert tcp_server.drain(5)
+        # Not held until IDLE_TIMEOUT by the idle persistent connection.
+        assert time.monotonic() - started < 2
+        assert recv_frame(sock) is None
+
+
+def test_drain_waits_for_requests_in_flight(tcp_server, gate) -> None:
+    started, release = gate
+    with socket.create_connection(tcp_server.server_address) as sock:
+        send_frame(sock, security_utils.encrypt_text("1^%$2024-01-01"))
+        assert started.wait(5)
+        stop_accepting(tcp_server)
+
+        threading.Timer(0.2, release.set).start()
+        assert tcp_server.drain(5)
+        # The request received before the drain still gets its reply.
+        assert recv_frame(sock) is not None
+
+
+def test_drain_gives_up_at_the_deadline(tcp_server, gate) -> None:
+    started, release = gate
+    with socket.create_connection(tcp_server.server_address) as sock:
+        send_frame(sock, security_utils.encrypt_text("1^%$2024-01-01"))
+        assert started.wait(5)
+        stop_accepting(tcp_server)
+        try:
+            assert not tcp_server.drain(0.1)
+        finally:
+            release.set()
+        assert tcp_server.drain(5)
+
+
+def test_connections_beyond_max_workers_wait(gate) -> None:
+    started, release = gate
+    tcp_server = server.ThreadedDeletionServer(("127.0.0.1", 0), server.PayRaiseDeletionHandler, max_workers=1)
+    threading.Thread(target=tcp_server.serve_forever, daemon=True).start()
+    try:
+        with socket.create_connection(tcp_server.server_address) as first:
+            send_frame(first, security_utils.encrypt_text("1^%$2024-01-01"))
+            assert started.wait(5)
+            started.clear()
+            with socket.create_connection(tcp_server.server_address) as second:
+                send_frame(second, security_utils.encrypt_text("2^%$2024-01-01"))
+                # The second connection is accepted by the kernel but not served.
+                assert not started.wait(0.2)
+                release.set()
+                assert recv_frame(first) is not None
+                first.close()
+                assert started.wait(5)
+                assert recv_frame(second) is not None
+    finally:
+        release.set()
+        tcp_server.shutdown()
+        tcp_server.server_close()
+
+
+def crash_once_then_serve(starts: Path) -> None:
+    # Runs in the forked worker: record the start, crash the first time.
+    with open(starts, "a") as handle:
+        handle.write(f"{os.getpid()}\n")
+    if len(starts.read_text().splitlines()) == 1:
+        raise SystemExit(3)
+    time.sleep(60)
+
+
+def test_supervisor_restarts_crashed_workers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+) -> None:
+    monkeypatch.setattr(server, "RESTART_DELAY", 0.05)
+    # run() installs SIGINT/SIGTERM handlers; keep pytest's.
+    monkeypatch.setattr(server.signal, "signal", lambda *args: None)
+    supervisor = server.WorkerSupervisor(
+        lambda index: crash_once_then_serve(tmp_path / f"starts-{index}"), processes=2, drain_timeout=1.0
+    )
+
+    def stop_when_restarted() -> None:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            starts = [tmp_path / f"starts-{index}" for index in range(2)]
+            if all(path.exists() and len(path.read_text().splitlines()) == 2 for path in starts):
+                break
+            time.sleep(0.05)
+        supervisor._stopping.set()
+
+    threading.Thread(target=stop_when_restarted, daemon=True).start()
+    supervisor.run()
+
+    output = capsys.readouterr().out
+    assert output.count("exited with code 3; restarting") == 2
+    assert "Server stopped." in output
+    for index in range(2):
+        pids = (tmp_path / f"starts-{index}").read_text().split()
+        assert len(pids) == 2 and pids[0] != pids[1]
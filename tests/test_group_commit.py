@@ -0,0 +1,122 @@
+"""
+Batched deletion messages and the deletion server's group commit.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+import migrations
+import process_payraise_deletion_server as server
+import replay_cache
+import reporting
+import security_utils
+from db_pool import ConnectionPool
+from deletion_protocol import format_batch_message
+
+RAISES = [
+    (1, "2024-01-15", "100.00"),
+    (1, "2024-06-01", "50.00"),
+    (2, "2024-03-01", "40.00"),
+    (3, "2024-03-01", "30.00"),
+]
+
+
+@pytest.fixture
+def pool(tmp_path: Path) -> Iterator[ConnectionPool]:
+    path = tmp_path / "company.db"
+    connection = sqlite3.connect(path)
+    migrations.migrate(connection)
+    connection.executemany(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (?, ?, ?);",
+        [(emp_id, date, security_utils.encrypt_text(amount)) for emp_id, date, amount in RAISES],
+    )
+    reporting.record_raises(connection, RAISES)
+    connection.commit()
+    connection.close()
+    pool = ConnectionPool(path, size=2)
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def committer(pool: ConnectionPool, monkeypatch: pytest.MonkeyPatch) -> Iterator[server.GroupCommitter]:
+    committer = server.GroupCommitter(pool, max_batch=100, max_wait=0.2)
+    monkeypatch.setattr(server, "_COMMITTER", committer)
+    monkeypatch.setattr(server, "_REPLAY_CACHE", replay_cache.ReplayCache())
+    yield committer
+    committer.stop()
+
+
+def _remaining(pool: ConnectionPool) -> List[tuple]:
+    with pool.connection() as connection:
+        return connection.execute("SELECT EmpId, PayRaiseDate FROM EmpPayRaise ORDER BY PayRaiseId;").fetchall()
+
+
+def test_concurrent_requests_share_one_commit(
+    pool: ConnectionPool, committer: server.GroupCommitter, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    applied: List[int] = []
+    original = committer._apply
+
+    def counting_apply(batch):
+        applied.append(len(batch))
+        return original(batch)
+
+    monkeypatch.setattr(committer, "_apply", counting_apply)
+    requests = [[(1, "2024-01-15")], [(2, "2024-03-01"), (9, "2024-03-01")], [(3, "1999-01-01")]]
+    results: List[object] = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def send(index: int) -> None:
+        barrier.wait()
+        results[index] = committer.submit(requests[index])
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert applied == [3]
+    assert results == [[1], [1, 0], [0]]
+    assert _remaining(pool) == [(1, "2024-06-01"), (3, "2024-03-01")]
+
+
+def test_batch_message_reports_each_record(pool: ConnectionPool, committer: server.GroupCommitter) -> None:
+    message = format_batch_message([(1, "2024-01-15"), (1, "2024-06-01"), (7, "2024-01-01")]) + "\nnot a record"
+    status, summary, results = server.process_message(security_utils.encrypt_text(message), "test")
+
+    assert (status, summary) == ("ok", "2 of 4 records deleted")
+    assert [result["status"] for result in results] == ["deleted", "deleted", "not_found", "invalid"]
+    # Deleted rows came back through RETURNING and left the aggregates.
+    with pool.connection() as connection:
+        years = connection.execute("SELECT EmpId, RaiseCount FROM PayRaiseAggregate ORDER BY EmpId;").fetchall()
+    assert years == [(2, 1), (3, 1)]
+
+
+def test_single_record_message(committer: server.GroupCommitter) -> None:
+    token = security_utils.encrypt_text("2^%$2024-03-01")
+    assert server.process_message(token, "test")[0] == "deleted"
+    assert server.process_message(security_utils.encrypt_text("2^%$2024-03-01"), "test")[0] == "not_found"
+    assert server.process_message(b"garbage", "test")[:2] == ("invalid", server.DECRYPT_FAILED)
+
+
+def test_busy_database_is_retried(committer: server.GroupCommitter, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, "BUSY_BACKOFF", 0.001)
+    original = committer._apply
+    attempts: List[int] = []
+
+    def flaky_apply(batch):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return original(batch)
+
+    monkeypatch.setattr(committer, "_apply", flaky_apply)
+    assert committer.submit([(1, "2024-01-15")]) == [1]
+    assert len(attempts) == 3
@@ -0,0 +1,135 @@
+"""
+Data key rotation, usage counts and retirement.
+"""
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from cryptography.fernet import InvalidToken
+
+import migrations
+import rotate_keys
+import security_utils
+import session_store
+
+
+@pytest.fixture
+def connection() -> Iterator[sqlite3.Connection]:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    migrations.migrate(connection)
+    yield connection
+    connection.close()
+
+
+def add_raise(connection: sqlite3.Connection, token: bytes) -> None:
+    connection.execute(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (1, '2025-01-01', ?);", (token,)
+    )
+
+
+def test_rotate_keeps_old_values_readable() -> None:
+    keyring = security_utils.get_keyring()
+    old_key_id, _ = keyring.active()
+    old = security_utils.encrypt_text("555-0101")
+
+    new_key_id = keyring.rotate()
+    new = security_utils.encrypt_text("555-0102")
+
+    assert new_key_id != old_key_id
+    assert security_utils.data_key_id(old) == old_key_id
+    assert security_utils.data_key_id(new) == new_key_id
+    assert security_utils.decrypt_text(old) == "555-0101"
+    assert security_utils.decrypt_text(new) == "555-0102"
+    assert [key["key_id"] for key in keyring.keys() if key["active"]] == [new_key_id]
+
+
+def test_retire_refuses_the_active_key() -> None:
+    keyring = security_utils.get_keyring()
+    key_id, _ = keyring.active()
+    with pytest.raises(ValueError):
+        keyring.retire(key_id)
+    assert security_utils.decrypt_text(security_utils.encrypt_text("still here")) == "still here"
+
+
+def test_retired_key_no_longer_decrypts() -> None:
+    keyring = security_utils.get_keyring()
+    old_key_id, _ = keyring.active()
+    old = security_utils.encrypt_text("555-0101")
+    keyring.rotate()
+
+    keyring.retire(old_key_id)
+
+    assert old_key_id not in [key["key_id"] for key in keyring.keys()]
+    with pytest.raises(InvalidToken):
+        security_utils.decrypt_text(old)
+
+
+def test_key_usage_counts_values_per_key(connection: sqlite3.Connection) -> None:
+    old_key_id, _ = security_utils.get_keyring().active()
+    add_raise(connection, security_utils.encrypt_text("100.00"))
+    add_raise(connection, security_utils.encrypt_text("200.00"))
+    new_key_id = security_utils.get_keyring().rotate()
+    add_raise(connection, security_utils.encrypt_text("300.00"))
+    # Legacy value encrypted directly with the master key.
+    add_raise(connection, security_utils.get_cipher().encrypt(b"400.00"))
+    connection.commit()
+
+    assert rotate_keys.key_usage(connection) == {old_key_id: 2, new_key_id: 1, None: 1}
+
+
+def test_retire_command_refuses_a_key_in_use(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+) -> None:
+    db_path = tmp_path / "company.db"
+    connection = sqlite3.connect(db_path)
+    migrations.migrate(connection)
+    old_key_id, _ = security_utils.get_keyring().active()
+    add_raise(connection, security_utils.encrypt_text("1.00"))
+    connection.commit()
+    connection.close()
+    security_utils.get_keyring().rotate()
+    monkeypatch.setattr(rotate_keys, "DB_PATH", db_path)
+
+    monkeypatch.setattr("sys.argv", ["rotate_keys.py", "retire", str(old_key_id)])
+    with pytest.raises(SystemExit, match="still encrypts 1 values"):
+        rotate_keys.main()
+    assert old_key_id in [key["key_id"] for key in security_utils.get_keyring().keys()]
+
+    monkeypatch.setattr("sys.argv", ["rotate_keys.py", "reencrypt", "--rows-per-second", "0"])
+    rotate_keys.main()
+    monkeypatch.setattr("sys.argv", ["rotate_keys.py", "retire", str(old_key_id)])
+    rotate_keys.main()
+    assert f"Data key {old_key_id} retired." in capsys.readouterr().out
+
+
+def test_rotate_master_key_rewraps_data_keys(connection: sqlite3.Connection) -> None:
+    token = security_utils.encrypt_text("Alice Johnson")
+    old_master = security_utils.KEY_FILE.read_bytes()
+
+    rotate_keys.rotate_master_key(connection)
+
+    assert security_utils.KEY_FILE.read_bytes() != old_master
+    assert security_utils.decrypt_text(token) == "Alice Johnson"
+
+
+def test_rotate_master_key_refuses_legacy_values(connection: sqlite3.Connection) -> None:
+    add_raise(connection, security_utils.get_cipher().encrypt(b"1.00"))
+    connection.commit()
+    old_master = security_utils.KEY_FILE.read_bytes()
+    with pytest.raises(SystemExit, match="legacy values"):
+        rotate_keys.rotate_master_key(connection)
+    assert security_utils.KEY_FILE.read_bytes() == old_master
+
+
+def test_key_usage_counts_sessions(connection: sqlite3.Connection) -> None:
+    old_key_id, _ = security_utils.get_keyring().active()
+    store = session_store.SqliteSessionStore(lambda: connection)
+    store.save("sid-1", 1, {"user_id": 1}, expires_at=4e9)
+    connection.commit()
+
+    security_utils.get_keyring().rotate()
+    # No table rows exist, but the session still needs the old key.
+    assert rotate_keys.key_usage(connection) == {old_key_id: 1}
@@ -0,0 +1,67 @@
+"""
+Keyset pagination and streamed rendering of the listing pages.
+"""
+from __future__ import annotations
+
+import re
+from typing import List
+
+import pytest
+
+from conftest import EMPLOYEES
+
+
+def _cells(html: bytes, column: int) -> List[str]:
+    rows = re.findall(rb"<tr>\s*(.*?)\s*</tr>", html, re.S)
+    values = [re.findall(rb"<td>(.*?)</td>", row) for row in rows]
+    return [row[column].decode() for row in values if len(row) > column]
+
+
+def _next_link(html: bytes) -> str:
+    match = re.search(rb'href="([^"]*after=[^"]*)">Next page', html)
+    return match.group(1).decode().replace("&amp;", "&") if match else ""
+
+
+@pytest.fixture
+def client(portal):
+    portal.login()
+    return portal.client
+
+
+@pytest.mark.parametrize("stream", ["", "&stream=1"])
+def test_employee_pages_follow_the_cursor(client, stream: str) -> None:
+    url = f"/employees?page_size=2{stream}"
+    names: List[str] = []
+    pages = 0
+    while url:
+        html = client.get(url).data
+        names += _cells(html, 1)
+        url = _next_link(html)
+        pages += 1
+    assert pages == 3
+    assert names == [employee[0] for employee in EMPLOYEES]
+
+
+def test_pay_raises_page_newest_first(client) -> None:
+    first = client.get("/payraises?page_size=3").data
+    assert _cells(first, 2) == ["2024-06-01", "2024-03-01", "2024-02-14"]
+    second = client.get(_next_link(first)).data
+    assert _cells(second, 2) == ["2024-01-15", "2023-11-20"]
+    assert _next_link(second) == ""
+
+
+def test_page_size_is_clamped(portal, client, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(portal.app.config, "MAX_PAGE_SIZE", 2)
+    html = client.get("/employees?page_size=500").data
+    assert len(_cells(html, 1)) == 2
+
+
+def test_bad_cursor_starts_from_the_top(client) -> None:
+    html = client.get("/employees?after=not-a-number&page_size=1").data
+    assert _cells(html, 1) == ["Alice Johnson"]
+
+
+def test_streamed_page_is_not_buffered(client) -> None:
+    response = client.get("/employees?stream=1", buffered=False)
+    assert response.is_streamed
+    assert b"Erin Black" in b"".join(response.response)
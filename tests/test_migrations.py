@@ -0,0 +1,168 @@
+"""
+Upgrading a database created by the original setup scripts, before
+migrations existed, to the latest schema.
+"""
+from __future__ import annotations
+
+import sqlite3
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+import migrations
+import security_utils
+
+EMPLOYEES = [
+    (1, "Alice Johnson", 34, "555-0101", 3, "A1ic3!Secure"),
+    (2, "Bob Smith", 45, "555-0102", 1, "B0b!Secure"),
+]
+RAISES = [
+    (1, "2023-03-01", "1000.50"),
+    (1, "2023-09-01", "250.25"),
+    (1, "2024-01-15", "400.00"),
+    (2, "2024-02-01", "75.10"),
+]
+
+
+def _legacy(value: str) -> bytes:
+    # The original scripts stored bare master-key Fernet tokens.
+    return security_utils.get_cipher().encrypt(value.encode("utf-8"))
+
+
+@pytest.fixture
+def baseline_db(tmp_path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(tmp_path / "company.db")
+    connection.executescript(
+        """
+        CREATE TABLE Employee (
+            UserId INTEGER PRIMARY KEY,
+            Name BLOB NOT NULL,
+            Age INTEGER NOT NULL,
+            PhNum BLOB NOT NULL,
+            SecurityLevel INTEGER NOT NULL,
+            LoginPassword BLOB NOT NULL
+        );
+        CREATE TABLE EmpPayRaise (
+            PayRaiseId INTEGER PRIMARY KEY,
+            EmpId INTEGER NOT NULL,
+            PayRaiseDate TEXT NOT NULL,
+            RaiseAmt BLOB NOT NULL,
+            FOREIGN KEY (EmpId) REFERENCES Employee(UserId)
+        );
+        """
+    )
+    connection.executemany(
+        "INSERT INTO Employee VALUES (?, ?, ?, ?, ?, ?);",
+        [
+            (user_id, _legacy(name), age, _legacy(phone), level, _legacy(password))
+            for user_id, name, age, phone, level, password in EMPLOYEES
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (?, ?, ?);",
+        [(emp_id, date, _legacy(amount)) for emp_id, date, amount in RAISES],
+    )
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def _tables(connection: sqlite3.Connection) -> set:
+    return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+
+
+def _table_version(connection: sqlite3.Connection, table: str) -> int:
+    return connection.execute("SELECT Version FROM TableVersion WHERE TableName = ?;", (table,)).fetchone()[0]
+
+
+def test_upgrade_from_baseline(baseline_db: sqlite3.Connection) -> None:
+    assert migrations.current_version(baseline_db) == 0
+
+    assert migrations.migrate(baseline_db) == migrations.LATEST_VERSION
+    assert migrations.current_version(baseline_db) == migrations.LATEST_VERSION
+    assert {
+        "Employee",
+        "EmpPayRaise",
+        "RekeyCheckpoint",
+        "PayRaiseAggregate",
+        "Session",
+        "EmployeeSearchToken",
+        "TableVersion",
+    } <= _tables(baseline_db)
+
+    # Existing rows keep their data and gain the derived columns and tables.
+    names = dict(baseline_db.execute("SELECT UserId, NameIdx FROM Employee;").fetchall())
+    for user_id, name, *_ in EMPLOYEES:
+        assert names[user_id] == security_utils.blind_index(name)
+
+    indexed = {row[0] for row in baseline_db.execute("SELECT DISTINCT UserId FROM EmployeeSearchToken;")}
+    assert indexed == {user_id for user_id, *_ in EMPLOYEES}
+
+    aggregates = {
+        (emp_id, year): (Decimal(security_utils.decrypt_text(total)), count)
+        for emp_id, year, total, count in baseline_db.execute(
+            "SELECT EmpId, Year, TotalAmt, RaiseCount FROM PayRaiseAggregate;"
+        )
+    }
+    assert aggregates == {
+        (1, 2023): (Decimal("1250.75"), 2),
+        (1, 2024): (Decimal("400.00"), 1),
+        (2, 2024): (Decimal("75.10"), 1),
+    }
+
+
+def test_upgrade_is_idempotent(baseline_db: sqlite3.Connection) -> None:
+    migrations.migrate(baseline_db)
+    schema = baseline_db.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name;").fetchall()
+
+    assert migrations.migrate(baseline_db) == migrations.LATEST_VERSION
+    assert baseline_db.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name;").fetchall() == schema
+
+
+def test_upgrade_in_steps(baseline_db: sqlite3.Connection) -> None:
+    assert migrations.migrate(baseline_db, target=3) == 3
+    assert "PayRaiseAggregate" not in _tables(baseline_db)
+
+    assert migrations.migrate(baseline_db) == migrations.LATEST_VERSION
+    assert baseline_db.execute("SELECT COUNT(*) FROM PayRaiseAggregate;").fetchone()[0] == 3
+
+
+def test_failed_step_rolls_back(baseline_db: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch) -> None:
+    def broken(connection: sqlite3.Connection) -> None:
+        connection.execute("CREATE TABLE Leftover (Id INTEGER);")
+        raise RuntimeError("boom")
+
+    steps = list(migrations.MIGRATIONS)
+    steps[4] = (5, "broken", broken)
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps)
+
+    with pytest.raises(RuntimeError):
+        migrations.migrate(baseline_db)
+    assert migrations.current_version(baseline_db) == 4
+    assert "Leftover" not in _tables(baseline_db)
+
+
+def test_triggers_after_upgrade(baseline_db: sqlite3.Connection) -> None:
+    migrations.migrate(baseline_db)
+    raises_version = _table_version(baseline_db, "EmpPayRaise")
+    employee_version = _table_version(baseline_db, "Employee")
+
+    baseline_db.execute(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (2, '2024-06-01', ?);",
+        (security_utils.encrypt_text("10.00"),),
+    )
+    baseline_db.execute(
+        "INSERT INTO Session (SessionId, UserId, Data, ExpiresAt) VALUES ('s1', 2, x'00', 1e12);"
+    )
+    baseline_db.execute("UPDATE Employee SET SecurityLevel = 2 WHERE UserId = 2;")
+    baseline_db.commit()
+
+    assert _table_version(baseline_db, "EmpPayRaise") == raises_version + 1
+    assert _table_version(baseline_db, "Employee") == employee_version + 1
+    # Changing SecurityLevel drops the user's cached sessions.
+    assert baseline_db.execute("SELECT COUNT(*) FROM Session;").fetchone()[0] == 0
+
+    baseline_db.execute("DELETE FROM Employee WHERE UserId = 2;")
+    baseline_db.commit()
+    assert baseline_db.execute("SELECT COUNT(*) FROM EmployeeSearchToken WHERE UserId = 2;").fetchone()[0] == 0
@@ -0,0 +1,103 @@
+"""
+The sorted in-memory name directory and its refresh against Employee.
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Iterator, List
+
+import pytest
+
+import employee_create_db
+import migrations
+import security_utils
+from name_directory import NameDirectory
+
+NAMES = ["carol White", "Alice Johnson", "Bob Smith", "alan Turing", "Alice Johnson"]
+
+
+def add_employees(connection: sqlite3.Connection, first_id: int, names: List[str]) -> None:
+    rows = [(user_id, name, 30, "555-0100", 3, "unused") for user_id, name in enumerate(names, start=first_id)]
+    connection.executemany(
+        employee_create_db.INSERT_SQL, employee_create_db.encrypt_employee_rows(rows, password_hash="unused")
+    )
+    connection.commit()
+
+
+@pytest.fixture
+def connection() -> Iterator[sqlite3.Connection]:
+    connection = sqlite3.connect(":memory:")
+    migrations.migrate(connection)
+    add_employees(connection, 1, NAMES)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def directory(connection: sqlite3.Connection) -> NameDirectory:
+    directory = NameDirectory(chunk_size=2, refresh_interval=3600)
+    directory.refresh(connection)
+    return directory
+
+
+def test_names_are_sorted_ignoring_case(directory: NameDirectory) -> None:
+    assert len(directory) == len(NAMES)
+    assert directory.first(10) == ["alan Turing", "Alice Johnson", "Alice Johnson", "Bob Smith", "carol White"]
+    assert directory.first(2) == ["alan Turing", "Alice Johnson"]
+
+
+def test_search_by_prefix(directory: NameDirectory) -> None:
+    assert directory.search("al", 10) == ["alan Turing", "Alice Johnson"]
+    assert directory.search("ALI", 10) == ["Alice Johnson"]
+    assert directory.search("C", 10) == ["carol White"]
+    assert directory.search("a", 1) == ["alan Turing"]
+    assert directory.search("z", 10) == []
+
+
+def test_add_inserts_without_a_query(directory: NameDirectory, connection: sqlite3.Connection) -> None:
+    directory.add(6, "Beth Jones")
+    assert directory.search("b", 10) == ["Beth Jones", "Bob Smith"]
+    # Rows a refresh already loaded are not added twice.
+    directory.add(3, "Bob Smith")
+    assert directory.search("bob", 10) == ["Bob Smith"]
+    assert len(directory) == len(NAMES) + 1
+
+
+def test_refresh_waits_for_its_interval(directory: NameDirectory, connection: sqlite3.Connection) -> None:
+    add_employees(connection, 6, ["Zoe Quinn"])
+    directory.refresh(connection)
+    assert directory.search("zoe", 10) == []
+
+    directory.mark_stale()
+    directory.refresh(connection)
+    assert directory.search("zoe", 10) == ["Zoe Quinn"]
+
+
+def test_refresh_loads_rows_appended_elsewhere(
+    directory: NameDirectory, connection: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    add_employees(connection, 6, ["Zoe Quinn", "Aaron Blake", "Mia Long"])
+    decrypted = []
+    decrypt_many = security_utils.decrypt_many
+
+    def recording_decrypt_many(tokens, *args, **kwargs):
+        decrypted.extend(tokens)
+        return decrypt_many(tokens, *args, **kwargs)
+
+    monkeypatch.setattr(security_utils, "decrypt_many", recording_decrypt_many)
+    directory.refresh(connection, force=True)
+
+    # Only the appended rows are decrypted.
+    assert len(decrypted) == 3
+    assert directory.first(2) == ["Aaron Blake", "alan Turing"]
+    assert directory.search("m", 10) == ["Mia Long"]
+
+
+def test_refresh_rebuilds_after_deletes(directory: NameDirectory, connection: sqlite3.Connection) -> None:
+    connection.execute("DELETE FROM Employee WHERE UserId = 3;")
+    add_employees(connection, 6, ["Bea Ray"])
+
+    directory.refresh(connection, force=True)
+
+    assert directory.search("b", 10) == ["Bea Ray"]
+    assert len(directory) == len(NAMES)
@@ -0,0 +1,136 @@
+"""
+Listing ETags, 304 responses and the fragment cache, invalidated through
+the TableVersion change-counter triggers.
+"""
+from __future__ import annotations
+
+from contextlib import closing
+from typing import Any
+
+import pytest
+
+import employee_create_db
+import security_utils
+
+
+def signed_in(portal: Any, name: str, password: str) -> Any:
+    client = portal.app.test_client()
+    client.post("/", data={"name": name, "password": password})
+    # Rendering a page consumes the welcome flash, which is never cached.
+    client.get("/home")
+    return client
+
+
+@pytest.fixture
+def alice(portal) -> Any:
+    return signed_in(portal, "Alice Johnson", "A1ic3!Secure")
+
+
+def fragment_stats(portal: Any) -> Any:
+    import app as portal_app
+
+    with portal.app.app_context():
+        return portal_app.get_fragment_cache().stats()
+
+
+def execute(portal: Any, sql: str, params: Any = ()) -> None:
+    # A separate connection, as another process would use.
+    with closing(portal.connect()) as connection:
+        connection.execute(sql, params)
+        connection.commit()
+
+
+def test_unchanged_listing_is_not_modified(portal, alice) -> None:
+    first = alice.get("/employees")
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert first.cache_control.private and first.cache_control.no_cache
+
+    second = alice.get("/employees", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_writes_from_another_connection_change_the_etag(portal, alice) -> None:
+    etag = alice.get("/employees").headers["ETag"]
+    rows = employee_create_db.encrypt_employee_rows([(6, "Frank Green", 40, "555-0106", 3, "x")], password_hash="x")
+    execute(portal, employee_create_db.INSERT_SQL, rows[0])
+
+    response = alice.get("/employees", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert b"Frank Green" in response.data
+
+
+def test_other_tables_leave_the_etag_alone(portal, alice) -> None:
+    etag = alice.get("/employees").headers["ETag"]
+    execute(
+        portal,
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (2, '2024-07-01', ?);",
+        (security_utils.encrypt_text("10.00"),),
+    )
+    assert alice.get("/employees", headers={"If-None-Match": etag}).status_code == 304
+    assert alice.get("/payraises", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_fragments_are_reused_until_the_table_changes(portal, alice) -> None:
+    first = alice.get("/employees?page_size=2")
+    assert fragment_stats(portal)["misses"] == 1
+
+    second = alice.get("/employees?page_size=2")
+    assert second.data == first.data
+    assert fragment_stats(portal)["hits"] == 1
+
+    execute(portal, "UPDATE Employee SET Age = 35 WHERE UserId = 1;")
+    third = alice.get("/employees?page_size=2")
+    assert b"<td>35</td>" in third.data
+    assert fragment_stats(portal)["misses"] == 2
+
+    # Another page is another fragment.
+    alice.get("/employees?page_size=3")
+    assert fragment_stats(portal)["misses"] == 3
+
+
+def test_fragments_are_shared_within_a_security_level(portal) -> None:
+    carol = signed_in(portal, "Carol White", "C4rol!Secure")
+    dan = signed_in(portal, "Dan Brown", "D4n!Secure")
+
+    carol_page = carol.get("/employees")
+    dan_page = dan.get("/employees")
+
+    assert fragment_stats(portal)["hits"] == 1
+    # The page around the fragment, and its ETag, are still per user.
+    assert carol_page.headers["ETag"] != dan_page.headers["ETag"]
+    assert dan.get("/employees", headers={"If-None-Match": carol_page.headers["ETag"]}).status_code == 200
+
+
+def test_per_user_listing_is_not_shared(portal, alice) -> None:
+    bob = signed_in(portal, "Bob Smith", "B0b!Secure")
+
+    alice_page = alice.get("/payraises/me")
+    bob_page = bob.get("/payraises/me")
+
+    assert b"1000.00" in alice_page.data and b"1000.00" not in bob_page.data
+    assert b"400.00" in bob_page.data
+    assert fragment_stats(portal)["hits"] == 0
+
+    execute(portal, "DELETE FROM EmpPayRaise WHERE EmpId = 1 AND PayRaiseDate = '2024-01-15';")
+    response = alice.get("/payraises/me", headers={"If-None-Match": alice_page.headers["ETag"]})
+    assert response.status_code == 200
+    assert b"1000.00" not in response.data
+
+
+def test_pending_flashes_skip_validation(portal) -> None:
+    client = portal.app.test_client()
+    client.post("/", data={"name": "Alice Johnson", "password": "A1ic3!Secure"})
+    response = client.get("/employees")
+    assert "ETag" not in response.headers
+    assert b"Welcome back" in response.data
+    assert "ETag" in client.get("/employees").headers
+
+
+def test_cache_can_be_disabled(portal, alice, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(portal.app.config, "PAGE_CACHE_ENABLED", False)
+    assert "ETag" not in alice.get("/employees").headers
+    assert fragment_stats(portal)["misses"] == 0
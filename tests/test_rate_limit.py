@@ -0,0 +1,61 @@
+"""
+Token bucket refill, waits and bounded key tracking.
+"""
+from __future__ import annotations
+
+import pytest
+
+from rate_limit import TokenBucketLimiter
+
+
+def test_burst_then_wait() -> None:
+    limiter = TokenBucketLimiter(capacity=3, refill_rate=0.5)
+    assert [limiter.consume("ip", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # One token short at 0.5 tokens per second.
+    assert limiter.consume("ip", now=0.0) == pytest.approx(2.0)
+    # A refused attempt takes nothing, so the wait only shrinks with time.
+    assert limiter.consume("ip", now=1.5) == pytest.approx(0.5)
+    assert limiter.consume("ip", now=2.0) == 0.0
+
+
+def test_refill_is_capped_at_capacity() -> None:
+    limiter = TokenBucketLimiter(capacity=2, refill_rate=1.0)
+    limiter.consume("ip", tokens=2, now=0.0)
+    assert limiter.consume("ip", now=1000.0) == 0.0
+    assert limiter.consume("ip", now=1000.0) == 0.0
+    assert limiter.consume("ip", now=1000.0) == pytest.approx(1.0)
+
+
+def test_keys_are_independent() -> None:
+    limiter = TokenBucketLimiter(capacity=1, refill_rate=1.0)
+    assert limiter.consume("alice", now=0.0) == 0.0
+    assert limiter.consume("alice", now=0.0) > 0
+    assert limiter.consume("bob", now=0.0) == 0.0
+
+
+def test_reset_refills_the_bucket() -> None:
+    limiter = TokenBucketLimiter(capacity=1, refill_rate=0.01)
+    limiter.consume("user", now=0.0)
+    assert limiter.consume("user", now=0.0) > 0
+    limiter.reset("user")
+    limiter.reset("unknown")
+    assert limiter.consume("user", now=0.0) == 0.0
+
+
+@pytest.mark.parametrize("refill_rate", [0.0, -1.0])
+def test_refill_rate_must_be_positive(refill_rate: float) -> None:
+    with pytest.raises(ValueError, match="refill_rate"):
+        TokenBucketLimiter(capacity=1, refill_rate=refill_rate)
+
+
+def test_least_recently_used_keys_are_evicted() -> None:
+    limiter = TokenBucketLimiter(capacity=1, refill_rate=0.01, max_keys=2)
+    limiter.consume("a", now=0.0)
+    limiter.consume("b", now=0.0)
+    # Touching "a" makes "b" the least recently used.
+    assert limiter.consume("a", now=0.0) > 0
+    limiter.consume("c", now=0.0)
+    assert len(limiter) == 2
+    # An evicted key comes back with a full bucket; "c" is still tracked.
+    assert limiter.consume("b", now=0.0) == 0.0
+    assert limiter.consume("c", now=0.0) > 0
@@ -0,0 +1,136 @@
+"""
+Lazy projection records and keyset pages built from them.
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Iterator, List
+
+import pytest
+
+import employee_create_db
+import migrations
+import records
+import security_utils
+
+EmployeeRecord = records.projection("Employee", ("UserId", "Name", "Age", "PhNum"))
+CachedEmployeeRecord = records.projection("Employee", ("UserId", "Name"), cached=("Name",))
+EMPLOYEES = [
+    (1, "Alice Johnson", 34, "555-0101", 1, "unused"),
+    (2, "Bob Smith", 45, "555-0102", 2, "unused"),
+    (3, "Carol White", 29, "555-0103", 3, "unused"),
+]
+
+
+@pytest.fixture
+def connection() -> Iterator[sqlite3.Connection]:
+    connection = sqlite3.connect(":memory:")
+    migrations.migrate(connection)
+    connection.executemany(
+        employee_create_db.INSERT_SQL, employee_create_db.encrypt_employee_rows(EMPLOYEES, password_hash="unused")
+    )
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def decrypts(monkeypatch: pytest.MonkeyPatch) -> List[int]:
+    # Number of tokens per decrypt_text/decrypt_many call.
+    calls: List[int] = []
+    decrypt_text = security_utils.decrypt_text
+    decrypt_many = security_utils.decrypt_many
+
+    def counting_decrypt_text(token, cache=False):
+        calls.append(1)
+        return decrypt_text(token, cache)
+
+    def counting_decrypt_many(tokens, batch_size=None, cache=False):
+        calls.append(len(tokens))
+        return decrypt_many(tokens, batch_size, cache)
+
+    monkeypatch.setattr(security_utils, "decrypt_text", counting_decrypt_text)
+    monkeypatch.setattr(security_utils, "decrypt_many", counting_decrypt_many)
+    return calls
+
+
+def test_projection_types_are_shared() -> None:
+    assert records.projection("Employee", ("UserId", "Name", "Age", "PhNum")) is EmployeeRecord
+    assert EmployeeRecord.select_list == "UserId, Name, Age, PhNum"
+    assert EmployeeRecord.__name__ == "EmployeeRecord"
+
+
+def test_encrypted_columns_decrypt_on_first_access_only(connection: sqlite3.Connection, decrypts: List[int]) -> None:
+    alice = records.fetch_all(connection, EmployeeRecord, "WHERE UserId = ?", (1,))[0]
+
+    assert (alice.UserId, alice.Age) == (1, 34)
+    assert decrypts == []
+    assert isinstance(alice.raw("Name"), bytes)
+
+    assert alice.Name == "Alice Johnson"
+    assert alice["Name"] == "Alice Johnson"
+    assert decrypts == [1]
+    assert alice.as_dict() == {"UserId": 1, "Name": "Alice Johnson", "Age": 34, "PhNum": "555-0101"}
+    assert decrypts == [1, 1]
+
+
+def test_unknown_columns_are_errors(connection: sqlite3.Connection) -> None:
+    alice = records.fetch_all(connection, EmployeeRecord, "WHERE UserId = 1")[0]
+    with pytest.raises(KeyError):
+        alice["LoginPassword"]
+    with pytest.raises(AttributeError):
+        alice.SecurityLevel
+
+
+def test_prefetch_decrypts_each_column_in_one_batch(connection: sqlite3.Connection, decrypts: List[int]) -> None:
+    rows = records.fetch_all(connection, EmployeeRecord, "ORDER BY UserId")
+    rows[0].Name
+
+    EmployeeRecord.prefetch(rows)
+
+    # Name was already decrypted for the first row, so its batch skips it.
+    assert decrypts == [1, 2, 3]
+    assert [(row.Name, row.PhNum) for row in rows] == [(name, phone) for _, name, _, phone, _, _ in EMPLOYEES]
+    assert decrypts == [1, 2, 3]
+
+
+def test_prefetch_can_limit_columns(connection: sqlite3.Connection, decrypts: List[int]) -> None:
+    rows = records.fetch_all(connection, EmployeeRecord, "ORDER BY UserId")
+    EmployeeRecord.prefetch(rows, ["PhNum"])
+    assert decrypts == [3]
+    assert rows[2].Name == "Carol White"
+    assert decrypts == [3, 1]
+
+
+def test_cached_columns_use_the_plaintext_cache(connection: sqlite3.Connection) -> None:
+    security_utils.enable_plaintext_cache()
+    try:
+        first = records.fetch_all(connection, CachedEmployeeRecord, "WHERE UserId = 2")[0]
+        second = records.fetch_all(connection, CachedEmployeeRecord, "WHERE UserId = 2")[0]
+        assert first.Name == second.Name == "Bob Smith"
+        stats = security_utils.plaintext_cache_stats()
+        assert (stats["misses"], stats["hits"]) == (1, 1)
+
+        # Uncached projections of the same column bypass it.
+        records.fetch_all(connection, EmployeeRecord, "WHERE UserId = 2")[0].Name
+        assert security_utils.plaintext_cache_stats()["hits"] == 1
+    finally:
+        security_utils.disable_plaintext_cache()
+
+
+def test_keyset_page_prefetches_chunks(portal, decrypts: List[int], monkeypatch: pytest.MonkeyPatch) -> None:
+    import app as portal_app
+
+    monkeypatch.setitem(portal_app.app.config, "STREAM_CHUNK_SIZE", 2)
+    connection = portal.connect()
+    try:
+        cursor = records.select(
+            connection, portal_app.EmployeeListing, "WHERE UserId > ? ORDER BY UserId LIMIT ?", (1, 4)
+        )
+        page = portal_app.KeysetPage(cursor, 3, lambda row: str(row.UserId), decode=portal_app.EmployeeListing.prefetch)
+
+        assert [row.Name for row in page] == ["Bob Smith", "Carol White", "Dan Brown"]
+        assert page.next_after == "4"
+        # One batch per encrypted column per chunk of at most two rows.
+        assert decrypts == [2, 2, 1, 1]
+    finally:
+        connection.close()
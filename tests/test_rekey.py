@@ -0,0 +1,117 @@
+"""
+Resumable re-key job: chunked rotation and checkpoint resume.
+"""
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+import migrations
+import rekey
+import security_utils
+from db_pool import configure_connection
+
+AMOUNTS = ["10.00", "20.00", "30.00", "40.00", "50.00"]
+
+
+@pytest.fixture
+def connection(tmp_path: Path) -> Iterator[sqlite3.Connection]:
+    connection = configure_connection(sqlite3.connect(tmp_path / "company.db", isolation_level=None))
+    migrations.migrate(connection)
+    connection.executemany(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (1, '2025-01-01', ?);",
+        [(security_utils.encrypt_text(amount),) for amount in AMOUNTS],
+    )
+    yield connection
+    connection.close()
+
+
+def raise_key_ids(connection: sqlite3.Connection) -> List[int]:
+    rows = connection.execute("SELECT RaiseAmt FROM EmpPayRaise ORDER BY PayRaiseId;")
+    return [security_utils.data_key_id(token) for token, in rows]
+
+
+def rekey_raises(connection: sqlite3.Connection, target_key_id: int) -> int:
+    return rekey.rekey_table(
+        connection, "EmpPayRaise", "PayRaiseId", ("RaiseAmt",), target_key_id, chunk_size=2, rows_per_second=0
+    )
+
+
+def test_interrupted_rekey_resumes_from_checkpoint(
+    connection: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+) -> None:
+    old_key_id, _ = security_utils.get_keyring().active()
+    new_key_id = security_utils.get_keyring().rotate()
+    rotate_many = security_utils.rotate_many
+    calls: List[int] = []
+
+    def interrupt_second_chunk(tokens, batch_size=None):
+        calls.append(len(tokens))
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return rotate_many(tokens, batch_size)
+
+    monkeypatch.setattr(security_utils, "rotate_many", interrupt_second_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        rekey_raises(connection, new_key_id)
+
+    # Only the first chunk was committed, together with its checkpoint.
+    assert raise_key_ids(connection) == [new_key_id, new_key_id, old_key_id, old_key_id, old_key_id]
+    assert rekey.load_checkpoint(connection, "EmpPayRaise", new_key_id) == (2, 2, False)
+
+    monkeypatch.setattr(security_utils, "rotate_many", rotate_many)
+    assert rekey_raises(connection, new_key_id) == len(AMOUNTS)
+
+    assert "resuming after PayRaiseId 2 (2 values rotated so far)" in capsys.readouterr().out
+    assert raise_key_ids(connection) == [new_key_id] * len(AMOUNTS)
+    assert rekey.load_checkpoint(connection, "EmpPayRaise", new_key_id) == (5, 5, True)
+    amounts = connection.execute("SELECT RaiseAmt FROM EmpPayRaise ORDER BY PayRaiseId;").fetchall()
+    assert [security_utils.decrypt_text(token) for token, in amounts] == AMOUNTS
+
+
+def test_completed_table_is_skipped(connection: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch) -> None:
+    new_key_id = security_utils.get_keyring().rotate()
+    assert rekey_raises(connection, new_key_id) == len(AMOUNTS)
+
+    def fail(tokens, batch_size=None):
+        raise AssertionError("completed table was scanned again")
+
+    monkeypatch.setattr(security_utils, "rotate_many", fail)
+    assert rekey_raises(connection, new_key_id) == len(AMOUNTS)
+
+
+def test_checkpoint_for_another_key_is_stale(connection: sqlite3.Connection) -> None:
+    first_key_id = security_utils.get_keyring().rotate()
+    rekey_raises(connection, first_key_id)
+    second_key_id = security_utils.get_keyring().rotate()
+
+    assert rekey.load_checkpoint(connection, "EmpPayRaise", second_key_id) == (None, 0, False)
+    assert rekey_raises(connection, second_key_id) == len(AMOUNTS)
+    assert raise_key_ids(connection) == [second_key_id] * len(AMOUNTS)
+
+
+def test_checkpoint_for_another_cipher_is_stale(
+    connection: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    key_id, _ = security_utils.get_keyring().active()
+    # Everything is already on the active key, so only the backend changes.
+    assert rekey_raises(connection, key_id) == 0
+
+    monkeypatch.setattr(security_utils, "CIPHER", "aes-gcm")
+    assert rekey.load_checkpoint(connection, "EmpPayRaise", key_id) == (None, 0, False)
+    assert rekey_raises(connection, key_id) == len(AMOUNTS)
+    tokens = [token for token, in connection.execute("SELECT RaiseAmt FROM EmpPayRaise;")]
+    assert all(security_utils.is_current(token, key_id) for token in tokens)
+
+
+def test_restart_discards_saved_progress(connection: sqlite3.Connection) -> None:
+    new_key_id = security_utils.get_keyring().rotate()
+    assert rekey.rekey(connection, chunk_size=2, rows_per_second=0) == len(AMOUNTS)
+    assert rekey.rekey(connection, chunk_size=2, rows_per_second=0) == len(AMOUNTS)
+
+    # Nothing is left to rotate, so a restarted run counts from zero.
+    assert rekey.rekey(connection, chunk_size=2, rows_per_second=0, restart=True) == 0
+    assert rekey.load_checkpoint(connection, "EmpPayRaise", new_key_id) == (5, 0, True)
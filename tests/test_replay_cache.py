@@ -0,0 +1,106 @@
+"""
+Replay cache keys, expiry, eviction and the message age limit.
+"""
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import replay_cache
+import security_utils
+from replay_cache import MAX_CLOCK_SKEW, ReplayCache
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    now = SimpleNamespace(wall=1_700_000_000.0, mono=1000.0)
+    monkeypatch.setattr(replay_cache, "time", SimpleNamespace(time=lambda: now.wall, monotonic=lambda: now.mono))
+    return now
+
+
+def _legacy_token(at: float) -> bytes:
+    return security_utils.get_cipher().encrypt_at_time(b"1^%$2024-01-01", int(at))
+
+
+def test_key_reads_timestamp_without_decrypting() -> None:
+    legacy = _legacy_token(1_700_000_000)
+    assert ReplayCache.key(legacy)[1] == 1_700_000_000
+
+    before = int(time.time())
+    enveloped = security_utils.encrypt_text("1^%$2024-01-01")
+    assert before <= ReplayCache.key(enveloped)[1] <= int(time.time())
+
+    assert ReplayCache.key(b"not a token")[1] is None
+    assert ReplayCache.key(b"")[1] is None
+
+
+def test_aead_tokens_have_no_timestamp(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security_utils, "CIPHER", "aes-gcm")
+    key = ReplayCache.key(security_utils.encrypt_text("1^%$2024-01-01"))
+    assert key[1] is None
+    assert not ReplayCache(max_age=1).is_too_old(key)
+
+
+def test_distinct_tokens_get_distinct_keys() -> None:
+    first = security_utils.encrypt_text("1^%$2024-01-01")
+    second = security_utils.encrypt_text("1^%$2024-01-01")
+    assert ReplayCache.key(first) == ReplayCache.key(first)
+    assert ReplayCache.key(first)[0] != ReplayCache.key(second)[0]
+
+
+def test_hit_and_miss(clock: SimpleNamespace) -> None:
+    cache = ReplayCache()
+    key = ReplayCache.key(_legacy_token(clock.wall))
+    assert cache.get(key) is None
+    cache.put(key, ("ok", "deleted", None))
+    assert cache.get(key) == ("ok", "deleted", None)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "evictions": 0, "expired": 0, "too_old": 0}
+
+
+def test_entries_expire_after_ttl(clock: SimpleNamespace) -> None:
+    cache = ReplayCache(ttl=10)
+    old, new = (b"\x00" * 16, None), (b"\x01" * 16, None)
+    cache.put(old, "old reply")
+
+    clock.mono += 11
+    assert cache.get(old) is None
+    cache.put(old, "old reply")
+    clock.mono += 6
+    cache.put(new, "new reply")
+    clock.mono += 6
+    # Putting sweeps expired entries from the front.
+    cache.put((b"\x02" * 16, None), "newest reply")
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["expired"] == 2
+    assert cache.get(new) == "new reply"
+
+
+def test_eviction_when_full(clock: SimpleNamespace) -> None:
+    cache = ReplayCache(max_entries=2)
+    keys = [(bytes([n]) * 16, None) for n in range(3)]
+    assert cache.put(keys[0], 0) == 0
+    assert cache.put(keys[1], 1) == 0
+    assert cache.put(keys[2], 2) == 1
+    assert cache.get(keys[0]) is None
+    assert [cache.get(key) for key in keys[1:]] == [1, 2]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_entries_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        ReplayCache(max_entries=0)
+
+
+def test_age_limit(clock: SimpleNamespace) -> None:
+    cache = ReplayCache(max_age=300)
+    assert not cache.is_too_old(ReplayCache.key(_legacy_token(clock.wall - 299)))
+    assert cache.is_too_old(ReplayCache.key(_legacy_token(clock.wall - 301)))
+    assert not cache.is_too_old(ReplayCache.key(_legacy_token(clock.wall + MAX_CLOCK_SKEW - 1)))
+    assert cache.is_too_old(ReplayCache.key(_legacy_token(clock.wall + MAX_CLOCK_SKEW + 1)))
+    assert cache.stats()["too_old"] == 2
+
+    unlimited = ReplayCache(max_age=None)
+    assert not unlimited.is_too_old(ReplayCache.key(_legacy_token(0)))
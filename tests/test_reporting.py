@@ -0,0 +1,99 @@
+"""
+Incremental maintenance of the encrypted PayRaiseAggregate totals.
+"""
+from __future__ import annotations
+
+import sqlite3
+from decimal import Decimal
+from typing import Dict, Iterator, Tuple
+
+import pytest
+
+import migrations
+import reporting
+import security_utils
+
+
+@pytest.fixture
+def connection() -> Iterator[sqlite3.Connection]:
+    connection = sqlite3.connect(":memory:")
+    migrations.migrate(connection)
+    yield connection
+    connection.close()
+
+
+def _aggregates(connection: sqlite3.Connection) -> Dict[Tuple[int, int], Tuple[Decimal, int]]:
+    rows = connection.execute("SELECT EmpId, Year, TotalAmt, RaiseCount FROM PayRaiseAggregate;").fetchall()
+    totals = security_utils.decrypt_many([row[2] for row in rows])
+    return {(row[0], row[1]): (Decimal(total), row[3]) for row, total in zip(rows, totals)}
+
+
+def test_new_groups_are_created(connection: sqlite3.Connection) -> None:
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("100.10"), 2], (2, 2023): [Decimal("5"), 1]})
+    assert _aggregates(connection) == {
+        (1, 2024): (Decimal("100.10"), 2),
+        (2, 2023): (Decimal("5.00"), 1),
+    }
+    # Totals are stored encrypted, never as plaintext.
+    stored = connection.execute("SELECT TotalAmt FROM PayRaiseAggregate WHERE EmpId = 1;").fetchone()[0]
+    assert b"100.10" not in stored
+
+
+def test_deltas_add_to_existing_groups(connection: sqlite3.Connection) -> None:
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("100.10"), 2]})
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("-40.05"), -1], (1, 2025): [Decimal("1"), 1]})
+    assert _aggregates(connection) == {
+        (1, 2024): (Decimal("60.05"), 1),
+        (1, 2025): (Decimal("1.00"), 1),
+    }
+
+
+def test_group_removed_when_count_reaches_zero(connection: sqlite3.Connection) -> None:
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("10"), 1], (2, 2024): [Decimal("20"), 1]})
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("-10"), -1]})
+    assert _aggregates(connection) == {(2, 2024): (Decimal("20.00"), 1)}
+
+
+def test_empty_deltas_are_skipped(connection: sqlite3.Connection) -> None:
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("10"), 1]})
+    stored = connection.execute("SELECT TotalAmt FROM PayRaiseAggregate;").fetchone()[0]
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal(0), 0]})
+    reporting.apply_deltas(connection, {})
+    # Nothing was re-encrypted.
+    assert connection.execute("SELECT TotalAmt FROM PayRaiseAggregate;").fetchone()[0] == stored
+
+
+def test_totals_round_half_up_to_cents(connection: sqlite3.Connection) -> None:
+    reporting.apply_deltas(connection, {(1, 2024): [Decimal("0.005"), 1], (2, 2024): [Decimal("0.004"), 1]})
+    assert _aggregates(connection) == {
+        (1, 2024): (Decimal("0.01"), 1),
+        (2, 2024): (Decimal("0.00"), 1),
+    }
+
+
+def test_many_groups_span_lookup_chunks(connection: sqlite3.Connection) -> None:
+    deltas = {(emp_id, 2024): [Decimal(emp_id), 1] for emp_id in range(1, 1001)}
+    reporting.apply_deltas(connection, deltas)
+    reporting.apply_deltas(connection, {key: [Decimal(1), 1] for key in deltas})
+    aggregates = _aggregates(connection)
+    assert len(aggregates) == 1000
+    assert aggregates[(999, 2024)] == (Decimal("1000.00"), 2)
+
+
+def test_record_raises_and_deletions_match_rebuild(connection: sqlite3.Connection) -> None:
+    raises = [(1, "2023-03-01", "1000.50"), (1, "2023-09-01", "250.25"), (2, "2024-02-01", "75.10")]
+    tokens = security_utils.encrypt_many([amount for _, _, amount in raises])
+    connection.executemany(
+        "INSERT INTO EmpPayRaise (EmpId, PayRaiseDate, RaiseAmt) VALUES (?, ?, ?);",
+        [(emp_id, date, token) for (emp_id, date, _), token in zip(raises, tokens)],
+    )
+    reporting.record_raises(connection, raises)
+
+    connection.execute("DELETE FROM EmpPayRaise WHERE EmpId = 1 AND PayRaiseDate = '2023-03-01';")
+    reporting.record_deletions(connection, [(1, "2023-03-01", tokens[0])])
+    connection.commit()
+    incremental = _aggregates(connection)
+    assert incremental == {(1, 2023): (Decimal("250.25"), 1), (2, 2024): (Decimal("75.10"), 1)}
+
+    migrations.rebuild_pay_raise_aggregates(connection)
+    assert _aggregates(connection) == incremental
@@ -0,0 +1,117 @@
+"""
+Blind n-gram search: candidate lookup, false-positive filtering and paging.
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Iterator, List
+
+import pytest
+
+import employee_create_db
+import migrations
+import search_index
+
+EMPLOYEES = [
+    # Has the "ann" and "nna" grams of "anna", but in different words.
+    (1, "Ann Donna", 30, "555-0101", 3, "unused"),
+    # Has the "551" and "555" grams of "5551", but not the digits in a row.
+    (2, "Joanna Lee", 31, "551-0555", 3, "unused"),
+    (3, "Anna Smith", 32, "555-1234", 3, "unused"),
+    (4, "Hannah Cole", 33, "555-0123", 3, "unused"),
+    (5, "Annabel Ray", 34, "555-0199", 3, "unused"),
+]
+
+
+@pytest.fixture
+def connection() -> Iterator[sqlite3.Connection]:
+    connection = sqlite3.connect(":memory:")
+    migrations.migrate(connection)
+    connection.executemany(
+        employee_create_db.INSERT_SQL, employee_create_db.encrypt_employee_rows(EMPLOYEES, password_hash="unused")
+    )
+    search_index.index_employees(connection, [(row[0], row[1], row[3]) for row in EMPLOYEES])
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def ids(connection: sqlite3.Connection, query: str, **kwargs) -> List[int]:
+    found, _ = search_index.search(connection, query, **kwargs)
+    return [record.UserId for record in found]
+
+
+def test_false_positives_are_filtered(connection: sqlite3.Connection) -> None:
+    assert ids(connection, "anna") == [2, 3, 4, 5]
+    assert ids(connection, "5551") == [3]
+
+
+def test_candidates_are_filtered_across_rounds(connection: sqlite3.Connection, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(search_index, "CANDIDATE_BATCH", 1)
+    assert ids(connection, "anna", limit=2) == [2, 3]
+    assert ids(connection, "5551") == [3]
+
+
+def test_pagination(connection: sqlite3.Connection) -> None:
+    first, next_after = search_index.search(connection, "anna", limit=2)
+    assert ([record.UserId for record in first], next_after) == ([2, 3], 3)
+
+    second, next_after = search_index.search(connection, "anna", limit=2, after=next_after)
+    assert ([record.UserId for record in second], next_after) == ([4, 5], None)
+
+
+def test_exact_last_page_has_no_next(connection: sqlite3.Connection) -> None:
+    found, next_after = search_index.search(connection, "anna", limit=4)
+    assert len(found) == 4
+    assert next_after is None
+
+
+def test_results_are_decrypted_records(connection: sqlite3.Connection) -> None:
+    found, _ = search_index.search(connection, "smith")
+    assert [(record.Name, record.PhNum, record.Age) for record in found] == [("Anna Smith", "555-1234", 32)]
+
+
+def test_short_words_match_word_prefixes(connection: sqlite3.Connection) -> None:
+    assert ids(connection, "a") == [1, 3, 5]
+    assert ids(connection, "jo") == [2]
+    assert ids(connection, "an do") == [1]
+
+
+def test_every_query_word_must_match(connection: sqlite3.Connection) -> None:
+    assert ids(connection, "Smith, Anna") == [3]
+    assert ids(connection, "anna cole") == [4]
+    assert ids(connection, "smith cole") == []
+
+
+def test_fields_are_searched_separately(connection: sqlite3.Connection) -> None:
+    assert search_index.guess_field("(555) 1234") == "phone"
+    assert search_index.guess_field("anna") == "name"
+    assert ids(connection, "(555) 1234") == [3]
+    assert ids(connection, "555", field="name") == []
+    assert ids(connection, "!!") == []
+
+
+def test_deleted_employees_drop_out(connection: sqlite3.Connection) -> None:
+    connection.execute("DELETE FROM Employee WHERE UserId = 3;")
+    assert connection.execute("SELECT COUNT(*) FROM EmployeeSearchToken WHERE UserId = 3;").fetchone()[0] == 0
+    assert ids(connection, "anna") == [2, 4, 5]
+
+
+def test_rebuild_matches_incremental_index(connection: sqlite3.Connection) -> None:
+    before = connection.execute("SELECT Token, UserId FROM EmployeeSearchToken ORDER BY Token, UserId;").fetchall()
+    assert search_index.rebuild(connection, chunk_size=2) == len(EMPLOYEES)
+    after = connection.execute("SELECT Token, UserId FROM EmployeeSearchToken ORDER BY Token, UserId;").fetchall()
+    assert after == before
+
+
+def test_search_endpoint_pages_json(portal) -> None:
+    portal.login()
+    response = portal.client.get("/employees/search?q=555-01&page_size=2", headers={"Accept": "application/json"})
+    body = response.get_json()
+    assert [employee["Name"] for employee in body["employees"]] == ["Alice Johnson", "Bob Smith"]
+    assert body["next_after"] == 2
+
+    response = portal.client.get(
+        "/employees/search?q=555-01&page_size=2&after=2", headers={"Accept": "application/json"}
+    )
+    assert [employee["UserId"] for employee in response.get_json()["employees"]] == [3, 4]
@@ -0,0 +1,70 @@
+"""
+Server-side sessions and the Employee triggers that drop them.
+"""
+from __future__ import annotations
+
+from contextlib import closing
+from typing import Any
+
+
+def session_count(portal: Any, user_id: int) -> int:
+    with closing(portal.connect()) as connection:
+        return connection.execute("SELECT COUNT(*) FROM Session WHERE UserId = ?;", (user_id,)).fetchone()[0]
+
+
+def update_employee(portal: Any, sql: str, user_id: int) -> None:
+    with closing(portal.connect()) as connection:
+        connection.execute(sql, (user_id,))
+        connection.commit()
+
+
+def test_session_is_stored_encrypted(portal) -> None:
+    portal.login()
+    assert session_count(portal, 1) == 1
+    with closing(portal.connect()) as connection:
+        data, = connection.execute("SELECT Data FROM Session WHERE UserId = 1;").fetchone()
+    assert b"Alice" not in data
+
+
+def test_security_level_change_drops_sessions(portal) -> None:
+    portal.login()
+    bob = portal.app.test_client()
+    bob.post("/", data={"name": "Bob Smith", "password": "B0b!Secure"})
+    assert portal.client.get("/home").status_code == 200
+
+    update_employee(portal, "UPDATE Employee SET SecurityLevel = 2 WHERE UserId = ?;", 1)
+
+    assert session_count(portal, 1) == 0
+    response = portal.client.get("/home")
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/")
+    # Other users keep their sessions.
+    assert session_count(portal, 2) == 1
+    assert bob.get("/home").status_code == 200
+
+
+def test_other_updates_keep_sessions(portal) -> None:
+    portal.login()
+
+    update_employee(portal, "UPDATE Employee SET Age = Age + 1 WHERE UserId = ?;", 1)
+    update_employee(portal, "UPDATE Employee SET SecurityLevel = SecurityLevel WHERE UserId = ?;", 1)
+
+    assert session_count(portal, 1) == 1
+    assert portal.client.get("/home").status_code == 200
+
+
+def test_deleting_an_employee_drops_sessions(portal) -> None:
+    portal.login("Dan Brown", "D4n!Secure")
+    assert session_count(portal, 4) == 1
+
+    update_employee(portal, "DELETE FROM Employee WHERE UserId = ?;", 4)
+
+    assert session_count(portal, 4) == 0
+    assert portal.client.get("/home").status_code == 302
+
+
+def test_logout_deletes_the_session(portal) -> None:
+    portal.login()
+    portal.client.get("/logout")
+    assert session_count(portal, 1) == 0
+    assert portal.client.get("/home").status_code == 302